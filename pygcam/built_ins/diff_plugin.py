@@ -11,7 +11,7 @@ class DiffCommand(SubcommandABC):
         super(DiffCommand, self).__init__('diff', subparsers, kwargs, group='project')
 
     def addArgs(self, parser):
-        parser.add_argument('csvFiles', nargs='+',
+        parser.add_argument('csvFiles', nargs='*',
                     help=clean_help('''The files to process. For difference operations, the first file is treated
                     as the reference file whose time-series data is subtracted from that of each other
                     file. If missing, ".csv" suffixes are added to all arguments (the ".csv" is optional).'''))
@@ -24,9 +24,26 @@ class DiffCommand(SubcommandABC):
                             given column, and sum all members of each group to produce a timeseries for
                             each group. Takes precedence over the simpler "-S" ("--sum") option.'''))
 
+        parser.add_argument('-G', '--group',
+                            help=clean_help('''Compute differences for all queries named in the file given by
+                            --queryFile, between the baseline and each active policy scenario of the named
+                            scenario group of the current project. Each baseline query result is read once,
+                            and queries are processed concurrently (see -j). Positional arguments are ignored.
+                            Use -D to give the directory holding the scenarios' sandboxes.'''))
+
         parser.add_argument('-i', '--interpolate', action="store_true",
                             help=clean_help("Interpolate (linearly) annual values between timesteps."))
 
+        parser.add_argument('-j', '--jobs', type=int, default=0,
+                            help=clean_help('''The maximum number of queries to process concurrently with
+                            --group. Defaults to the value of config variable GCAM.DiffJobs, or the
+                            number of CPUs if that is 0.'''))
+
+        parser.add_argument('-L', '--longFile',
+                            help=clean_help('''With --group, also write all differences to the named CSV
+                            file in long format, with columns "query", "scenario", "baseline", the
+                            non-year columns of all queries, "year", and "value".'''))
+
         parser.add_argument('-l', '--splitLand', action="store_true",
                             help=clean_help("Split 'Landleaf' or 'land_allocation' column to create 'land_use' and 'basin' columns in output CSV"))
 
@@ -59,6 +76,12 @@ class DiffCommand(SubcommandABC):
                             help=clean_help('''The number of rows to skip. Default is 1, which works for GCAM batch query output.
                             Use -s0 for outFile.csv'''))
 
+        parser.add_argument('--stream', action="store_true",
+                            help=clean_help('''Compute differences with bounded memory use by reading the files
+                            in chunks and processing matching partitions of the data one at a time. Useful
+                            for very large query results. The size of partitions is set by config variable
+                            GCAM.DiffStreamMB. Rows are not sorted. Requires a ".csv" output file.'''))
+
         parser.add_argument('-y', '--years', default="",
                             help=clean_help('''Takes a parameter of the form XXXX-YYYY, indicating start and end years of interest.
                             Other years are dropped (except for annual outputs.)'''))
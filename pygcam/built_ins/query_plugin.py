@@ -47,6 +47,18 @@ class QueryCommand(SubcommandABC):
                             help=clean_help('''The scenario group directory name, if any. Used with to compute default
                             for --workspace argument.'''))
 
+        parser.add_argument('-G', '--scenarioGroup',
+                            help=clean_help('''Query all active scenarios in the named scenario group of the
+                            current project, or those named with -s, concurrently (see -j). Unless -g is
+                            given, the group directory is set from the group's definition.'''))
+
+        parser.add_argument('-j', '--jobs', type=int, default=0,
+                            help=clean_help('''The maximum number of scenarios to query concurrently, each in
+                            its own process. Defaults to the value of config variable GCAM.MI.QueryJobs,
+                            or the number of CPUs if that is 0. When querying multiple scenarios without
+                            -o, results for each are written to {sandbox}/queryResults. The -o argument may
+                            include "{scenario}", which is replaced with each scenario name.'''))
+
         parser.add_argument('-l', '--splitLand', action='store_true',
                             help=clean_help('''Split the Landleaf column into "land_use" and "basin" columns and add 
                             these to the output CSV'''))
@@ -79,14 +91,33 @@ class QueryCommand(SubcommandABC):
                                     treated as comments. Lines without a tab character are also ignored. This arg
                                     overrides the value of config variable GCAM.RegionMapFile.'''))
 
-        parser.add_argument('-s', '--scenario', default='Reference',
+        parser.add_argument('-s', '--scenario',
                             help=clean_help('''The scenario to run the query/queries for (default is "Reference")
-                                    Note that this must refer to a scenario in the XML database.'''))
+                                    Note that this must refer to a scenario in the XML database. Multiple
+                                    scenarios can be given as a comma-delimited list, in which case they
+                                    are queried concurrently (see -j).'''))
 
         parser.add_argument('-S', '--rewriteSetsFile',
                             help=clean_help('''An XML file defining query maps by name (default taken from
                             config parameter "GCAM.RewriteSetsFile")'''))
 
+        parser.add_argument('--server', action='store_true',
+                            help=clean_help('''Run a query server that accepts batch queries from other
+                            "gt query" commands given the --useServer flag, combining waiting
+                            requests into a single ModelInterface invocation. The server runs
+                            until stopped with --stopServer. See also config variables
+                            GCAM.MI.ServerHost and GCAM.MI.ServerPort.'''))
+
+        parser.add_argument('--stopServer', action='store_true',
+                            help=clean_help('''Stop a query server started with --server after it
+                            runs any queries already submitted.'''))
+
+        parser.add_argument('--useServer', action='store_true',
+                            help=clean_help('''Submit queries to a query server started with --server
+                            rather than running ModelInterface directly. If the server cannot be
+                            reached, queries are run locally. Setting config variable
+                            GCAM.MI.UseServer to True has the same effect.'''))
+
         parser.add_argument('-w', '--workspace', default='',
                             help=clean_help('''The workspace directory in which to find the XML database.
                                     Defaults computed as {GCAM.SandboxDir}/{groupDir}/{scenario}.
@@ -39,6 +39,23 @@ class RunCommand(SubcommandABC):
         parser.add_argument('-G', '--listGroups', action='store_true',
                             help=clean_help('''List the scenario groups defined in the project file and exit.'''))
 
+        parser.add_argument('-I', '--incremental', action='store_true',
+                            help=clean_help('''Skip steps whose inputs have not changed since they last ran
+                            successfully for the given scenario. Inputs include the step's command (after
+                            variable substitution), config variables, the scenario's definition in the
+                            scenario setup file and its XML source files, the preceding steps, and, for
+                            policy scenarios, the baseline's steps. Setting config variable
+                            GCAM.IncrementalRun to True has the same effect. Ignored with -D.'''))
+
+        parser.add_argument('-j', '--jobs', type=int,
+                            help=clean_help('''Run the given scenarios on the local host, each in its own
+                            "gt run" process, running up to this many concurrently. If one of the scenarios
+                            is a baseline, it is run first and the remaining scenarios are started when it
+                            completes. If 0, the number of CPUs is used. Concurrency is further limited
+                            by available memory as set by config variable GCAM.RunJobMemoryGB. Output for
+                            each scenario is written to {GCAM.BatchLogDir}/run-{scenario}.log.
+                            Ignored with -D.'''))
+
         parser.add_argument('-k', '--skipStep', dest='skipSteps', action='append',
                             help=clean_help('''Steps to skip. These must be names of steps defined in the
                             project.xml file. Multiple steps can be given in a single (comma-delimited)
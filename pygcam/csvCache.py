@@ -4,11 +4,121 @@
 '''
 from .error import PygcamException, FileMissingError
 from .log import getLogger
+from .lruCache import LRUCache, sizeofDataFrame
 import os
+import six
 
 _logger = getLogger(__name__)
 
-_csvCache = {}
+_csvCache = LRUCache('CSV', sizeof=sizeofDataFrame)
+
+# Key stored with each binary copy to detect stale data
+_KEY_FORMAT = '{size}:{mtime}:{skiprows}'
+_FEATHER_KEY = b'pygcam.csvCache.key'
+
+def _binaryFormat():
+    """
+    Return the binary format used for the persistent cache: 'feather' if
+    pyarrow is installed, otherwise 'pickle'.
+    """
+    try:
+        import pyarrow.feather   # noqa
+        return 'feather'
+    except ImportError:
+        return 'pickle'
+
+def binaryCachePath(filename):
+    """
+    Compute the pathname of the binary copy of the CSV file `filename`. Binary
+    copies are stored in a subdirectory of the CSV file's directory named by the
+    config variable ``GCAM.BinaryCsvCacheSubdir``.
+
+    :param filename: (str) the path to a CSV file
+    :return: (str) the path to the corresponding binary cache file
+    """
+    from .config import getParam
+
+    dirname, basename = os.path.split(os.path.abspath(filename))
+    subdir = getParam('GCAM.BinaryCsvCacheSubdir')
+    ext = 'feather' if _binaryFormat() == 'feather' else 'pkl'
+    return os.path.join(dirname, subdir, '%s.%s' % (basename, ext))
+
+def _binaryCacheKey(filename, skiprows):
+    st = os.stat(filename)
+    return _KEY_FORMAT.format(size=st.st_size, mtime=st.st_mtime_ns, skiprows=skiprows)
+
+def _useBinaryCache(filename):
+    from .config import getParamAsBoolean
+    return isinstance(filename, six.string_types) and getParamAsBoolean('GCAM.BinaryCsvCache')
+
+def _readBinaryCache(filename, skiprows):
+    """
+    Return the DataFrame stored in the binary copy of `filename` if it exists
+    and was created from the current version of the CSV file, else None.
+    """
+    import pandas as pd
+
+    try:
+        key = _binaryCacheKey(filename, skiprows)
+        path = binaryCachePath(filename)
+        if not os.path.exists(path):
+            return None
+
+        if path.endswith('.feather'):
+            import pyarrow.feather as feather
+
+            table = feather.read_table(path, memory_map=True)
+            metadata = table.schema.metadata or {}
+            if metadata.get(_FEATHER_KEY, b'').decode('utf-8') != key:
+                return None
+            df = table.to_pandas()
+        else:
+            storedKey, df = pd.read_pickle(path)
+            if storedKey != key:
+                return None
+
+    except Exception as e:
+        _logger.debug("Ignoring unreadable binary cache for %s: %s", filename, e)
+        return None
+
+    _logger.debug("Read %s from binary cache", filename)
+    return df
+
+def _writeBinaryCache(filename, skiprows, df):
+    """
+    Save `df` in the binary cache for `filename`. The file is written to a
+    temporary name and renamed so concurrent readers never see a partial file.
+    Failures (e.g., read-only directories) are logged and otherwise ignored.
+    """
+    import pandas as pd
+
+    path = binaryCachePath(filename)
+    tmpPath = '%s.%d.tmp' % (path, os.getpid())
+
+    try:
+        key = _binaryCacheKey(filename, skiprows)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        if path.endswith('.feather'):
+            import pyarrow as pa
+            import pyarrow.feather as feather
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            metadata = dict(table.schema.metadata or {})
+            metadata[_FEATHER_KEY] = key.encode('utf-8')
+            feather.write_feather(table.replace_schema_metadata(metadata), tmpPath)
+        else:
+            pd.to_pickle((key, df), tmpPath, compression=None)
+
+        os.replace(tmpPath, path)
+        _logger.debug("Wrote binary cache %s", path)
+
+    except Exception as e:
+        _logger.debug("Failed to write binary cache for %s: %s", filename, e)
+        try:
+            os.remove(tmpPath)
+        except OSError:
+            pass
 
 def readCachedCsv(filename, skiprows=1, cache=False):
     """
@@ -17,6 +127,11 @@ def readCachedCsv(filename, skiprows=1, cache=False):
     the `years` given. Optionally, linearly interpolate annual values between
     time-steps.
 
+    If config variable ``GCAM.BinaryCsvCache`` is True, a binary copy of the
+    parsed data is saved alongside the CSV file (see :py:func:`binaryCachePath`)
+    and read instead of the CSV file as long as the CSV file's size and
+    modification time are unchanged.
+
     :param filename: (str) the path to a CSV file
     :param skiprows: (int) the number of rows to skip before reading the data matrix
     :param cache: (bool) If True, file will be sought in, and saved to, a CSV cache.
@@ -27,22 +142,30 @@ def readCachedCsv(filename, skiprows=1, cache=False):
     import pandas as pd
 
     found = False
+    useBinary = _useBinaryCache(filename)
 
-    if cache and filename in _csvCache:
+    df = _csvCache.get(filename) if cache else None
+
+    if df is not None:
         _logger.debug("Found %s in CSV cache", filename)
-        df = _csvCache[filename]
         found = True
 
     else:
-        try:
-            _logger.debug("Reading %s", filename)
-            df = pd.read_table(filename, sep=',', skiprows=skiprows, index_col=None)
+        df = _readBinaryCache(filename, skiprows) if useBinary else None
+
+        if df is None:
+            try:
+                _logger.debug("Reading %s", filename)
+                df = pd.read_table(filename, sep=',', skiprows=skiprows, index_col=None)
+
+            except IOError as e:
+                raise FileMissingError(os.path.abspath(filename), e)
 
-        except IOError as e:
-            raise FileMissingError(os.path.abspath(filename), e)
+            except Exception as e:
+                raise PygcamException('Error reading %s: %s' % (filename, e))
 
-        except Exception as e:
-            raise PygcamException('Error reading %s: %s' % (filename, e))
+            if useBinary:
+                _writeBinaryCache(filename, skiprows, df)
 
     # Cache a copy, unless it was already in the cache
     if cache and not found:
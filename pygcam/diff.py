@@ -4,14 +4,21 @@
   See the https://opensource.org/licenses/MIT for license details.
 '''
 import os
-from .config import pathjoin
+import pickle
+from math import ceil
+from .config import pathjoin, getParamAsFloat
 from .log import getLogger
-from .error import CommandlineError, FileFormatError
+from .error import CommandlineError, FileFormatError, FileMissingError, PygcamException
 from .utils import mkdirs, ensureCSV, QueryResultsDir
-from .query import readCsv, dropExtraCols, csv2xlsx, sumYears, sumYearsByGroup, QueryFile
+from .query import (readCsv, dropExtraCols, csv2xlsx, sumYears, sumYearsByGroup, QueryFile,
+                    limitYears, interpolateYears)
+from .temp_file import getTempDir, TempFile
 
 _logger = getLogger(__name__)
 
+# The number of rows read at a time from CSV files when computing diffs in streaming mode
+STREAM_CHUNK_ROWS = 50000
+
 
 def computeDifference(df1, df2, resetIndex=True, dropna=True,
                       asPercentChange=False, splitLand=False):
@@ -103,11 +110,195 @@ def computeDifference(df1, df2, resetIndex=True, dropna=True,
 
     return diff
 
+def _isYearOrUnits(col):
+    return col.isdigit() or col == 'Units'
+
+class _PartitionedCsv(object):
+    """
+    A query result CSV file split into partition files by a hash of its key (non-year)
+    columns, so that rows with the same key in two files land in partitions with the
+    same number. The file is read in chunks of ``STREAM_CHUNK_ROWS`` rows, so it is
+    never held in memory in full. Each chunk is processed as by :py:func:`readCsv`
+    and :py:func:`dropExtraCols` before being partitioned.
+
+    Key columns are read as strings, since the dtypes pandas infers can differ from
+    one file or chunk to the next (e.g., int in one and object in another), and
+    matching keys would then hash to different partitions.
+    """
+    def __init__(self, filename, partitions, tmpDir, tag, skiprows=1,
+                 years=None, interpolate=False, startYear=0):
+        import pandas as pd
+
+        self.filename = filename
+        self.paths = [pathjoin(tmpDir, '%s-%d.pkl' % (tag, i)) for i in range(partitions)]
+        self.columns = None
+        self.units = set()
+        self.empty = None   # a 0-row frame with the file's columns and dtypes
+
+        files = [None] * partitions
+        try:
+            header = pd.read_csv(filename, sep=',', skiprows=skiprows, index_col=None, nrows=0)
+            keyDtypes = {col: str for col in header.columns if not _isYearOrUnits(col)}
+
+            reader = pd.read_csv(filename, sep=',', skiprows=skiprows, index_col=None,
+                                 chunksize=STREAM_CHUNK_ROWS, dtype=keyDtypes)
+            for chunk in reader:
+                dropExtraCols(chunk, inplace=True)
+
+                if years:
+                    limitYears(chunk, years)
+
+                if interpolate:
+                    chunk = interpolateYears(chunk, startYear=startYear)
+
+                if self.columns is None:
+                    self.columns = list(chunk.columns)
+                    self.empty = chunk.iloc[:0]
+
+                if 'Units' in chunk.columns:
+                    self.units.update(chunk.Units.astype(str).unique())
+
+                # Units are excluded from the hash key; see computeDifference()
+                keyCols = [col for col in chunk.columns if not _isYearOrUnits(col)]
+                if keyCols and partitions > 1:
+                    hashes = pd.util.hash_pandas_object(chunk[keyCols], index=False).values
+                    assignments = hashes % partitions
+                else:
+                    assignments = None
+
+                for i in range(partitions):
+                    part = chunk if assignments is None else chunk[assignments == i]
+                    if len(part):
+                        if files[i] is None:
+                            files[i] = open(self.paths[i], 'wb')
+                        pickle.dump(part, files[i], protocol=pickle.HIGHEST_PROTOCOL)
+
+        except IOError as e:
+            raise FileMissingError(os.path.abspath(filename), e)
+
+        finally:
+            for f in files:
+                if f is not None:
+                    f.close()
+
+        if self.columns is None:
+            raise FileFormatError("No data found in '%s'" % filename)
+
+    def read(self, i):
+        """
+        Return a DataFrame holding the rows in partition `i`, or None if it is empty.
+        """
+        import pandas as pd
+
+        path = self.paths[i]
+        if not os.path.exists(path):
+            return None
+
+        parts = []
+        with open(path, 'rb') as f:
+            while True:
+                try:
+                    parts.append(pickle.load(f))
+                except EOFError:
+                    break
+
+        return pd.concat(parts, ignore_index=True)
+
+def _streamPartitions(referenceFile, otherFiles):
+    """
+    Compute the number of partitions required to keep the data for each
+    partition under roughly ``GCAM.DiffStreamMB`` megabytes.
+    """
+    maxBytes = getParamAsFloat('GCAM.DiffStreamMB') * 1024 * 1024
+    fileBytes = max([os.path.getsize(f) for f in [referenceFile] + otherFiles])
+    return max(1, int(ceil(fileBytes / maxBytes)))
+
+def writeStreamingDiffsToCSV(outFile, referenceFile, otherFiles, skiprows=1, interpolate=False,
+                             years=None, startYear=0, asPercentChange=False, splitLand=False):
+    """
+    Compute the same differences as :py:func:`writeDiffsToCSV`, but with memory use
+    bounded independent of the size of the files. Each file is read in chunks and
+    split by a hash of its key columns into partitions of approximately
+    ``GCAM.DiffStreamMB`` megabytes (each) of CSV data. Matching partitions of the
+    reference and other files are then differenced one at a time, and the results
+    appended to `outFile`. The reference file is partitioned only once.
+
+    Results are the same as those of :py:func:`writeDiffsToCSV`, but rows appear in
+    order of partition rather than sorted by key. Arguments are as for
+    :py:func:`writeDiffsToCSV`.
+
+    :return: none
+    """
+    otherFiles = [ensureCSV(f) for f in otherFiles]
+    partitions = _streamPartitions(referenceFile, otherFiles)
+    _logger.debug("Computing diffs using %d partitions", partitions)
+
+    tmpDir = getTempDir(suffix='.diff')
+    try:
+        ref = _PartitionedCsv(referenceFile, partitions, tmpDir, 'ref', skiprows=skiprows,
+                              years=years, interpolate=interpolate, startYear=startYear)
+
+        # Handle corner case in which query results for non-existent data have zero
+        # in Units column. This must be done using the units found in the whole file.
+        units = list(ref.units)
+        realUnits = None
+        if len(units) == 2 and '0.0' in units:
+            units.remove('0.0')
+            realUnits = units[0]
+
+        with open(outFile, 'w') as f:
+            for fileNum, otherFile in enumerate(otherFiles):
+                other = _PartitionedCsv(otherFile, partitions, tmpDir, 'other%d' % fileNum,
+                                        skiprows=skiprows, years=years,
+                                        interpolate=interpolate, startYear=startYear)
+
+                if set(ref.columns) != set(other.columns):
+                    raise FileFormatError("Can't compute difference because result sets have different columns. df1:%s, df2:%s" \
+                                          % (ref.columns, other.columns))
+
+                label = _label(referenceFile, otherFile, asPercentChange=asPercentChange)
+                f.write("%s\n" % label)
+
+                columns = None
+                for i in range(partitions):
+                    refDF = ref.read(i)
+                    otherDF = other.read(i)
+
+                    # rows without a match in the other file are dropped as NaN
+                    if refDF is None or otherDF is None:
+                        continue
+
+                    if realUnits:
+                        refDF.Units = realUnits
+                        otherDF.Units = realUnits
+
+                    diff = computeDifference(refDF, otherDF, asPercentChange=asPercentChange,
+                                             splitLand=splitLand)
+
+                    header = columns is None
+                    columns = columns or list(diff.columns)
+                    diff.to_csv(f, index=None, header=header, columns=columns)
+
+                if columns is None:     # no matching rows; write just the column headers
+                    diff = computeDifference(ref.empty, other.empty, asPercentChange=asPercentChange)
+                    diff.to_csv(f, index=None)
+
+                for path in other.paths:
+                    if os.path.exists(path):
+                        os.remove(path)
+    finally:
+        TempFile.remove(tmpDir, raiseError=False)
+
 def _label(referenceFile, otherFile, asPercentChange=False):
     label = "([{other}] minus [{ref}]) / [{ref}]" if asPercentChange else "[{other}] minus [{ref}]"
 
     return label.format(other=otherFile, ref=referenceFile)
 
+def _writeLabeledDiff(stream, diff, referenceFile, otherFile, asPercentChange=False):
+    csvText = diff.to_csv(index=None)
+    label = _label(referenceFile, otherFile, asPercentChange=asPercentChange)
+    stream.write("%s\n%s" % (label, csvText))    # csvText has "\n" already
+
 def writeDiffsToCSV(outFile, referenceFile, otherFiles, skiprows=1, interpolate=False,
                     years=None, startYear=0, asPercentChange=False, splitLand=False):
     """
@@ -141,9 +332,7 @@ def writeDiffsToCSV(outFile, referenceFile, otherFiles, skiprows=1, interpolate=
 
             diff = computeDifference(refDF, otherDF, asPercentChange=asPercentChange,
                                      splitLand=splitLand)
-            csvText = diff.to_csv(index=None)
-            label = _label(referenceFile, otherFile, asPercentChange=asPercentChange)
-            f.write("%s\n%s" % (label, csvText))    # csvText has "\n" already
+            _writeLabeledDiff(f, diff, referenceFile, otherFile, asPercentChange=asPercentChange)
 
 
 def writeDiffsToXLSX(outFile, referenceFile, otherFiles, skiprows=1, interpolate=False,
@@ -206,7 +395,7 @@ def writeDiffsToXLSX(outFile, referenceFile, otherFiles, skiprows=1, interpolate
 
 
 def writeDiffsToFile(outFile, referenceFile, otherFiles, ext='csv', skiprows=1, interpolate=False,
-                     years=None, startYear=0, asPercentChange=False, splitLand=False):
+                     years=None, startYear=0, asPercentChange=False, splitLand=False, stream=False):
     """
     Compute the differences between the data in a reference .CSV file and one or more other
     .CSV files as (other - reference), optionally interpolating annual values between
@@ -229,9 +418,17 @@ def writeDiffsToFile(outFile, referenceFile, otherFiles, ext='csv', skiprows=1,
     :param asPercentChange: (bool) whether to write diffs as percent change from baseline
     :param splitLand: (bool) whether to split 'Landleaf' column (if present) to create two
         new columns, 'land_use' and 'basin'.
+    :param stream: (bool) if True, compute differences with bounded memory use, using
+        :py:func:`writeStreamingDiffsToCSV`. Supported only for .CSV output.
     :return: none
     """
-    writer = writeDiffsToCSV if ext == '.csv' else writeDiffsToXLSX
+    if stream:
+        if ext != '.csv':
+            raise PygcamException("Streaming differences are supported only for .csv output")
+        writer = writeStreamingDiffsToCSV
+    else:
+        writer = writeDiffsToCSV if ext == '.csv' else writeDiffsToXLSX
+
     writer(outFile, referenceFile, otherFiles, skiprows=skiprows, interpolate=interpolate,
            years=years, startYear=startYear, asPercentChange=asPercentChange, splitLand=splitLand)
 
@@ -272,8 +469,184 @@ def queryCsvPathname(query, scenario, workingDir='.'):
     pathname = pathjoin(workingDir, scenario, QueryResultsDir, '%s-%s.csv' % (query, scenario))
     return pathname
 
+def _diffQueryForGroup(query, baseline, policies, workingDir, partsDir, skiprows=1,
+                       interpolate=False, years=None, startYear=0, asPercentChange=False,
+                       splitLand=False):
+    """
+    Compute differences between the results of one query for a baseline and each of
+    the given policy scenarios, reading the baseline results only once. Results are
+    written to the files named by :py:func:`diffCsvPathname`. If `partsDir` is not
+    None, the differences are also written there in long format, for consolidation.
+
+    :return: (tuple) the query, a list of (policy, error message) tuples, and the
+        pathname of the long-format results, or None.
+    """
+    import pandas as pd
+
+    failures = []
+    longDFs = []
+    try:
+        baselineFile = queryCsvPathname(query, baseline, workingDir=workingDir)
+        refDF = readCsv(baselineFile, skiprows=skiprows, interpolate=interpolate,
+                        years=years, startYear=startYear)
+    except Exception as e:
+        return query, [(policy, str(e)) for policy in policies], None
+
+    for policy in policies:
+        try:
+            policyFile = queryCsvPathname(query, policy, workingDir=workingDir)
+            otherDF = readCsv(policyFile, skiprows=skiprows, interpolate=interpolate,
+                              years=years, startYear=startYear)
+
+            diff = computeDifference(refDF, otherDF, asPercentChange=asPercentChange,
+                                     splitLand=splitLand)
+
+            outFile = diffCsvPathname(query, baseline, policy, workingDir=workingDir,
+                                      createDir=True, asPercentChange=asPercentChange)
+            _logger.info("Writing %s", outFile)
+            with open(outFile, 'w') as f:
+                _writeLabeledDiff(f, diff, baselineFile, policyFile, asPercentChange=asPercentChange)
+
+            if partsDir:
+                idCols = [col for col in diff.columns if not col.isdigit()]
+                longDF = diff.melt(id_vars=idCols, var_name='year', value_name='value')
+                longDF.insert(0, 'query', query)
+                longDF.insert(1, 'scenario', policy)
+                longDF.insert(2, 'baseline', baseline)
+                longDFs.append(longDF)
+
+        except Exception as e:
+            failures.append((policy, str(e)))
+
+    partPath = None
+    if longDFs:
+        partPath = pathjoin(partsDir, '%s.pkl' % query.replace(os.path.sep, '_'))
+        pd.concat(longDFs, ignore_index=True).to_pickle(partPath)
+
+    return query, failures, partPath
+
+def _groupScenarios(groupName):
+    """
+    Return the baseline and the active policy scenarios in the given scenario group
+    of the current project.
+    """
+    from .config import getParam
+    from .project import Project
+
+    project = Project.readProjectFile(getParam('GCAM.ProjectName'))
+    project.setGroup(groupName)
+    baseline = project.baselineName
+    policies = [name for name in project.getKnownScenarios()
+                if name != baseline and project.scenarioDict[name].isActive]
+    return baseline, policies
+
+def writeGroupDiffs(queries, baseline, policies, workingDir='.', jobs=1, longFile=None,
+                    skiprows=1, interpolate=False, years=None, startYear=0,
+                    asPercentChange=False, splitLand=False):
+    """
+    Compute differences between the baseline and each policy scenario for each query,
+    reading each baseline query result only once. Queries are processed concurrently
+    in a pool of `jobs` processes. Differences are written to the files named by
+    :py:func:`diffCsvPathname`.
+
+    :param queries: (list of str) the base names of the query results to difference
+    :param baseline: (str) the name of the baseline scenario
+    :param policies: (list of str) the names of the policy scenarios
+    :param workingDir: (str) the directory immediately above the scenario sandboxes
+    :param jobs: (int) the maximum number of queries to process concurrently
+    :param longFile: (str) if not None, the pathname of a CSV file to which all
+        differences are also written in long format, i.e., with columns "query",
+        "scenario", "baseline", the non-year columns of all queries, "year", and
+        "value".
+    :return: none
+    :raises: PygcamException if any differences could not be computed
+
+    Other arguments are as for :py:func:`writeDiffsToCSV`.
+    """
+    from multiprocessing import Pool
+    from .config import getSection
+    from .utils import initWorkerProcess
+
+    partsDir = getTempDir(suffix='.diff') if longFile else None
+    kwargs = dict(skiprows=skiprows, interpolate=interpolate, years=years, startYear=startYear,
+                  asPercentChange=asPercentChange, splitLand=splitLand)
+    args = [(query, baseline, policies, workingDir, partsDir) for query in queries]
+
+    try:
+        jobs = min(jobs, len(queries))
+        if jobs > 1:
+            _logger.info("Computing differences for %d queries using %d processes", len(queries), jobs)
+            pool = Pool(processes=jobs, initializer=initWorkerProcess, initargs=(getSection(),))
+            try:
+                pending = [pool.apply_async(_diffQueryForGroup, arg, kwargs) for arg in args]
+                pool.close()
+                results = [result.get() for result in pending]
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        else:
+            results = [_diffQueryForGroup(*arg, **kwargs) for arg in args]
+
+        failed = []
+        for query, failures, _ in results:
+            for policy, error in failures:
+                _logger.error("Failed to compute differences for query '%s', scenario '%s': %s",
+                              query, policy, error)
+                failed.append('%s/%s' % (query, policy))
+
+        if longFile:
+            _writeLongFile(longFile, [partPath for _, _, partPath in results if partPath])
+
+    finally:
+        if partsDir:
+            TempFile.remove(partsDir, raiseError=False)
+
+    if failed:
+        raise PygcamException("Failed to compute differences for %d query/scenario pairs: %s" % \
+                              (len(failed), ', '.join(failed)))
+
+def _writeLongFile(longFile, partPaths):
+    """
+    Concatenate the long-format differences saved in `partPaths` into a single
+    CSV file, holding one part in memory at a time.
+    """
+    import pandas as pd
+
+    # The union of the non-year columns of all queries, in order of appearance
+    columns = []
+    for path in partPaths:
+        df = pd.read_pickle(path)
+        columns += [col for col in df.columns if col not in columns]
+
+    idCols = [col for col in columns if col not in ('year', 'value')]
+    columns = idCols + ['year', 'value']
+
+    _logger.info("Writing %s", longFile)
+    with open(longFile, 'w') as f:
+        for i, path in enumerate(partPaths):
+            df = pd.read_pickle(path)
+            df.reindex(columns=columns).to_csv(f, index=None, header=(i == 0))
+
+def _readQueryNames(queryFile):
+    mainPart, extension = os.path.splitext(queryFile)
+
+    if extension.lower() == '.xml':
+        queryFileObj = QueryFile.parse(queryFile)
+        queries = queryFileObj.queryFilenames()
+    else:
+        with open(queryFile, 'r') as f:
+            lines = f.read()
+            queries = [line.strip() for line in lines.splitlines() if line.strip()]   # eliminates blank lines
+
+    return queries
+
 def diffMain(args):
-    workingDir = args.workingDir
+    from multiprocessing import cpu_count
+    from .config import getParamAsInt
+
+    workingDir = os.path.abspath(args.workingDir)
     mkdirs(workingDir)
     os.chdir(workingDir)
 
@@ -286,6 +659,7 @@ def diffMain(args):
     groupSum    = args.groupSum
     sum         = args.sum
     queryFile   = args.queryFile
+    stream      = args.stream
     yearStrs    = args.years.split('-')
     asPercentChange = args.asPercentChange
 
@@ -295,6 +669,26 @@ def diffMain(args):
     else:
         years = startYear = None
 
+    if args.group:
+        if not queryFile:
+            raise CommandlineError("The --group option requires --queryFile")
+
+        if stream:
+            raise CommandlineError("The --stream option cannot be used with --group")
+
+        baseline, policies = _groupScenarios(args.group)
+        queries = _readQueryNames(queryFile)
+        jobs = args.jobs or getParamAsInt('GCAM.DiffJobs') or cpu_count()
+
+        writeGroupDiffs(queries, baseline, policies, workingDir=workingDir, jobs=jobs,
+                        longFile=args.longFile, skiprows=skiprows, interpolate=interpolate,
+                        years=years, startYear=startYear, asPercentChange=asPercentChange,
+                        splitLand=splitLand)
+        return
+
+    if not args.csvFiles:
+        raise CommandlineError("At least one CSV file (or, with --queryFile, the baseline and policy names) is required")
+
     # If a query file is given, we loop over the query names, computing required arguments to performDiff().
     if queryFile:
         if len(args.csvFiles) != 2:
@@ -302,18 +696,7 @@ def diffMain(args):
 
         baseline, policy = args.csvFiles
 
-        # def makePath(query, scenario):
-        #     return pathjoin(scenario, QueryResultsDir, '%s-%s.csv' % (query, scenario))
-
-        mainPart, extension = os.path.splitext(queryFile)
-
-        if extension.lower() == '.xml':
-            queryFileObj = QueryFile.parse(queryFile)
-            queries = queryFileObj.queryFilenames()
-        else:
-            with open(queryFile, 'rU') as f:    # 'U' converts line separators to '\n' on Windows
-                lines = f.read()
-                queries = [line for line in lines.split('\n') if line]   # eliminates blank lines
+        queries = _readQueryNames(queryFile)
 
         for query in queries:
             baselineFile = queryCsvPathname(query, baseline, workingDir=workingDir)
@@ -325,7 +708,7 @@ def diffMain(args):
 
             writeDiffsToFile(outFile, baselineFile, [policyFile], ext='.csv', skiprows=skiprows,
                              interpolate=interpolate, years=years, startYear=startYear,
-                             splitLand=splitLand, asPercentChange=asPercentChange)
+                             splitLand=splitLand, asPercentChange=asPercentChange, stream=stream)
     else:
         csvFiles = [ensureCSV(f) for f in args.csvFiles]
         referenceFile = csvFiles[0]
@@ -341,6 +724,9 @@ def diffMain(args):
         if ext not in extensions:
             raise CommandlineError("Output file extension must be one of %s", extensions)
 
+        if stream and ext != '.csv':
+            raise CommandlineError("The --stream option requires a .csv output file")
+
         if convertOnly or groupSum or sum:
             if convertOnly:
                 csv2xlsx(csvFiles, outFile, skiprows=skiprows, interpolate=interpolate)
@@ -352,5 +738,5 @@ def diffMain(args):
 
         writeDiffsToFile(outFile, referenceFile, otherFiles, ext=ext, skiprows=skiprows,
                          interpolate=interpolate, years=years, startYear=startYear,
-                         splitLand=splitLand, asPercentChange=asPercentChange)
+                         splitLand=splitLand, asPercentChange=asPercentChange, stream=stream)
 
@@ -0,0 +1,330 @@
+'''
+.. Support for incremental project runs, in which project steps whose inputs
+   have not changed since they last ran successfully are skipped.
+
+.. Copyright (c) 2019 Richard Plevin
+   See the https://opensource.org/licenses/MIT for license details.
+'''
+import glob
+import hashlib
+import json
+import os
+import shlex
+import stat
+
+from .log import getLogger
+from .utils import mkdirs
+
+_logger = getLogger(__name__)
+
+# Increment if the way fingerprints are computed changes
+_FINGERPRINT_VERSION = 3
+
+def _digest(*items):
+    h = hashlib.sha1()
+    for item in items:
+        h.update(item.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def _contentDigest(pathname):
+    h = hashlib.sha1()
+    with open(pathname, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+
+    return h.hexdigest()
+
+def _stepName(key):
+    return key.rsplit('-', 1)[0]
+
+def _stepSeq(key):
+    return int(key.rsplit('-', 1)[1])
+
+def _commandFiles(command):
+    """
+    Return the absolute pathnames of existing files named in a step's command,
+    including those matched by wildcards and those given as "--option=file".
+    """
+    try:
+        words = shlex.split(command)
+    except ValueError:          # e.g., unbalanced quotes
+        words = command.split()
+
+    paths = set()
+    for word in words:
+        for name in word.split('='):
+            names = glob.glob(name) if any(c in name for c in '*?[') else [name]
+            paths.update([os.path.abspath(name) for name in names if os.path.isfile(name)])
+
+    return sorted(paths)
+
+
+class StepFingerprints(object):
+    """
+    Records a fingerprint of the inputs of each project step that completed
+    successfully for one scenario, so that steps whose inputs are unchanged
+    can be skipped. The fingerprint of a step combines:
+
+    - the step's command, after variable substitution, with the names of temporary
+      files (which differ on each run) replaced by digests of their contents,
+    - the contents of other files named in the command, except those the step
+      itself modified when it last ran,
+    - the project's config variables, other than those copied from the environment,
+    - the scenario's definition in the scenario setup file,
+    - the contents of the scenario's XML source files,
+    - the recorded fingerprints and outputs of the scenario's preceding steps,
+    - for policy scenarios, the recorded fingerprints and outputs of the baseline
+      steps named in ``GCAM.IncrementalBaselineSteps``, for each of which the
+      policy's own step of that name is this step or precedes it. For example,
+      the "diff" step depends on the baseline's "query" step, but the "setup"
+      step does not.
+
+    A step's outputs are the files in the scenario's sandbox that it created or
+    modified. A step is also re-run if any of its outputs has changed since it
+    ran. Since each step's fingerprint includes the recorded results of the
+    preceding steps, rather than of the steps that ran in the current
+    invocation, a step that is re-run causes the subsequent steps to be re-run,
+    whichever steps are selected. Records are saved as JSON in the file
+    ``.pygcam-steps.json`` in the scenario's sandbox.
+    """
+    FILENAME = '.pygcam-steps.json'
+
+    def __init__(self, scenarioDir):
+        self.scenarioDir = scenarioDir
+        self.path = os.path.join(scenarioDir, self.FILENAME)
+        self.steps = {}     # step key => {'fingerprint', 'outputs', 'written'}
+        self.files = {}     # pathname => [size, mtime_ns, sha1 of contents]
+        self.upstream = ''  # digest of the inputs common to all steps
+        self.baselineResults = {}   # baseline step name => digest of its results
+        self.stepKeys = None        # keys of the steps that apply to the scenario
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+
+        except Exception as e:
+            _logger.warning("Ignoring unreadable step record '%s': %s", self.path, e)
+            return
+
+        if data.get('version') == _FINGERPRINT_VERSION:
+            self.steps = data['steps']
+            self.files = data['files']
+
+    def save(self):
+        mkdirs(self.scenarioDir)
+        tmpPath = '%s.%d.tmp' % (self.path, os.getpid())
+        self.files = {path: info for path, info in self.files.items() if os.path.exists(path)}
+        data = {'version': _FINGERPRINT_VERSION, 'steps': self.steps, 'files': self.files}
+
+        with open(tmpPath, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+
+        os.replace(tmpPath, self.path)
+
+    def results(self, stepNames=None):
+        """
+        Return digests of the fingerprints and outputs of the recorded steps, by
+        step name, for use as inputs of dependent (i.e., policy) scenarios.
+
+        :param stepNames: (list of str) the names of the steps to include, or
+            None to include all steps
+        :return: (dict) step name => digest
+        """
+        byName = {}
+        for key in sorted(self.steps):
+            name = _stepName(key)
+            if stepNames is None or name in stepNames:
+                byName.setdefault(name, []).append('%s=%s' % (key, self.stepResult(key)))
+
+        return {name: _digest(*items) for name, items in byName.items()}
+
+    def stepResult(self, key):
+        """
+        Return a digest of the recorded fingerprint and outputs of a step.
+        """
+        record = self.steps[key]
+        outputs = sorted(record['outputs'].items())
+        return _digest(record['fingerprint'], *['%s=%s' % item for item in outputs])
+
+    def fileDigest(self, pathname):
+        """
+        Return the SHA1 digest of a file's contents, reusing the recorded digest
+        if the file's size and modification time are unchanged.
+        """
+        st = os.stat(pathname)
+        info = self.files.get(pathname)
+        if info and info[0] == st.st_size and info[1] == st.st_mtime_ns:
+            return info[2]
+
+        digest = _contentDigest(pathname)
+        self.files[pathname] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def dirDigest(self, dirname):
+        """
+        Return a digest of the names and contents of all files below `dirname`,
+        or of the empty string if `dirname` doesn't exist.
+        """
+        items = []
+        for root, dirs, files in os.walk(dirname):
+            dirs.sort()
+            for name in sorted(files):
+                pathname = os.path.join(root, name)
+                items.append('%s=%s' % (os.path.relpath(pathname, dirname), self.fileDigest(pathname)))
+
+        return _digest(*items)
+
+    def snapshot(self, command):
+        """
+        Return the size and modification time of each file in the scenario's
+        sandbox and each file named in `command`, to identify the files a step
+        modifies. Symbolic links, e.g., to the GCAM executable and input files,
+        are not followed.
+
+        :param command: (str) the step's command, after variable substitution
+        :return: (dict) pathname => (size, mtime_ns)
+        """
+        result = {}
+        for root, dirs, files in os.walk(self.scenarioDir):
+            for name in files:
+                if name.startswith(self.FILENAME):
+                    continue
+
+                pathname = os.path.join(root, name)
+                st = os.lstat(pathname)
+                if stat.S_ISREG(st.st_mode):
+                    result[pathname] = (st.st_size, st.st_mtime_ns)
+
+        for pathname in _commandFiles(command):
+            st = os.stat(pathname)
+            result[pathname] = (st.st_size, st.st_mtime_ns)
+
+        return result
+
+    def setInputs(self, configDict, scenarioXml, xmlSrcDir, baselineResults=None, stepKeys=None):
+        """
+        Set the inputs common to all the scenario's steps.
+
+        :param configDict: (dict) the project's config variables. Variables
+            created from environment variables (named "$" + name) are ignored
+            since they vary from one shell to the next.
+        :param scenarioXml: (str) the scenario's definition from the scenario setup file
+        :param xmlSrcDir: (str) the directory holding the scenario's XML source files
+        :param baselineResults: (dict) for policy scenarios, the baseline's
+            :py:meth:`results`; otherwise None.
+        :param stepKeys: (list of str) the keys of the steps that apply to the
+            scenario; records of other steps, e.g., those removed from the
+            project, are dropped. If None, policy steps depend on all the
+            steps in `baselineResults`.
+        :return: none
+        """
+        configItems = [(name, value) for name, value in configDict.items() if not name.startswith('$')]
+        configText = json.dumps(sorted(configItems))
+        self.upstream = _digest(str(_FINGERPRINT_VERSION), configText, scenarioXml,
+                                self.dirDigest(xmlSrcDir))
+
+        self.baselineResults = baselineResults or {}
+        self.stepKeys = stepKeys
+
+        if stepKeys is not None:
+            self.steps = {key: record for key, record in self.steps.items() if key in stepKeys}
+
+    def _dependsOnBaseline(self, stepName, seq):
+        """
+        Return True if the step with sequence number `seq` depends on the
+        baseline's step(s) named `stepName`.
+        """
+        if self.stepKeys is None:
+            return True
+
+        seqs = [_stepSeq(key) for key in self.stepKeys if _stepName(key) == stepName]
+        return not seqs or min(seqs) <= seq
+
+    def isCurrent(self, key, fingerprint):
+        """
+        Return True if the step identified by `key` last ran with the given
+        fingerprint and its outputs haven't changed since.
+        """
+        record = self.steps.get(key)
+        if not (record and record['fingerprint'] == fingerprint):
+            return False
+
+        for relpath, digest in record['outputs'].items():
+            pathname = os.path.join(self.scenarioDir, relpath)
+            if not (os.path.isfile(pathname) and self.fileDigest(pathname) == digest):
+                _logger.debug("Output '%s' of step %s has changed", pathname, key)
+                return False
+
+        return True
+
+    def stepFingerprint(self, key, command, tmpFiles=None, written=None):
+        """
+        Compute the fingerprint of the step identified by `key` that runs `command`.
+
+        :param key: (str) the step's key, i.e., "{name}-{seq}"
+        :param command: (str) the step's command, after variable substitution
+        :param tmpFiles: (list of str) pathnames of temporary files, which are
+            replaced in `command` by digests of their contents
+        :param written: (list of str) pathnames of files named in `command` that
+            are modified by the step and so are not inputs; by default, those
+            recorded when the step last ran.
+        :return: (str) the fingerprint
+        """
+        # Replace longer names first in case one name is a prefix of another
+        for pathname in sorted(tmpFiles or [], key=len, reverse=True):
+            if pathname in command:
+                command = command.replace(pathname, 'tmpFile:' + _contentDigest(pathname))
+
+        if written is None:
+            written = self.steps.get(key, {}).get('written', [])
+
+        written = set(written)
+        files = ['%s=%s' % (pathname, self.fileDigest(pathname))
+                 for pathname in _commandFiles(command) if pathname not in written]
+
+        seq = _stepSeq(key)
+        predecessors = ['%s=%s' % (other, self.stepResult(other))
+                        for other in sorted(self.steps) if _stepSeq(other) < seq]
+
+        baseline = ['baseline:%s=%s' % (name, digest) for name, digest in sorted(self.baselineResults.items())
+                    if self._dependsOnBaseline(name, seq)]
+
+        return _digest(self.upstream, key, command, *(files + predecessors + baseline))
+
+    def record(self, key, command, before, tmpFiles=None):
+        """
+        Record that the step identified by `key` completed successfully.
+
+        :param key: (str) the step's key, i.e., "{name}-{seq}"
+        :param command: (str) the step's command, after variable substitution
+        :param before: (dict) the :py:meth:`snapshot` taken before the step ran
+        :param tmpFiles: (list of str) pathnames of temporary files, as for
+            :py:meth:`stepFingerprint`
+        :return: none
+        """
+        after = self.snapshot(command)
+        changed = [pathname for pathname, info in after.items() if before.get(pathname) != info]
+
+        prefix = os.path.join(self.scenarioDir, '')
+        outputs = {os.path.relpath(pathname, self.scenarioDir): self.fileDigest(pathname)
+                   for pathname in changed if pathname.startswith(prefix)}
+
+        named = set(_commandFiles(command))
+        written = sorted([pathname for pathname in changed if pathname in named])
+
+        fingerprint = self.stepFingerprint(key, command, tmpFiles=tmpFiles, written=written)
+        self.steps[key] = {'fingerprint': fingerprint, 'outputs': outputs, 'written': written}
+        self.save()
+
+    def forget(self, key):
+        """
+        Remove the record for a step that failed, so it is re-run next time.
+        """
+        if self.steps.pop(key, None):
+            self.save()
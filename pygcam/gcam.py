@@ -10,7 +10,7 @@ import re
 import subprocess
 from semver import VersionInfo
 
-from .config import getParam, getParamAsBoolean, parse_version_info, pathjoin, unixPath
+from .config import getParam, getParamAsBoolean, getParamAsInt, parse_version_info, pathjoin, unixPath
 from .error import ProgramExecutionError, GcamError, GcamSolverError, PygcamException, ConfigFileError
 from .log import getLogger
 from .scenarioSetup import createSandbox
@@ -118,25 +118,30 @@ def setJavaPath(exeDir):
     os.environ['CLASSPATH'] = classpath = envClasspath + ';' + javaBinServer + ';' + miClasspath
     _logger.debug('CLASSPATH=%s', classpath)
 
+_ModelDidNotSolve = 'Model did not solve'
+_wrapperFilterPattern = re.compile('(.*(BaseXException|%s).*)' % _ModelDidNotSolve)
+
+# Matches the same lines as _wrapperFilterPattern, but in undecoded output
+_wrapperScanPattern = re.compile(('BaseXException|%s' % _ModelDidNotSolve).encode('utf-8'))
+
 def _wrapperFilter(line):
     """
-    Default filter for GCAM wrapper. Return True if process should be terminated.
+    Default filter for GCAM wrapper. Return an error if process should be terminated.
 
     :param line: (str) a single line of text emitted by GCAM to stdout.
     :return: (GcamError or None): If not None, caller raises the given error
         and terminates the GCAM process.
     """
-    modelDidNotSolve = 'Model did not solve'
-    pattern = re.compile('(.*(BaseXException|%s).*)' % modelDidNotSolve)
-
-    match = re.search(pattern, line)
+    match = _wrapperFilterPattern.search(line)
 
     if match:
         msg = 'GCAM error: ' + match.group(0)
-        if match.group(1) == modelDidNotSolve:
-            raise GcamSolverError(msg)
+        if match.group(2) == _ModelDidNotSolve:
+            return GcamSolverError(msg)
         else:
-            raise GcamError(msg)
+            return GcamError(msg)
+
+    return None
 
 def _loadWrapperFilter(spec):
     """
@@ -161,7 +166,125 @@ def _loadWrapperFilter(spec):
 
     return func
 
+# Values for GCAM.WrapperOutput
+WRAPPER_OUTPUT_ALL    = 'all'
+WRAPPER_OUTPUT_SAMPLE = 'sample'
+WRAPPER_OUTPUT_ERRORS = 'errors'
+WRAPPER_OUTPUT_NONE   = 'none'
+WRAPPER_OUTPUTS = (WRAPPER_OUTPUT_ALL, WRAPPER_OUTPUT_SAMPLE, WRAPPER_OUTPUT_ERRORS, WRAPPER_OUTPUT_NONE)
+
+_WRAPPER_READ_SIZE = 1 << 16
+
+
+class _OutputScanner(object):
+    """
+    Scans GCAM's output in large chunks rather than line by line. With the default
+    filter, each chunk of complete lines is searched once with a precompiled pattern
+    and only a line that matches is decoded. A user's filter function (see
+    GCAM.WrapperFilterFunction) is still called for each line. Output is written
+    as raw bytes to `out`, bypassing the logging system, subject to `verbosity`:
+    "all" lines, every `sampleLines`-th line ("sample"), only the line that caused
+    an error ("errors"), or nothing ("none").
+    """
+    def __init__(self, out, filterFunc=None, verbosity=WRAPPER_OUTPUT_ALL, sampleLines=100):
+        self.out = out
+        self.filterFunc = filterFunc
+        self.verbosity = verbosity
+        self.sampleLines = max(1, sampleLines)
+        self.pending = b''      # partial line carried over to the next chunk
+        self.lines = 0
+        self.bytes = 0
+
+    def feed(self, chunk):
+        """
+        Process a chunk of output.
+
+        :param chunk: (bytes) output read from GCAM; b'' indicates EOF.
+        :return: (GcamError or None) an error if GCAM should be terminated
+        """
+        self.bytes += len(chunk)
+        data = self.pending + chunk
+
+        if chunk:
+            end = data.rfind(b'\n') + 1
+            if end == 0 and len(data) < 4 * _WRAPPER_READ_SIZE:
+                self.pending = data
+                return None
+        else:
+            end = len(data)     # EOF: process any final, unterminated line
+
+        self.pending = data[end:]
+        return self._scan(data[:end])
+
+    def _scan(self, data):
+        if not data:
+            return None
+
+        if self.filterFunc:
+            return self._scanLines(data)
+
+        match = _wrapperScanPattern.search(data)
+        if match is None:
+            self._write(data)
+            return None
+
+        # Write output through the end of the offending line
+        end = data.find(b'\n', match.end()) + 1 or len(data)
+        start = data.rfind(b'\n', 0, match.start()) + 1
+        self._write(data[:start])
+        line = data[start:end]
+        self._writeError(line)
+        return _wrapperFilter(line.decode('utf-8', 'replace'))
+
+    def _scanLines(self, data):
+        start = 0
+        while start < len(data):
+            end = data.find(b'\n', start) + 1 or len(data)
+            line = data[start:end]
+            error = self.filterFunc(line.decode('utf-8', 'replace'))
+            if error:
+                self._write(data[:start])
+                self._writeError(line)
+                return error
+
+            start = end
+
+        self._write(data)
+        return None
+
+    def _write(self, data):
+        if not data:
+            return
+
+        firstLine = self.lines
+        self.lines += data.count(b'\n')
+
+        if self.verbosity == WRAPPER_OUTPUT_ALL:
+            self.out.write(data)
+
+        elif self.verbosity == WRAPPER_OUTPUT_SAMPLE:
+            # Write the lines whose 0-relative line number is a multiple of sampleLines
+            lineNum = -(-firstLine // self.sampleLines) * self.sampleLines
+            lines = data.splitlines(True)
+            self.out.write(b''.join(lines[lineNum - firstLine::self.sampleLines]))
+
+    def _writeError(self, line):
+        self.lines += 1
+        if self.verbosity != WRAPPER_OUTPUT_NONE:
+            self.out.write(line if line.endswith(b'\n') else line + b'\n')
+
+
 def _gcamWrapper(args):
+    """
+    Run GCAM, scanning its output for errors and terminating it as soon as
+    one is found. See _OutputScanner and config variables GCAM.WrapperOutput,
+    GCAM.WrapperSampleLines, and GCAM.WrapperLogFile.
+
+    :param args: (list of str) the GCAM command and its arguments
+    :return: (int) GCAM's exit status
+    """
+    import sys
+
     try:
         _logger.debug('Starting gcam with wrapper')
         gcamProc = subprocess.Popen(args, bufsize=0, stdout=subprocess.PIPE,
@@ -172,21 +295,36 @@ def _gcamWrapper(args):
         raise PygcamException(msg)
 
     filterSpec = getParam('GCAM.WrapperFilterFunction')
-    wrapperFilter = _loadWrapperFilter(filterSpec) if filterSpec else _wrapperFilter
+    filterFunc = _loadWrapperFilter(filterSpec) if filterSpec else None
 
-    gcamOut = gcamProc.stdout
+    verbosity = getParam('GCAM.WrapperOutput').lower()
+    if verbosity not in WRAPPER_OUTPUTS:
+        gcamProc.kill()
+        raise ConfigFileError("GCAM.WrapperOutput must be one of %s; got '%s'" % (WRAPPER_OUTPUTS, verbosity))
 
-    while True:
-        line = gcamOut.readline().decode('utf-8')
-        if line == '':
-            break
+    logFile = getParam('GCAM.WrapperLogFile')
+    out = open(logFile, 'ab') if logFile else getattr(sys.stdout, 'buffer', sys.stdout)
 
-        _logger.info(line.rstrip())          # see if this ends up in worker.log
+    scanner = _OutputScanner(out, filterFunc=filterFunc, verbosity=verbosity,
+                             sampleLines=getParamAsInt('GCAM.WrapperSampleLines'))
+    gcamOut = gcamProc.stdout
+
+    try:
+        while True:
+            chunk = gcamOut.read(_WRAPPER_READ_SIZE)
+            error = scanner.feed(chunk)
+            if error:
+                gcamProc.terminate()
+                raise error
+
+            if not chunk:
+                break
+    finally:
+        out.flush()
+        if logFile:
+            out.close()
 
-        error = wrapperFilter(line)
-        if error:
-            gcamProc.terminate()
-            raise error
+        _logger.info('gcamWrapper: GCAM wrote %d lines (%d bytes)', scanner.lines, scanner.bytes)
 
     _logger.debug('gcamWrapper found EOF. Waiting for GCAM to exit...')
     status = gcamProc.wait()
@@ -0,0 +1,207 @@
+'''
+.. Bounded, least-recently-used caches sharing a single memory budget.
+
+   The caches of parsed CSV files, XML trees, and query results all register
+   here so that the total (estimated) memory they hold is limited by the config
+   variable ``GCAM.CacheMaxMB``. When the budget is exceeded, the least recently
+   used items across all caches are evicted, calling the owning cache's
+   `onEvict` function (e.g., to write back modified XML files).
+
+.. Copyright (c) 2019 Richard Plevin
+   See the https://opensource.org/licenses/MIT for license details.
+'''
+import atexit
+import os
+import sys
+from collections import OrderedDict
+
+from .log import getLogger
+
+_logger = getLogger(__name__)
+
+# Rough ratio of an lxml tree's memory footprint to the size of the XML file
+XML_TREE_SIZE_FACTOR = 4
+
+_MB = 1024 * 1024
+
+def sizeofDataFrame(df):
+    """
+    Estimate the memory used by a pandas DataFrame, including string contents.
+    """
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+def sizeofXmlFile(filename):
+    """
+    Estimate the memory used by the parsed lxml tree for `filename` based on
+    the size of the file.
+    """
+    try:
+        return os.path.getsize(filename) * XML_TREE_SIZE_FACTOR
+    except OSError:
+        return 0
+
+class LRUCache(object):
+    """
+    A dict-like cache whose items are evicted in least-recently-used order
+    when the total size of all registered caches exceeds ``GCAM.CacheMaxMB``.
+    Items are sized by calling `sizeof` on the cached value when it is stored.
+    """
+    # All LRUCache instances share this ordering and byte count
+    _order = OrderedDict()      # (cache, key) -> size, oldest first
+    _totalBytes = 0
+    _maxBytes = None            # read from config on first use
+
+    instances = []
+
+    def __init__(self, name, sizeof=sys.getsizeof, onEvict=None):
+        """
+        :param name: (str) name used when reporting statistics
+        :param sizeof: (callable) function taking a cached value and returning
+            its estimated size in bytes
+        :param onEvict: (callable) optional function called with (key, value)
+            when an item is evicted to reduce memory use
+        """
+        self.name = name
+        self.sizeof = sizeof
+        self.onEvict = onEvict
+        self.data = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+
+        self.instances.append(self)
+
+    def __repr__(self):
+        return "<LRUCache %s items=%d bytes=%d hits=%d misses=%d evictions=%d>" % \
+               (self.name, len(self.data), self.bytes, self.hits, self.misses, self.evictions)
+
+    @classmethod
+    def maxBytes(cls):
+        """
+        Return the shared byte budget, or 0 if caches are unbounded. The value
+        is read from ``GCAM.CacheMaxMB`` once the configuration has been loaded.
+        """
+        from .config import configLoaded, getParamAsInt
+
+        if cls._maxBytes is None:
+            if not configLoaded():
+                return 0
+
+            cls._maxBytes = getParamAsInt('GCAM.CacheMaxMB') * _MB
+
+        return cls._maxBytes
+
+    @classmethod
+    def setMaxMB(cls, megabytes):
+        """
+        Set the shared byte budget, overriding ``GCAM.CacheMaxMB``, and evict
+        items if needed. A value of 0 means unbounded.
+        """
+        cls._maxBytes = int(megabytes * _MB)
+        cls._shrink()
+
+    @classmethod
+    def _shrink(cls):
+        maxBytes = cls.maxBytes()
+        if not maxBytes:
+            return
+
+        # Always leave the most recently used item in place, however large
+        while cls._totalBytes > maxBytes and len(cls._order) > 1:
+            (cache, key), _ = next(iter(cls._order.items()))
+            cache._evict(key)
+
+    def _touch(self, key):
+        self._order.move_to_end((self, key))
+
+    def _remove(self, key):
+        value = self.data.pop(key)
+        size = self._order.pop((self, key))
+        self.bytes -= size
+        LRUCache._totalBytes -= size
+        return value
+
+    def _evict(self, key):
+        value = self._remove(key)
+        self.evictions += 1
+        _logger.debug("Evicting '%s' from %s cache", key, self.name)
+
+        if self.onEvict:
+            self.onEvict(key, value)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, key):
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            raise
+
+        self.hits += 1
+        self._touch(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        if key in self.data:
+            self._remove(key)
+
+        size = self.sizeof(value)
+        self.data[key] = value
+        self._order[(self, key)] = size
+        self.bytes += size
+        LRUCache._totalBytes += size
+
+        self._shrink()
+
+    def __delitem__(self, key):
+        self._remove(key)
+
+    def pop(self, key, *default):
+        if key not in self.data and default:
+            return default[0]
+
+        return self._remove(key)
+
+    def keys(self):
+        return list(self.data.keys())
+
+    def values(self):
+        return list(self.data.values())
+
+    def items(self):
+        return list(self.data.items())
+
+    def clear(self):
+        for key in self.keys():
+            self._remove(key)
+
+    @classmethod
+    def logStats(cls, level='info'):
+        """
+        Log the hit, miss, eviction, and byte counts for all caches.
+        """
+        log = getattr(_logger, level)
+        for cache in cls.instances:
+            log("Cache %s: %d items, %.1f MB, %d hits, %d misses, %d evictions",
+                cache.name, len(cache), cache.bytes / _MB, cache.hits, cache.misses, cache.evictions)
+
+def _logStatsAtExit():
+    from .config import configLoaded, getParamAsBoolean
+
+    if configLoaded() and getParamAsBoolean('GCAM.CacheStatsAtExit'):
+        LRUCache.logStats()
+
+atexit.register(_logStatsAtExit)
@@ -31,7 +31,7 @@ from . import util as U
 from .constants import RegionMap
 from .error import PygcamMcsUserError, PygcamMcsSystemError
 from .schema import (ORMBase, Run, Sim, Input, Output, InValue, OutValue, Experiment,
-                     Program, Code, Region, TimeSeries)
+                     Program, Code, Region, TimeSeries, TimeSeriesValue, LiveSummary)
 
 _logger = getLogger(__name__)
 
@@ -49,6 +49,21 @@ def usingPostgres():
     url = getParam('MCS.DbURL')
     return url.lower().startswith('postgres')
 
+TS_STORAGE_WIDE = 'wide'
+TS_STORAGE_LONG = 'long'
+
+def usingLongTimeSeries():
+    '''
+    Return True if time-series results are stored in "long" format (see
+    config variable MCS.TimeSeriesStorage), else return False.
+    '''
+    storage = getParam('MCS.TimeSeriesStorage').lower()
+    if storage not in (TS_STORAGE_WIDE, TS_STORAGE_LONG):
+        raise PygcamMcsUserError("MCS.TimeSeriesStorage must be '%s' or '%s'; got '%s'" %
+                                 (TS_STORAGE_WIDE, TS_STORAGE_LONG, storage))
+
+    return storage == TS_STORAGE_LONG
+
 
 @event.listens_for(Engine, "connect")
 def sqlite_FK_pragma(dbapi_connection, connection_record):
@@ -156,6 +171,47 @@ def parseSqlScript(filename=None, text=None):
 
     return statements
 
+# Max number of values in an "IN" clause; SQLite allows at most 999 variables per statement
+_MAX_SQL_VARS = 500
+
+def _toFloat(value):
+    return None if value is None else float(value)
+
+def _groupByRun(rows):
+    '''
+    Return a list of (runId, list of outputIds) for the given dicts with keys 'runId' and 'outputId'.
+    '''
+    outputsByRun = {}
+    for row in rows:
+        outputsByRun.setdefault(row['runId'], []).append(row['outputId'])
+
+    return list(outputsByRun.items())
+
+def _copyRows(session, tableName, colNames, rows):
+    '''
+    Insert rows into a Postgres table using COPY, within the session's transaction.
+    '''
+    import csv
+    from six import StringIO
+
+    nullStr = r'\N'
+
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([nullStr if row[name] is None else row[name] for name in colNames])
+
+    buffer.seek(0)
+    cols = ', '.join(['"%s"' % name for name in colNames])
+    sql = "COPY %s (%s) FROM STDIN WITH (FORMAT csv, NULL '%s')" % (tableName, cols, nullStr)
+
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+
+
 class CoreDatabase(object):
 
     def __init__(self):
@@ -495,12 +551,16 @@ class CoreDatabase(object):
         return outputId
 
     def getOutputIds(self, nameList):
-        # cache on first call
-        if not self.outputIds:
+        # cache on first call, and again if outputs were added since then
+        if not (self.outputIds and all(name in self.outputIds for name in nameList)):
             with self.sessionScope() as session:
                 rows = session.query(Output.name, Output.outputId).all()
                 self.outputIds = dict(rows)
 
+        missing = [name for name in nameList if name not in self.outputIds]
+        if missing:
+            raise PygcamMcsSystemError("Outputs %s were not found in the Output table" % missing)
+
         # lookup ids in cache
         ids = [self.outputIds[name] for name in nameList]
         return ids
@@ -560,6 +620,36 @@ class CoreDatabase(object):
             self.commitWithRetry(sess)
             self.endSession(sess)
 
+    def upsertOutValues(self, rows, session):
+        '''
+        Insert or replace OutValue rows using a single (executemany) statement.
+        The caller is responsible for committing the session.
+
+        :param rows: (list of dict) dicts with keys 'runId', 'outputId', and 'value'
+        :param session: the session to use
+        :return: none
+        '''
+        if not rows:
+            return
+
+        table = OutValue.__table__
+
+        if usingPostgres():
+            from sqlalchemy.dialects.postgresql import insert
+
+            stmt = insert(table)
+            stmt = stmt.on_conflict_do_update(index_elements=[table.c.outputId, table.c.runId],
+                                              set_={'value': stmt.excluded.value})
+        elif usingSqlite():
+            stmt = table.insert().prefix_with('OR REPLACE')
+
+        else:
+            for runId, outputIds in _groupByRun(rows):
+                self.deleteRunResults(runId, outputIds=outputIds, session=session)
+            stmt = table.insert()
+
+        session.execute(stmt, rows)
+
     def getOutValues(self, simId, expName, outputName, limit=None):
         '''
         Return a pandas DataFrame with columns trialNum and name outputName,
@@ -590,6 +680,83 @@ class CoreDatabase(object):
         resultDF = DataFrame.from_records(rslt, columns=['trialNum', outputName], index='trialNum')
         return resultDF
 
+    def getOutValuesBulk(self, simId, expList, outputList, limit=None, chunkSize=10000, asArrays=False):
+        '''
+        Return the values of the given outputs for the given experiments, fetched
+        with one query per group of up to 500 outputs rather than one query per
+        experiment and output. Rows are fetched `chunkSize` at a time and each chunk
+        is converted directly to NumPy arrays, so the full set of rows is never
+        held as Python objects.
+
+        :param simId: (int) simulation ID
+        :param expList: (list of str) the names of experiments to get results for
+        :param outputList: (list of str) the names of outputs to get results for
+        :param limit: (int) if not None and > 0, return only the first `limit` trials
+            with values for each (expName, outputName) pair, as with getOutValues.
+            Other values are NaN, and trials with no values are dropped.
+        :param chunkSize: (int) the number of rows to fetch at a time
+        :param asArrays: (bool) if True, return a tuple of (trialNums, columns,
+            values) rather than a DataFrame.
+        :return: (pandas.DataFrame) indexed by trialNum, with a column for each
+            (expName, outputName) pair, as a 2-level column index. Values not in
+            the database are NaN. If `asArrays` is True, a tuple of a 1-D int array
+            of trial numbers, a list of (expName, outputName) tuples, and a 2-D
+            float array with a row per trial and a column per pair.
+        '''
+        import numpy as np
+        import pandas as pd
+
+        with self.sessionScope() as session:
+            expIds = dict(session.query(Experiment.expName, Experiment.expId).
+                          filter(Experiment.expName.in_(expList)).all())
+
+        outputIds = dict(zip(outputList, self.getOutputIds(outputList)))
+
+        columns = [(expName, outputName) for expName in expList for outputName in outputList]
+        colIndex = {(expIds.get(expName), outputIds[outputName]): i for i, (expName, outputName) in enumerate(columns)}
+
+        trialChunks, colChunks, valueChunks = [], [], []
+        ids = list(outputIds.values())
+
+        with self.sessionScope() as session:
+            for start in xrange(0, len(ids), _MAX_SQL_VARS):
+                query = session.query(Run.trialNum, Run.expId, OutValue.outputId, OutValue.value). \
+                    filter(Run.simId == simId, Run.expId.in_(list(expIds.values()))). \
+                    join(OutValue, OutValue.runId == Run.runId). \
+                    filter(OutValue.outputId.in_(ids[start:start + _MAX_SQL_VARS]))
+
+                result = session.execute(query.statement)
+                while True:
+                    rows = result.fetchmany(chunkSize)
+                    if not rows:
+                        break
+
+                    trialNums, expIdCol, outputIdCol, values = zip(*rows)
+                    trialChunks.append(np.array(trialNums, dtype=int))
+                    colChunks.append(np.array([colIndex[pair] for pair in zip(expIdCol, outputIdCol)], dtype=int))
+                    valueChunks.append(np.array(values, dtype=float))
+
+        if trialChunks:
+            allTrials = np.concatenate(trialChunks)
+            trialNums, rowCodes = np.unique(allTrials, return_inverse=True)
+            data = np.full((len(trialNums), len(columns)), np.nan)
+            data[rowCodes, np.concatenate(colChunks)] = np.concatenate(valueChunks)
+        else:
+            trialNums = np.array([], dtype=int)
+            data = np.full((0, len(columns)), np.nan)
+
+        if limit is not None and limit > 0:
+            data[np.cumsum(~np.isnan(data), axis=0) > limit] = np.nan
+            keep = ~np.isnan(data).all(axis=1)
+            trialNums = trialNums[keep]
+            data = data[keep]
+
+        if asArrays:
+            return trialNums, columns, data
+
+        index = pd.Index(trialNums, name='trialNum')
+        return pd.DataFrame(data, index=index, columns=pd.MultiIndex.from_tuples(columns, names=['expName', 'outputName']))
+
     def deleteRunResults(self, runId, outputIds=None, session=None):
         sess = session or self.Session()
 
@@ -989,6 +1156,13 @@ class GcamDatabase(CoreDatabase):
         self.addYearCols(alterTable=False)
         self.addExpCols(alterTable=False)
 
+        # Databases created before "long" storage was available lack this table
+        if usingLongTimeSeries():
+            TimeSeriesValue.__table__.create(bind=self.engine, checkfirst=True)
+
+        if getParamAsBoolean('MCS.LiveSummary'):
+            LiveSummary.__table__.create(bind=self.engine, checkfirst=True)
+
     def createExp(self, name, parent=None, description=None):
         '''
         Insert a row for the given experiment. Replaces superclass method
@@ -1209,10 +1383,11 @@ class GcamDatabase(CoreDatabase):
         sess = session or self.Session()
         super(GcamDatabase, self).deleteRunResults(runId, outputIds=outputIds, session=sess)
 
-        query = sess.query(TimeSeries).filter_by(runId=runId)
+        tableClass = TimeSeriesValue if usingLongTimeSeries() else TimeSeries
+        query = sess.query(tableClass).filter_by(runId=runId)
 
         if outputIds:
-            query = query.filter(TimeSeries.outputId.in_(outputIds))
+            query = query.filter(tableClass.outputId.in_(outputIds))
 
         query.delete(synchronize_session='fetch')
 
@@ -1220,6 +1395,131 @@ class GcamDatabase(CoreDatabase):
             self.commitWithRetry(sess)
             self.endSession(sess)
 
+    def saveRunResults(self, runResults, session=None):
+        '''
+        Save the results of a batch of runs, replacing any previous values for the
+        same runs and outputs. Rather than querying and adding ORM objects value by
+        value, output ids are looked up in memory, scalar results are upserted with
+        a single statement, and time-series results are inserted with a single
+        statement (or COPY, with Postgres) after one DELETE of stale series per set
+        of runs with the same outputs.
+
+        :param runResults: (list of (int, list of dict)) pairs of runId and the
+            results for that run, as returned by XMLResultFile.collectResults
+        :param session: a session to use, in which case the caller is responsible
+            for committing it; if None, a session is created and committed.
+        :return: none
+        '''
+        names = list(set(resultDict['paramName'] for _, resultsList in runResults for resultDict in resultsList))
+        outputIdMap = dict(zip(names, self.getOutputIds(names)))
+        yearCols = self.yearCols()
+
+        scalarRows = []
+        seriesRows = []
+        for runId, resultsList in runResults:
+            for resultDict in resultsList:
+                outputId = outputIdMap[resultDict['paramName']]
+                value = resultDict['value']
+
+                if resultDict['isScalar']:
+                    scalarRows.append(dict(runId=runId, outputId=outputId, value=_toFloat(value)))
+                else:
+                    row = dict(runId=runId, outputId=outputId, units=resultDict['units'],
+                               regionId=self.getRegionId(resultDict['regionName']))
+                    for col in yearCols:
+                        row[col] = _toFloat(value.get(col))
+
+                    seriesRows.append(row)
+
+        sess = session or self.Session()
+        try:
+            self.upsertOutValues(scalarRows, sess)
+
+            if usingLongTimeSeries():
+                self._replaceLongTimeSeries(seriesRows, yearCols, sess)
+            else:
+                self._replaceTimeSeries(seriesRows, yearCols, sess)
+
+            if session is None:
+                self.commitWithRetry(sess)
+
+        except:
+            if session is None:
+                sess.rollback()
+            raise
+
+        finally:
+            if session is None:
+                self.endSession(sess)
+
+    @staticmethod
+    def _deleteTimeSeries(tableClass, rows, session):
+        '''
+        Delete rows of `tableClass` for the (runId, outputId) pairs in `rows`.
+        '''
+        # Runs in a batch generally have the same outputs, so this is usually one DELETE
+        runsByOutputs = {}
+        for runId, outputIds in _groupByRun(rows):
+            runsByOutputs.setdefault(frozenset(outputIds), []).append(runId)
+
+        for outputIds, runIds in iteritems(runsByOutputs):
+            for start in xrange(0, len(runIds), _MAX_SQL_VARS):
+                query = session.query(tableClass).filter(tableClass.runId.in_(runIds[start:start + _MAX_SQL_VARS]),
+                                                         tableClass.outputId.in_(outputIds))
+                query.delete(synchronize_session=False)
+
+    def _replaceTimeSeries(self, rows, yearCols, session):
+        '''
+        Delete timeseries rows for the (runId, outputId) pairs in `rows`, and insert `rows`.
+        '''
+        from sqlalchemy.sql import table, column
+
+        if not rows:
+            return
+
+        self._deleteTimeSeries(TimeSeries, rows, session)
+
+        colNames = ['runId', 'outputId', 'regionId', 'units'] + yearCols
+
+        if usingPostgres():
+            _copyRows(session, 'timeseries', colNames, rows)
+        else:
+            # Year columns may not be in TimeSeries.__table__, so describe the table here
+            tsTable = table('timeseries', *[column(name) for name in colNames])
+            session.execute(tsTable.insert(), rows)
+
+    def _replaceLongTimeSeries(self, rows, yearCols, session):
+        '''
+        Like _replaceTimeSeries, but stores each year's (non-null) value in its own
+        row of the timeseriesvalue table. Units are saved in the Output table if
+        not already set there.
+        '''
+        from .util import stripYearPrefix
+
+        if not rows:
+            return
+
+        self._deleteTimeSeries(TimeSeriesValue, rows, session)
+
+        years = [stripYearPrefix(col) for col in yearCols]
+        valueRows = [dict(runId=row['runId'], outputId=row['outputId'], regionId=row['regionId'],
+                          year=year, value=row[col])
+                     for row in rows for year, col in zip(years, yearCols) if row[col] is not None]
+
+        if usingPostgres():
+            _copyRows(session, 'timeseriesvalue', ['runId', 'outputId', 'regionId', 'year', 'value'], valueRows)
+        elif valueRows:
+            session.execute(TimeSeriesValue.__table__.insert(), valueRows)
+
+        unitsByOutput = {row['outputId']: row['units'] for row in rows if row['units']}
+        outputIdsByUnits = {}
+        for outputId, units in iteritems(unitsByOutput):
+            outputIdsByUnits.setdefault(units, []).append(outputId)
+
+        for units, outputIds in iteritems(outputIdsByUnits):
+            session.query(Output).filter(Output.outputId.in_(outputIds), Output.units == None). \
+                update({Output.units: units}, synchronize_session=False)
+
     def saveTimeSeries(self, runId, regionId, paramName, values, units=None, session=None):
         sess = session or self.Session()
 
@@ -1255,17 +1555,173 @@ class GcamDatabase(CoreDatabase):
            results for.
         :return: list of TimeSeries tuples or None
         '''
-        cols = ['seriesId', 'runId', 'outputId', 'units'] + self.yearCols()
+        cols = ['seriesId', 'runId', 'outputId', 'regionId', 'units'] + self.yearCols()
 
         with self.sessionScope() as session:
             query = session.query(TimeSeries, Experiment.expName).options(load_only(*cols)). \
-                join(Run).filter_by(simId=simId).filter_by(status='succeeded'). \
-                join(Experiment).filter(Experiment.expName.in_(expList)). \
-                join(Output).filter_by(name=paramName)
+                join(Run, TimeSeries.runId == Run.runId).filter_by(simId=simId).filter_by(status='succeeded'). \
+                join(Experiment, Run.expId == Experiment.expId).filter(Experiment.expName.in_(expList)). \
+                join(Output, TimeSeries.outputId == Output.outputId).filter_by(name=paramName)
 
             rslt = query.all()
             return rslt
 
+    def getTimeSeriesValues(self, simId, paramName, expList):
+        '''
+        Retrieve the time-series results for the given simId and paramName from
+        successful runs of the given experiments, in either storage format (see
+        MCS.TimeSeriesStorage). Rows are read without creating ORM objects and
+        the values are assembled into a single 2-D float array.
+
+        :param simId: simulation ID
+        :param paramName: name of output parameter
+        :param expList: (list of str) the names of the experiments to select
+           results for.
+        :return: (pandas.DataFrame) columns 'runId', 'regionId', 'expName' and
+           'units', followed by a float column for each year (as int), with one
+           row per run and region, or None if there are no results.
+        '''
+        import numpy as np
+        import pandas as pd
+        from .util import stripYearPrefix
+
+        isLong = usingLongTimeSeries()
+        tableClass = TimeSeriesValue if isLong else TimeSeries
+
+        yearCols = self.yearCols()
+        years = [stripYearPrefix(col) for col in yearCols]
+
+        if isLong:
+            cols = [TimeSeriesValue.year, TimeSeriesValue.value]
+        else:
+            cols = [getattr(TimeSeries, col) for col in yearCols]
+
+        # Filtering on outputId saves a join with the Output table. In "long"
+        # format, the filter can use the (outputId, runId) index on the
+        # timeseriesvalue table; the "wide" timeseries table has no such index.
+        if paramName not in self.getOutputs():
+            return None
+
+        outputId = self.getOutputIds([paramName])[0]
+
+        with self.sessionScope() as session:
+            query = session.query(tableClass.runId, tableClass.regionId, Experiment.expName, *cols). \
+                filter(tableClass.outputId == outputId). \
+                join(Run, Run.runId == tableClass.runId).filter(Run.simId == simId, Run.status == RUN_SUCCEEDED). \
+                join(Experiment, Experiment.expId == Run.expId).filter(Experiment.expName.in_(expList))
+
+            if not isLong:
+                query = query.add_columns(TimeSeries.units)
+
+            # Execute the statement directly to avoid per-row object creation
+            rows = session.execute(query.statement).fetchall()
+
+        if not rows:
+            return None
+
+        # Transpose rows to columns; much faster than converting row objects with numpy
+        columns = list(zip(*rows))
+
+        if isLong:
+            runIds, regionIds, expNames, yearValues, values = columns
+            keys = pd.MultiIndex.from_arrays([np.array(runIds, dtype=int), np.array(regionIds, dtype=int)])
+            keyCodes, uniqueKeys = pd.factorize(keys)
+
+            # Include all years in MCS.Years, as in "wide" format, even if no values were saved
+            yearValues = np.array(yearValues, dtype=int)
+            allYears = np.union1d(years, yearValues)
+            yearCodes = np.searchsorted(allYears, yearValues)
+
+            data = np.full((len(uniqueKeys), len(allYears)), np.nan)
+            data[keyCodes, yearCodes] = np.array(values, dtype=float)
+
+            names = np.empty(len(uniqueKeys), dtype=object)
+            names[keyCodes] = expNames
+
+            index = pd.DataFrame({'runId': uniqueKeys.get_level_values(0),
+                                  'regionId': uniqueKeys.get_level_values(1),
+                                  'expName': names,
+                                  'units': self.getOutputUnits(paramName)})
+            years = allYears.tolist()
+        else:
+            data = np.array(columns[3:-1], dtype=float).T
+            index = pd.DataFrame({'runId': np.array(columns[0], dtype=int),
+                                  'regionId': np.array(columns[1], dtype=int),
+                                  'expName': columns[2],
+                                  'units': columns[-1]})
+
+        valueDF = pd.DataFrame(data, columns=years)
+        return pd.concat([index, valueDF], axis=1)
+
+    def saveLiveSummary(self, rows):
+        '''
+        Save running statistics computed by summaryStats.LiveAggregator, replacing
+        those previously saved for the same simulation, experiment, and output.
+
+        :param rows: (list of dict) values for the columns of the LiveSummary
+            table, with 'expName' and 'outputName' rather than their ids.
+        :return: none
+        '''
+        outputNames = list(set(row['outputName'] for row in rows))
+        outputIdMap = dict(zip(outputNames, self.getOutputIds(outputNames)))
+
+        with self.sessionScope() as session:
+            expIdMap = {}
+            for row in rows:
+                row = dict(row)
+                expName = row.pop('expName')
+                if expName not in expIdMap:
+                    expIdMap[expName] = self.getExpId(expName, session=session)
+
+                row['expId'] = expIdMap[expName]
+                row['outputId'] = outputIdMap[row.pop('outputName')]
+                row = {key: (None if isinstance(value, float) and value != value else value)   # NaN => NULL
+                       for key, value in row.items()}
+                session.merge(LiveSummary(**row))
+
+    def getLiveSummary(self, simId, expList=None, outputList=None):
+        '''
+        Return the running statistics saved by "gt runsim" for the given simulation.
+
+        :param simId: (int) simulation ID
+        :param expList: (list of str) experiments to select; default is all
+        :param outputList: (list of str) outputs to select; default is all
+        :return: (pandas.DataFrame) a row for each experiment and output, with
+            columns 'expName', 'outputName', and the columns of the LiveSummary
+            table other than the ids. The 'histogram' and 'importance' columns
+            are decoded from JSON. The DataFrame is empty if there are no rows.
+        '''
+        import json
+        import pandas as pd
+
+        LS = LiveSummary
+        columns = [Experiment.expName, Output.name.label('outputName'), LS.count, LS.mean,
+                   LS.stdev, LS.skewness, LS.minimum, LS.median, LS.maximum, LS.ciLow,
+                   LS.ciHigh, LS.histogram, LS.importance, LS.updated]
+
+        with self.engine.connect() as conn:
+            if not self.engine.dialect.has_table(conn, LS.__tablename__):
+                return pd.DataFrame(columns=[col.key for col in columns])
+
+        with self.sessionScope() as session:
+            query = session.query(*columns).filter(LS.simId == simId). \
+                join(Experiment, Experiment.expId == LS.expId). \
+                join(Output, Output.outputId == LS.outputId)
+
+            if expList:
+                query = query.filter(Experiment.expName.in_(expList))
+
+            if outputList:
+                query = query.filter(Output.name.in_(outputList))
+
+            rows = session.execute(query.order_by(Experiment.expName, Output.name).statement).fetchall()
+
+        df = pd.DataFrame([tuple(row) for row in rows], columns=[col.key for col in columns])
+        for col in ('histogram', 'importance'):
+            df[col] = [json.loads(text) if text else {} for text in df[col]]
+
+        return df
+
 
 # Single instance of the class. Use 'getDatabase' constructor
 # to ensure that this instance is returned if already created.
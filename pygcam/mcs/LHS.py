@@ -17,24 +17,51 @@ import numpy as np
 from scipy import stats
 from pandas import DataFrame
 
+def _rng(rng):
+    '''
+    Return a numpy RandomState: `rng` itself if it is one, otherwise a new
+    RandomState seeded with `rng` (an int, or None to seed from the OS).
+    '''
+    return rng if isinstance(rng, np.random.RandomState) else np.random.RandomState(rng)
+
+
+def _permutations(rng, count, size):
+    '''
+    Return a (size, count) array whose columns are independent permutations of range(size).
+    '''
+    return np.argsort(rng.random_sample((size, count)), axis=0)
+
+
+def _ranks(m):
+    '''
+    Return the 1-relative ranks of the values in each column of the 2-D array `m`.
+    Ties are assigned the average of their ranks, as by stats.rankdata.
+    '''
+    try:
+        return stats.rankdata(m, axis=0)
+    except TypeError:
+        # scipy < 1.4 doesn't support the axis argument
+        return np.column_stack([stats.rankdata(col) for col in m.T])
+
+
 def rankCorrCoef(m):
     '''
     Take a 2-D array of values and produce a array of rank correlation
     coefficients representing the rank correlation among the columns.
+    The columns are ranked at once and the (Spearman) correlations are the
+    Pearson correlations of the ranks, computed with a single matrix product.
     '''
-    dummy, cols = m.shape
-    corrCoef = np.zeros((cols, cols))  # @UndefinedVariable
-
-    for i in range(cols):
-        corrCoef[i, i] = 1.  # All columns are perfectly correlated with themselves
-        for j in range(i + 1, cols):
-            corr = stats.spearmanr(m[:, i], m[:, j])[0]
-            corrCoef[i, j] = corrCoef[j, i] = corr
+    ranks = _ranks(m)
+    ranks -= ranks.mean(axis=0)
+    norms = np.sqrt((ranks ** 2).sum(axis=0))
+    z = ranks / norms
 
+    corrCoef = np.dot(z.T, z)
+    np.fill_diagonal(corrCoef, 1.)  # All columns are perfectly correlated with themselves
     return corrCoef
 
 
-def genRankValues(params, trials, corrMat):
+def genRankValues(params, trials, corrMat, rng=None):
     '''
     Generate a data set of 'trials' ranks for 'params'
     parameters that obey the given correlation matrix.
@@ -47,6 +74,8 @@ def genRankValues(params, trials, corrMat):
     corrMat[i,j] denotes the rank correlation between parameter
     i and j.
 
+    rng: a numpy RandomState, or a seed for a new one.
+
     Output is a matrix with 'trials' rows and 'params' columns.
     The i'th column represents the ranks for the i'th parameter.
 
@@ -59,14 +88,14 @@ def genRankValues(params, trials, corrMat):
      [5,2,1],
      [3,6,4]]
     '''
+    rng = _rng(rng)
+
     # Create van der Waarden scores
     strata = np.arange(1.0, trials + 1) / (trials + 1)
     vdwScores = stats.norm().ppf(strata)
 
-    S = np.zeros((trials, params))
-    for i in range(params):
-        np.random.shuffle(vdwScores)
-        S[:, i] = vdwScores
+    # Each column holds an independent permutation of the scores
+    S = vdwScores[_permutations(rng, params, trials)]
 
     P = np.linalg.cholesky(corrMat)
 
@@ -74,26 +103,73 @@ def genRankValues(params, trials, corrMat):
     Q = np.array(np.linalg.cholesky(E))
     final = np.dot(np.dot(S, np.linalg.inv(Q).T), P.T)
 
-    ranks = np.zeros((trials, params), dtype='i')
-    for i in range(params):
-        ranks[:, i] = stats.rankdata(final[:, i])
-
+    ranks = _ranks(final).astype('i')
     return ranks
 
 
-def getPercentiles(trials=100):
+def getPercentiles(trials=100, params=None, rng=None):
     '''
     Generate a list of 'trials' values, one from each of 'trials' equal-size
     segments from a uniform distribution. These are used with an RV's ppf
     (percent point function = inverse cumulative function) to retrieve the
-    values for that RV at the corresponding percentiles.
+    values for that RV at the corresponding percentiles. If `params` is not
+    None, return a 2-D array with an independent set of values in each of
+    `params` columns.
     '''
+    rng = _rng(rng)
     segmentSize = float(1. / trials)
-    points = stats.uniform.rvs(size=trials) * segmentSize + np.arange(trials) * segmentSize  # @UndefinedVariable
+    size = trials if params is None else (trials, params)
+    offsets = np.arange(trials) if params is None else np.arange(trials)[:, np.newaxis]
+    points = rng.random_sample(size) * segmentSize + offsets * segmentSize
     return points
 
 
-def lhs(paramList, trials, corrMat=None, columns=None, skip=None):
+def _frozenRV(param):
+    '''
+    Return the scipy frozen continuous RV underlying the param's ppf method,
+    or None if it isn't one.
+    '''
+    dataSrc = getattr(getattr(param, 'param', None), 'dataSrc', None)
+    rv = getattr(dataSrc, 'rv', None)
+
+    if isinstance(getattr(rv, 'dist', None), stats.rv_continuous) and \
+            hasattr(rv, 'args') and hasattr(rv, 'kwds'):
+        return rv
+
+    return None
+
+
+def _ppfAll(paramList, percentiles, indices):
+    '''
+    Return an array holding the values of each param's ppf, in the columns
+    given by `indices`, for the corresponding columns of `percentiles`. Params
+    defined by frozen scipy RVs of the same distribution are evaluated together
+    in one call with arrays of distribution parameters.
+    '''
+    values = np.zeros(percentiles.shape)
+    groups = {}
+
+    for i in indices:
+        param = paramList[i]
+        rv = _frozenRV(param)
+
+        if rv is None:
+            values[:, i] = np.asarray(param.ppf(percentiles[:, i]))
+        else:
+            key = (rv.dist.name, len(rv.args), tuple(sorted(rv.kwds)))
+            groups.setdefault(key, (rv.dist, []))[1].append((i, rv))
+
+    for dist, members in groups.values():
+        cols = [i for i, rv in members]
+        rvs = [rv for i, rv in members]
+        args = [np.array([rv.args[k] for rv in rvs]) for k in range(len(rvs[0].args))]
+        kwds = {key: np.array([rv.kwds[key] for rv in rvs]) for key in rvs[0].kwds}
+        values[:, cols] = dist.ppf(percentiles[:, cols], *args, **kwds)
+
+    return values
+
+
+def lhs(paramList, trials, corrMat=None, columns=None, skip=None, rng=None):
     """
     Produce an ndarray or DataFrame of 'trials' rows of values for the given parameter
     list, respecting the correlation matrix 'corrMat' if one is specified, using Latin
@@ -112,34 +188,37 @@ def lhs(paramList, trials, corrMat=None, columns=None, skip=None):
     :param skip: (list of params)) Parameters to process later because they are
            dependent on other parameter values (e.g., they're "linked"). These
            cannot be correlated.
+    :param rng: (numpy.random.RandomState or int) the random number generator to
+           use, or a seed for a new one, so that trial data can be reproduced.
+           If None, a generator seeded from the OS is used.
     :return: ndarray or DataFrame with `trials` rows of values for the `paramList`.
     """
-    ranks = genRankValues(len(paramList), trials, corrMat) if corrMat is not None else None
-
-    samples = np.zeros((trials, len(paramList)))  # @UndefinedVariable
+    rng = _rng(rng)
+    count = len(paramList)
+    ranks = genRankValues(count, trials, corrMat, rng=rng) if corrMat is not None else None
 
     skip = skip or []
+    indices = [i for i, param in enumerate(paramList) if param not in skip]   # skipped params are processed later
 
-    for i, param in enumerate(paramList):
-        if param in skip:
-            continue    # process later
-
-        values = param.ppf(getPercentiles(trials))  # extract values from the RV for these percentiles
+    # extract values from the RVs for these percentiles
+    values = _ppfAll(paramList, getPercentiles(trials, params=count, rng=rng), indices)
 
-        if corrMat is None:
-            # Sequence is a special case for which we don't shuffle (and we ignore stratified sampling)
+    if corrMat is None:
+        # Sequence is a special case for which we don't shuffle (and we ignore stratified sampling)
+        def isShuffled(param):
             dataSrc = param.param.dataSrc
-            if hasattr(dataSrc, 'distroName') and dataSrc.distroName != 'sequence':
-                np.random.shuffle(values)  # randomize the stratified samples
-        else:
-            indices = ranks[:, i] - 1  # make them 0-relative
-            values = values[indices]   # reorder to respect correlations
+            return hasattr(dataSrc, 'distroName') and dataSrc.distroName != 'sequence'
 
-        samples[:, i] = values
+        cols = [i for i in indices if isShuffled(paramList[i])]
+        shuffled = values[:, cols]
+        values[:, cols] = np.take_along_axis(shuffled, _permutations(rng, len(cols), trials), axis=0)  # randomize the stratified samples
+        samples = values
+    else:
+        samples = np.take_along_axis(values, ranks - 1, axis=0)   # reorder to respect correlations
 
     return DataFrame(samples, columns=columns) if columns else samples
 
-def lhsAmend(df, rvList, trials, shuffle=True):
+def lhsAmend(df, rvList, trials, shuffle=True, rng=None):
     """
     Amend the DataFrame with LHS data by adding columns for the given parameters.
     This allows "linked" parameters to refer to values of other parameters.
@@ -149,15 +228,19 @@ def lhsAmend(df, rvList, trials, shuffle=True):
     :param trials: (int) the number of trials to generate for each parameter
     :param shuffle (bool): if True, shuffle the values. Set this to false for
         linked params.
+    :param rng: (numpy.random.RandomState or int) the random number generator to
+        use, or a seed for a new one.
     :return: none
     """
+    rng = _rng(rng)
+
     for rv in rvList:
-        values = rv.ppf(getPercentiles(trials))  # extract values from the RV for these percentiles
+        values = rv.ppf(getPercentiles(trials, rng=rng))  # extract values from the RV for these percentiles
         if not isinstance(values, np.ndarray):
             values = values.values               # convert pandas Series if needed
 
         if shuffle:
-            np.random.shuffle(values)            # randomize the stratified samples
+            rng.shuffle(values)                  # randomize the stratified samples
 
         param = rv.getParameter()
         paramName = param.getName()
@@ -8,6 +8,7 @@ from lxml import etree as ET
 from math import ceil
 import numpy as np
 import os
+import re
 import pandas as pd
 
 from ..config import getParam
@@ -50,6 +51,16 @@ WRITE_FUNC_ELT       = 'WriteFunc'
 #DISTRO_META_ATTRS     = ['name', 'type', 'apply']
 DISTRO_MODIF_ATTRS    = ['lowbound', 'highbound'] # , 'updatezero']
 
+# Values of MCS.TrialXmlFormat
+TRIAL_XML_PRETTY   = 'pretty'
+TRIAL_XML_COMPACT  = 'compact'
+TRIAL_XML_TEMPLATE = 'template'
+TRIAL_XML_FORMATS  = (TRIAL_XML_PRETTY, TRIAL_XML_COMPACT, TRIAL_XML_TEMPLATE)
+
+# Text temporarily stored in modified elements to find their offsets in a template
+_TEMPLATE_MARKER = '@@pygcam-%d@@'
+_TEMPLATE_MARKER_REGEX = re.compile(br'@@pygcam-(\d+)@@')
+
 
 class XMLCorrelation(XMLWrapper):
     """
@@ -593,6 +604,8 @@ class XMLParameter(XMLWrapper):
 
         self.vars    = []    # the list of XMLVariable or XMLRandomVar wrapping Elements from query
         self.rv      = None  # stored here only if the distro is shared across Elements from query
+        self.elements  = None  # the Elements of self.vars, set on first call to updateElements
+        self.originals = None  # numpy array of the original values of self.elements
         self.query   = None  # XMLQuery instance
         self.dataSrc = None  # A subclass of XMLTrialData instance
         self.parent  = None
@@ -761,11 +774,14 @@ class XMLParameter(XMLWrapper):
 
         # Add these to the list since we might be called for multiple scenarios
         self.vars.extend(vars)
+        self.elements = self.originals = None
 
     def updateElements(self, simId, trialNum, df):
         """
         Update an element's text (assuming it's a number) by multiplying
-        it by a factor, adding a delta, or substituting a given value.
+        it by a factor, adding a delta, or substituting a given value. The
+        new values of all the parameter's elements are computed at once
+        from an array of their original values.
         """
         dataSrc = self.dataSrc
         if dataSrc.isTrialFunc():
@@ -776,33 +792,45 @@ class XMLParameter(XMLWrapper):
         if not self.vars:
             raise PygcamMcsSystemError("Called updateElements with no variables defined in self.vars")
 
-        isFactor = dataSrc.isFactor()
-        isDelta  = dataSrc.isDelta()
+        if self.elements is None:
+            # Skip shared RVs, which don't point to an XML element
+            vars = [var for var in self.vars if var.getElement() is not None]
+            self.elements  = [var.getElement() for var in vars]
+            self.originals = np.array([var.getFloatValue() for var in vars], dtype=float)
 
-        # Update all elements referenced by our list of XMLVariables (or of their subclass, XMLRandomVar)
-        for var in self.vars:
-            if var.getElement() is None:    # Skip shared RVs, which don't point to an XML element
-                _logger.debug("Skipping shared element for %s", var)
-                continue
+        # All variables of a parameter take their value from the parameter's column
+        randomValue = df.loc[trialNum, self.getName()]
+
+        modDict = getattr(dataSrc, 'modDict', None) or {}
+        lowbound  = modDict.get('lowbound')
+        highbound = modDict.get('highbound')
 
-            originalValue = var.getFloatValue()  # apply factor and delta to cached, original value
+        # Apply factor and delta to the cached, original values
+        if dataSrc.isFactor() or dataSrc.isDelta():
+            newValues = self.originals * randomValue if dataSrc.isFactor() else self.originals + randomValue
 
-            varName = var.getParameter().getName()
-            randomValue = df.loc[trialNum, varName]
+            if lowbound is not None:
+                newValues = np.maximum(newValues, lowbound)
 
-            newValue = randomValue * originalValue if isFactor else \
-                ((randomValue + originalValue) if isDelta else randomValue)
+            if highbound is not None:
+                newValues = np.minimum(newValues, highbound)
+
+            texts = [str(value) for value in newValues.tolist()]
+
+        else:
+            # A direct value is the same for all elements, and is formatted as
+            # given, so integer values are written without a decimal point.
+            if lowbound is not None:
+                randomValue = max(randomValue, lowbound)
 
-            if hasattr(dataSrc, 'modDict'):
-                modDict = dataSrc.modDict
-                if modDict['lowbound'] is not None:
-                    newValue = max(newValue, modDict['lowbound'])
+            if highbound is not None:
+                randomValue = min(randomValue, highbound)
 
-                if modDict['highbound'] is not None:
-                    newValue = min(newValue, modDict['highbound'])
+            texts = [str(randomValue)] * len(self.elements)
 
-            # Set the value in the cached tree so it can be written to trial's local-xml dir
-            var.setValue(newValue)
+        # Set the values in the cached tree so it can be written to trial's local-xml dir
+        for elt, text in zip(self.elements, texts):
+            elt.text = text
 
 
 def trialRelativePath(relPath, prefix):
@@ -830,6 +858,10 @@ class XMLRelFile(XMLFile):
         self.inputFile = inputFile
         self.relPath = relPath
 
+        # Set by buildTemplate()
+        self.templateChunks = None
+        self.templateElements = None
+
         scenarioDir = getSimLocalXmlDir(simId)
         absPath = os.path.abspath(os.path.join(scenarioDir, relPath))
 
@@ -845,6 +877,93 @@ class XMLRelFile(XMLFile):
         # Save the modified file somewhere for each trial. Maybe in trial-xml?
         pass
 
+    def modifiedElements(self):
+        """
+        Return a list of the distinct elements of this file that are modified
+        by the parameters of our XMLInputFile.
+        """
+        root = self.tree.getroot()
+        found = OrderedDict()
+
+        for param in self.inputFile.parameters.values():
+            for var in param.getVars():
+                elt = var.getElement()
+                if elt is not None and id(elt) not in found and elt.getroottree().getroot() is root:
+                    found[id(elt)] = elt
+
+        return list(found.values())
+
+    def buildTemplate(self):
+        """
+        Serialize the tree with a unique marker in place of the text of each
+        modified element, and save the text between the markers, so files for
+        subsequent trials can be written by splicing in the elements' new text.
+        """
+        elements = self.modifiedElements()
+        texts = [elt.text for elt in elements]
+
+        try:
+            for i, elt in enumerate(elements):
+                elt.text = _TEMPLATE_MARKER % i
+
+            data = ET.tostring(self.tree, xml_declaration=True)
+        finally:
+            for elt, text in zip(elements, texts):
+                elt.text = text
+
+        matches = list(_TEMPLATE_MARKER_REGEX.finditer(data))
+        if len(matches) != len(elements):
+            raise PygcamMcsSystemError("Failed to create template for %s" % self.getAbsPath())
+
+        chunks = []
+        start = 0
+        for m in matches:
+            chunks.append(data[start:m.start()])
+            start = m.end()
+        chunks.append(data[start:])
+
+        # Elements in the order they appear in the file
+        self.templateElements = [elements[int(m.group(1))] for m in matches]
+        self.templateChunks = chunks
+        _logger.debug("Created template for %s with %d modified elements",
+                      self.getAbsPath(), len(elements))
+
+    def writeTrialFile(self, pathname, xmlFormat=TRIAL_XML_PRETTY):
+        """
+        Write the (modified) tree to the given pathname.
+
+        :param pathname: (str) the file to write
+        :param xmlFormat: (str) one of 'pretty' (indented), 'compact' (no added
+            whitespace), or 'template', which writes the same text as 'compact' by
+            splicing the current text of the modified elements into the file's
+            template, created on first use. Templates are not used for files
+            modified by write functions or when parameters use trial functions,
+            since these can change any part of the tree.
+        :return: none
+        """
+        if xmlFormat == TRIAL_XML_TEMPLATE and \
+                (self.inputFile.writeFuncs or
+                 any(param.dataSrc.isTrialFunc() for param in XMLParameter.getInstances())):
+            xmlFormat = TRIAL_XML_COMPACT
+
+        if xmlFormat != TRIAL_XML_TEMPLATE:
+            self.tree.write(pathname, xml_declaration=True, pretty_print=(xmlFormat == TRIAL_XML_PRETTY))
+            return
+
+        if self.templateChunks is None:
+            self.buildTemplate()
+
+        from xml.sax.saxutils import escape
+
+        chunks = self.templateChunks
+        parts = [chunks[0]]
+        for elt, chunk in zip(self.templateElements, chunks[1:]):
+            parts.append(escape(elt.text).encode('ascii', 'xmlcharrefreplace'))
+            parts.append(chunk)
+
+        with open(pathname, 'wb') as f:
+            f.write(b''.join(parts))
+
 
 class XMLInputFile(XMLWrapper):
     """
@@ -1080,8 +1199,13 @@ class XMLParameterFile(XMLFile):
 
     def writeLocalXmlFiles(self, trialDir):
         """
-        Write copies of all modified XML files
+        Write copies of all modified XML files, in the format given by
+        config variable MCS.TrialXmlFormat.
         """
+        xmlFormat = getParam('MCS.TrialXmlFormat').lower()
+        if xmlFormat not in TRIAL_XML_FORMATS:
+            raise PygcamMcsUserError("MCS.TrialXmlFormat must be one of %s; got '%s'" % (TRIAL_XML_FORMATS, xmlFormat))
+
         xmlFiles = XMLInputFile.getModifiedXMLFiles()
 
         for xmlFile in xmlFiles:
@@ -1103,7 +1227,7 @@ class XMLParameterFile(XMLFile):
                 os.unlink(absPath)
 
             _logger.info("XMLParameterFile: writing %s", absPath)
-            xmlFile.tree.write(absPath, xml_declaration=True, pretty_print=True)
+            xmlFile.writeTrialFile(absPath, xmlFormat=xmlFormat)
 
     def dump(self):
         print("Parameter file: %s" % self.getFilename())
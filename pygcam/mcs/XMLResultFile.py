@@ -3,13 +3,14 @@
 # Copyright (c) 2015-2017. The Regents of the University of California (Regents).
 # See the file COPYRIGHT.txt for details.
 import os
-from collections import OrderedDict, defaultdict
+from collections import OrderedDict
 from datetime import datetime
 
 import pandas as pd
 
 from ..config import getParam
 from ..log import getLogger
+from ..lruCache import LRUCache, sizeofDataFrame
 from ..XMLFile import XMLFile
 from .error import PygcamMcsUserError, PygcamMcsSystemError, FileMissingError
 from .Database import getDatabase
@@ -238,14 +239,16 @@ class QueryResult(object):
         Read a CSV file produced by a batch query. The first line is the name of the query;
         the second line provides the column headings; all subsequent lines are data. Data
         are comma-delimited, and strings with spaces are double-quoted. Assume units are
-        the same as in the first row of data.
+        the same as in the first row of data. The data are read via the binary CSV
+        cache, if enabled, so only the title line is read from the CSV file directly.
         '''
+        from ..csvCache import readCachedCsv
+
         _logger.debug("readCSV: reading %s", self.filename)
         with open(self.filename) as f:
             self.title  = f.readline().strip()
-            self.df = pd.read_table(f, sep=',', header=0, index_col=False, quoting=0)
 
-        df = self.df
+        self.df = df = readCachedCsv(self.filename, skiprows=1)
 
         if 'Units' in df.columns:
             self.units = df.Units[0]
@@ -269,10 +272,10 @@ class QueryResult(object):
         return self.df
 
 # A single result DF can have data for multiple outputs, so we cache the files
-outputCache = defaultdict(lambda: None)
+outputCache = LRUCache('QueryResult', sizeof=lambda result: sizeofDataFrame(result.df))
 
 def getCachedFile(csvPath, loader=QueryResult, desc="query result"):
-    result = outputCache[csvPath]
+    result = outputCache.get(csvPath)
     if not result:
         try:
             outputCache[csvPath] = result = loader(csvPath)
@@ -392,36 +395,11 @@ def saveResults(context, resultList):
     '''
     from .Database import getDatabase
 
-    runId = context.runId
-
     db = getDatabase()
-    session = db.Session()
-
-    # Delete any stale results for this runId (i.e., if re-running a given runId)
-    names = [resultDict['paramName'] for resultDict in resultList]
-    ids = db.getOutputIds(names)
-    db.deleteRunResults(runId, outputIds=ids, session=session)
-    db.commitWithRetry(session)
-
-    for resultDict in resultList:
-        paramName  = resultDict['paramName']
-        value      = resultDict['value']
-        regionName = resultDict['regionName']
-        regionId = db.getRegionId(regionName)
 
-        # Save the values to the database
-        try:
-            if resultDict['isScalar']:
-                db.setOutValue(runId, paramName, value, session=session)  # TBD: need regionId?
-            else:
-                units = resultDict['units']
-                db.saveTimeSeries(runId, regionId, paramName, value, units=units, session=session)
-
-        except Exception as e:
-            session.rollback()
-            db.endSession(session)
-            # TBD: distinguish database save errors from data access errors?
-            raise PygcamMcsSystemError("saveResults failed: %s" % e)
+    try:
+        db.saveRunResults([(context.runId, resultList)])
 
-    db.commitWithRetry(session)
-    db.endSession(session)
+    except Exception as e:
+        # TBD: distinguish database save errors from data access errors?
+        raise PygcamMcsSystemError("saveResults failed: %s" % e)
@@ -15,6 +15,7 @@ from pygcam.utils import mkdirs
 
 from .error import PygcamMcsSystemError, PygcamMcsUserError
 from .Database import getDatabase, Input
+from .summaryStats import RunningStats, RankCorrelation, isLinked
 
 _logger = getLogger(__name__)
 
@@ -245,29 +246,49 @@ def plotTornado(data, colname='value', labelsize=9, title=None, color=None, heig
     plt.close(fig)
 
 
+def convergenceStats(values, increment=None):
+    '''
+    Compute the statistics returned by RunningStats.summary() for the first N
+    values, for N growing by `increment`, in a single pass over the values.
+
+    :param values: (pandas.Series) result values, in trial order
+    :param increment: (int) the step size; by default, the smaller of 100 and
+        1/20th of the number of values.
+    :return: (pandas.DataFrame) the statistics, indexed by the number of values.
+    '''
+    values = values.dropna().values
+    count = len(values)
+    increment = increment or max(1, min(100, count // 20))
+
+    nValues = list(range(increment, count, increment))
+    if count:
+        nValues.append(count)       # final value is for however many values there were
+
+    stats = RunningStats()
+    rows = []
+    prev = 0
+
+    for N in nValues:
+        stats.update(values[prev:N])
+        rows.append(stats.summary())
+        prev = N
+
+    return pd.DataFrame(rows, index=pd.Index(nValues, name='Trials'),
+                        columns=['Mean', 'Stdev', 'Skewness', '95% CI'])
+
 def plotConvergence(simId, expName, paramName, values, show=True, save=False):
     '''
     Examine the first 3 moments (mean, std, skewness) in the data set
     for increasing number (N) of values, growing by the given increment.
     Optionally plot the relationship between each of the moments and N,
-    so we can when (if) convergence occurs.
+    so we can when (if) convergence occurs. The statistics are computed
+    in a single pass by convergenceStats.
     '''
     _logger.debug("Generating convergence plots...")
-    count = values.count()
-    results = {'Mean': [], 'Stdev': [], 'Skewness': [], '95% CI': []}
-
-    increment = min(100, count // 20)
-    nValues = list(range(increment, count + increment - 1, increment))
-
-    for N in nValues:
-        sublist = values[:N]
-        results['Mean'].append(sublist.mean())
-        results['Stdev'].append(sublist.std())
-        results['Skewness'].append(sublist.skew())
+    statsDF = convergenceStats(values)
 
-        ciLow  = np.percentile(sublist, 2.5)
-        ciHigh = np.percentile(sublist, 97.5)
-        results['95% CI'].append(ciHigh - ciLow)
+    nValues = list(statsDF.index)
+    results = {key: list(statsDF[key]) for key in statsDF.columns}
 
     # Insert zero value at position 0 for all lists to ensure proper scaling
     nValues.insert(0,0)
@@ -301,6 +322,16 @@ def plotConvergence(simId, expName, paramName, values, show=True, save=False):
     plt.close(fig)
 
 
+def printConvergence(series, increment=None):
+    '''
+    Print the convergence statistics computed by convergenceStats. Since only
+    the results in the database are used, this can be run to check on a
+    simulation that is still running.
+    '''
+    statsDF = convergenceStats(series, increment=increment)
+    print("\nCONVERGENCE (%s)" % series.name)
+    print(statsDF.to_string(float_format="{:.4g}".format))
+
 # Could use series.describe() but I like this format better
 def printStats(series):
     name   = series.name
@@ -346,18 +377,19 @@ def normalizeDF(df):
 
 def spearmanCorrelation(inputs, results):
     '''
-    Compute Spearman ranked correlation and normalized Spearman ranked
-    correlation between values in a DataFrame of inputs and a Series of
-    results. Returns a Series with the spearman rank correlation values.
+    Compute Spearman ranked correlation between values in a DataFrame of inputs
+    and a Series (or DataFrame) of results. Returns a Series with the spearman
+    rank correlation values. To correlate the same inputs with results that are
+    not all available at once, use a RankCorrelation instance directly, so the
+    inputs are ranked only once.
 
     :param inputs: (pandas.DataFrame) input values for each parameter and trial
-    :param results: (pandas.Series) values for one model result, per trial
-    :return: (pandas.Series) rank correlations of each input to the output vector.
+    :param results: (pandas.Series) values for one model result, per trial, or
+        a DataFrame of values for several results.
+    :return: (pandas.Series) rank correlations of each input to the output vector,
+        or a DataFrame with a column of these for each result.
     '''
-    corrList = [results.corr(inputs[col], method='spearman') for col in inputs.columns]
-    spearman = pd.Series(data=corrList, index=inputs.columns, name='spearman')
-
-    return spearman
+    return RankCorrelation(inputs).correlate(results)
 
 
 def plotSensitivityResults(varName, data, filename=None, extra=None, maxVars=None, printIt=True):
@@ -500,49 +532,45 @@ def exportInputs(exportFile, inputs):
 # export all available results and their matching inputs for a single scenario,
 # in wide format, with 'trialNum' as index, each input/result in a column.
 def exportAllInputsOutputs(simId, expName, inputDF, exportFile, sep=','):
-    df = None
     db = getDatabase()
     resultList = db.getOutputsWithValues(simId, expName)
 
     inputDF.index.rename('trialNum', inplace=True)
 
-    for resultName in resultList:
-        resultDf = db.getOutValues(simId, expName, resultName)
-        if resultDf is None:
-            raise PygcamMcsUserError('No results were found for sim %d, experiment %s, result %s' % (simId, expName, resultName))
+    if not resultList:
+        raise PygcamMcsUserError('No results were found for sim %d, experiment %s' % (simId, expName))
 
-        # Copy inputs for which there are outputs
-        if df is None:
-            df = inputDF.iloc[resultDf.index].copy()
+    resultDF = db.getOutValuesBulk(simId, [expName], resultList)[expName]
 
-        # Add each output
-        df[resultName] = resultDf[resultName]
+    # Copy inputs for which there are outputs, and add each output
+    df = inputDF.iloc[resultDF.index].copy()
+    for resultName in resultList:
+        df[resultName] = resultDF[resultName]
 
     _logger.debug("Exporting inputs and results to '%s'", exportFile)
     df.to_csv(exportFile, sep=sep)
     return df
 
-def exportResults(simId, resultList, expList, exportFile, sep=','):
-    db = getDatabase()
-    df = None
-
-    for expName in expList:
-        for resultName in resultList:
-            # resultDf has 'trialNum' as index, 'value' holds float value
-            resultDf = db.getOutValues(simId, expName, resultName)
-            if resultDf is None:
-                raise PygcamMcsUserError('No results were found for sim %d, experiment %s, result %s' % (simId, expName, resultName))
+def _stackResults(simId, resultsDF):
+    '''
+    Convert a DataFrame returned by getOutValuesBulk to one with 'trialNum' as
+    index and columns 'value', 'expName' and 'resultName' (needed for boxplots),
+    with the results for each experiment and result stacked vertically.
+    '''
+    frames = []
+    for expName, resultName in resultsDF.columns:
+        values = resultsDF[(expName, resultName)].dropna()
+        if values.empty:
+            raise PygcamMcsUserError('No results were found for sim %d, experiment %s, result %s' % (simId, expName, resultName))
 
-            # Add columns needed for boxplots
-            resultDf['expName'] = expName
-            resultDf['resultName'] = resultName
+        frames.append(pd.DataFrame({'value': values, 'expName': expName, 'resultName': resultName}))
 
-            resultDf.rename(columns = {resultName:'value'}, inplace=True)
+    return pd.concat(frames)
 
-            if df is None:
-                df = resultDf
-            else:
-                df = pd.concat([df, resultDf])
+def exportResults(simId, resultList, expList, exportFile, sep=','):
+    db = getDatabase()
+    resultsDF = db.getOutValuesBulk(simId, expList, resultList)
+    df = _stackResults(simId, resultsDF)
 
     _logger.debug("Exporting results to '%s'", exportFile)
     df.to_csv(exportFile, sep=sep)
@@ -611,11 +639,11 @@ def saveForEMA(simId, expNames, resultNames, inputDF, filename):
         add_file(z, fileText, "outcomes metadata.csv")
 
         # Write outcomes
+        resultsDF = db.getOutValuesBulk(simId, expNames, resultNames)
         for expName in expNames:
             for resultName in resultNames:
-                outValueDF = db.getOutValues(simId, expName, resultName) # cols are trialNum and value; might need to do outValueDF[resultName].to_csv
                 allTrialsDF = pd.DataFrame(index=xrange(rows))           # ensure that all trials are represented (with NA if need be)
-                allTrialsDF[resultName] = outValueDF[resultName]
+                allTrialsDF[resultName] = resultsDF[(expName, resultName)]
                 fileText = allTrialsDF.to_csv(None, header=False, index=False)
                 fname = "{}-{}.csv".format(resultName, expName)
                 add_file(z, fileText, fname)
@@ -634,10 +662,7 @@ def getCorrDF(inputs, output):
        vector, and the latter with the absolute values of these correlations.
        The DataFrame is indexed by variable name and sorted by "abs", descending.
     '''
-    corrDF = pd.DataFrame(spearmanCorrelation(inputs, output))
-    corrDF['abs'] = corrDF.spearman.abs()
-    corrDF.sort_values('abs', ascending=False, inplace=True)
-    return corrDF
+    return RankCorrelation(inputs).corrDF(output)
 
 def binColumns(inputDF, bins=DEFAULT_BIN_COUNT):
     columns = inputDF.columns
@@ -715,20 +740,29 @@ class Analysis(object):
         resultList = resultList or self.resultNames
         scenarioList = scenarioList or self.scenarioNames
 
-        for scenario in scenarioList:
-            resultDF = resultDict.get(scenario)
+        # Fetch all results not yet cached in one query
+        missing = [resultName for resultName in resultList
+                   if any(scenario not in resultDict or resultName not in resultDict[scenario].columns
+                          for scenario in scenarioList)]
+        if not missing:
+            return resultDict
 
-            for resultName in resultList:
-                # returns DF with 'trialNum' as index, 'value' holds float value
-                if resultDF is None or resultName not in resultDF.columns:
-                    values = db.getOutValues(simId, scenario, resultName, limit=self.limit)
-                    if values is None:
-                        raise PygcamMcsUserError(
-                            'No results were found for sim %d, experiment %s, result %s' % (simId, scenario, resultName))
+        resultsDF = db.getOutValuesBulk(simId, scenarioList, missing, limit=self.limit)
 
-                    resultDF = values if not resultDF else pd.concat([resultDF, values])
+        for scenario in scenarioList:
+            # DF with 'trialNum' as index and a column of values for each result. The
+            # index is the union of all scenarios' trials, so drop those this one lacks.
+            values = resultsDF[scenario].dropna(how='all')
+            for resultName in missing:
+                if values[resultName].isnull().all():
+                    raise PygcamMcsUserError(
+                        'No results were found for sim %d, experiment %s, result %s' % (simId, scenario, resultName))
 
-            resultDict[scenario] = resultDF
+            resultDF = resultDict.get(scenario)
+            if resultDF is not None:
+                values = resultDF.join(values.drop(columns=resultDF.columns, errors='ignore'), how='outer')
+
+            resultDict[scenario] = values
 
         return resultDict
 
@@ -743,27 +777,17 @@ class Analysis(object):
         :param sep: (str) column separator to use in output file
         :return: none
         '''
+        resultList = resultList or self.resultNames
+        scenarioList = scenarioList or self.scenarioNames
         resultDict = self.getResults(scenarioList=scenarioList, resultList=resultList)
-        exportDF = None
-
-        for scenario in scenarioList:
-            resultDF = resultDict[scenario]
-
-            for resultName in resultList:
-                # The resultDF has 'trialNum' as index, 'value' holds float value.
-                # Denormalize these to store all scenarios' results in one DF.
-                df = resultDF[resultName].copy()
-                df.rename(columns={resultName: 'value'}, inplace=True)
 
-                # Add columns needed for boxplots
-                df['expName'] = scenario
-                df['resultName'] = resultName
-
-                # concatenate each result set below the accumulated data
-                exportDF = pd.concat([exportDF, df]) if exportDF else df
+        # Denormalize the results to store all scenarios' results in one DF.
+        resultsDF = pd.concat([resultDict[scenario][resultList] for scenario in scenarioList],
+                              axis=1, keys=scenarioList)
+        exportDF = _stackResults(self.simId, resultsDF)
 
         _logger.debug("Exporting results to '%s'", exportFile)
-        df.to_csv(exportFile, sep=sep)
+        exportDF.to_csv(exportFile, sep=sep)
 
     def plotInputDistributions(self):
         '''Plot the input values individually to test that the distributions are as expected'''
@@ -994,6 +1018,7 @@ def analyzeSimulationNew(args):
             printStats(resultSeries)    # TBD: use resultSeries.describe() instead?
 
         if convergence:
+            printConvergence(resultSeries)
             plotConvergence(simId, expName, resultName, resultSeries, show=False, save=True)
 
         if (importance or groups or inputsFile) and (numResults != trials or numResults != inputRows):
@@ -1004,7 +1029,7 @@ def analyzeSimulationNew(args):
             inputsWithResults = inputDF.ix[resultDF.index]
 
             # Drop any inputs with names ending in '-linked' since these are an artifact
-            linked = [s for s in inputsWithResults.columns if s.endswith('-linked')]
+            linked = list(filter(isLinked, inputsWithResults.columns))
             if linked:
                 inputsWithResults.drop(linked, axis=1, inplace=True)
 
@@ -1099,9 +1124,18 @@ def analyzeSimulation(args):
     if not (requireScenario and requireResult):
         return
 
+    resultsDF = db.getOutValuesBulk(simId, expList, [resultName], limit=limit)
+
+    if importance or groups:
+        # Drop any inputs with names ending in '-linked' since these are an artifact
+        linked = list(filter(isLinked, inputDF.columns))
+
+        # Inputs are ranked once and shared by all scenarios
+        rankCorr = RankCorrelation(inputDF.drop(linked, axis=1))
+
     for expName in expList:
-        resultDF = db.getOutValues(simId, expName, resultName, limit=limit)
-        if resultDF is None:
+        resultDF = resultsDF[expName].dropna()
+        if resultDF.empty:
             raise PygcamMcsSystemError('analyzeSimulation: No results for simId=%d, expName=%s, resultName=%s' % (simId, expName, resultName))
 
         if maximum is not None:
@@ -1126,32 +1160,20 @@ def analyzeSimulation(args):
             printStats(resultSeries)
 
         if convergence:
+            printConvergence(resultSeries)
             plotConvergence(simId, expName, resultName, resultSeries, show=False, save=True)
 
         if (importance or groups or inputsFile) and (numResults != trials or numResults != inputRows):
             _logger.info("SimID %d has %d trials, %d input rows, and %d results", simId, trials, inputRows, numResults)
 
         if importance or groups:
-            inputsWithResults = inputDF.ix[resultDF.index]
-
-            # Drop any inputs with names ending in '-linked' since these are an artifact
-            # Column names can look like 'foobar[0][34]', so we strip off indexing part.
-            def _isLinked(colname):
-                pos = colname.find('[')
-                colname = colname if pos < 0 else colname[0:pos]
-                return colname.endswith('-linked')
-
-            linked = list(filter(_isLinked, inputsWithResults.columns))
-            if linked:
-                inputsWithResults.drop(linked, axis=1, inplace=True)
-
-            spearman = spearmanCorrelation(inputsWithResults, resultSeries)
+            spearman = rankCorr.correlate(resultSeries)
 
             data = pd.DataFrame(spearman)
             data['normalized'] = normalizeSeries(spearman ** 2)
             data['sign'] = 1
             negatives = (data.spearman < 0)
-            data.ix[negatives, 'sign'] = -1
+            data.loc[negatives, 'sign'] = -1
             data['value'] = data.normalized * data.sign     # normalized squares with signs restored
 
             if importance:
@@ -14,12 +14,19 @@ def driver(args, tool):
     from ..analysis import analyzeSimulation
     from ..error import PygcamMcsUserError
 
+    if args.live:
+        from ..summaryStats import printLiveSummary
+
+        expList = args.expName.split(',') if args.expName else None
+        resultList = args.resultName.split(',') if args.resultName else None
+        printLiveSummary(args.simId, expList=expList, resultList=resultList, maxVars=args.maxVars)
+        return
+
     if args.timeseries:
         import pandas as pd
         from pygcam.config import getParam
         from ..Database import getDatabase
         from ..timeseriesPlot import plotTimeSeries, plotForcingSubplots
-        from ..util import stripYearPrefix
 
         simId = args.simId
         expList = args.expName.split(',')
@@ -40,8 +47,8 @@ def driver(args, tool):
         plotDir  = getParam('MCS.PlotDir')
         plotType = getParam('MCS.PlotType')
 
-        allResults = db.getTimeSeries(simId, resultName, expList) # , regionName)
-        if not allResults:
+        resultDF = db.getTimeSeriesValues(simId, resultName, expList) # , regionName)
+        if resultDF is None:
             raise PygcamMcsUserError('No timeseries results for simId=%d, expList=%s, resultName=%s' \
                                      % (simId, expList, resultName))
 
@@ -50,26 +57,13 @@ def driver(args, tool):
             filename = os.path.join(plotDir, 's%d' % simId, basename)
             return filename
 
-        # massage the data into the format required by plotTimeSeries
-        def createRecord(pair):
-            obj, expName = pair
-            d = obj.__dict__
-            d['expName'] = expName
-            return d
-
-        records = [createRecord(pair) for pair in allResults]
-        resultDF = pd.DataFrame.from_records(records, index='seriesId')
         units = resultDF.units.iloc[0]
 
         # TBD: generalize this with a lookup table or file
         if units == 'W/m^2':
             units = 'W m$^{-2}$'
 
-        resultDF.drop(['units', '_sa_instance_state', 'outputId'], axis=1, inplace=True)
-
-        # convert column names like 'y2020' to '2020'
-        cols = [stripYearPrefix(c) for c in resultDF.columns]
-        resultDF.columns = cols
+        resultDF.drop(['units', 'regionId'], axis=1, inplace=True)
 
         if forcingPlot:
             filename = computeFilename('combo')
@@ -118,7 +112,9 @@ class AnalyzeCommand(McsSubcommandABC):
         from ..analysis import DEFAULT_MAX_TORNADO_VARS
 
         parser.add_argument('-c', '--convergence', action='store_true', default=False,
-                            help=clean_help('Generate convergence plots for mean, std dev, skewness, and 95%% coverage interval.'))
+                            help=clean_help('''Print convergence statistics and generate convergence plots for mean,
+                            std dev, skewness, and 95%% coverage interval. Uses the results saved so far, so
+                            this can be used to check on a simulation that is still running.'''))
 
         parser.add_argument('-d', '--distros', dest='plotInputs', action='store_true', default=False,
                             help=clean_help('Plot frequency distributions for input parameters.'))
@@ -150,6 +146,14 @@ class AnalyzeCommand(McsSubcommandABC):
         parser.add_argument('-l', '--limit', type=int, default=-1,
                             help=clean_help('Limit the analysis to the given number of results'))
 
+        parser.add_argument('--live', action='store_true',
+                            help=clean_help('''Print the running statistics and most important inputs saved
+                            by "gt runsim" for each result of each scenario as results are saved (see config
+                            variable MCS.LiveSummary). This reads only the summary table, so it is quick to
+                            run while a simulation is in progress. The -e and -r flags can be comma-delimited
+                            lists of scenarios and results to show; by default all are shown. The number of
+                            inputs shown is limited by -T.'''))
+
         parser.add_argument('-m', '--min', type=float, default=None,
                             help=clean_help('''Limit the analysis to values (for the result named with -r) greater
                             than or equal to this value'''))
@@ -82,6 +82,7 @@ def genSALibData(trials, method, paramFileObj, args):
     from ..error import PygcamMcsUserError
     from ..sensitivity import DFLT_PROBLEM_FILE, Sobol, FAST, Morris # , MonteCarlo
     from pygcam.utils import ensureExtension, removeTreeSafely, mkdirs
+    from ..util import writeTrialMatrix
 
     supported_distros = ['Uniform', 'LogUniform', 'Triangle', 'Linked']
 
@@ -150,24 +151,33 @@ def genSALibData(trials, method, paramFileObj, args):
 
     # saves to input.csv in file package
     sa.sample(trials=trials, calc_second_order=args.calcSecondOrder)
+    writeTrialMatrix(sa.inputsFile)
     return sa.inputsDF
 
 
-def genTrialData(simId, trials, paramFileObj, args):
+def genTrialData(simId, trials, paramFileObj, args, start=0):
     """
     Generate the given number of trials for the given simId, using the objects created
-    by parsing parameters.xml. Return a DataFrame of values.
+    by parsing parameters.xml. Return a DataFrame of values. If `start` is not 0, the
+    trials are numbered from `start` and appended to the existing trial data file;
+    this is supported only for the "montecarlo" method.
     """
+    from numpy.random import RandomState
     from pandas import DataFrame
     from ..distro import linkedDistro
     from ..LHS import lhs, lhsAmend
     from ..XMLParameterFile import XMLRandomVar, XMLCorrelation
-    from ..util import writeTrialDataFile
+    from ..util import writeTrialDataFile, appendTrialDataFile
 
     rvList = XMLRandomVar.getInstances()
 
     linked = [obj for obj in rvList if obj.param.dataSrc.isLinked()]
 
+    # Seeded from the OS if args.seed is None. When appending trials, the seed is
+    # combined with the starting trial so the existing trials aren't regenerated.
+    seed = args.seed if (args.seed is None or not start) else [args.seed, start]
+    rng = RandomState(seed)
+
     method = args.method
     if method == 'montecarlo':
         # legacy Monte Carlo method. Supporting numerous distributions and correlations.
@@ -180,7 +190,7 @@ def genTrialData(simId, trials, paramFileObj, args):
         # TBD: on integration with pygcam. (getName() will fail on XMLVariable instances)
 
         paramNames = [obj.getParameter().getName() for obj in rvList]
-        trialData = lhs(rvList, trials, corrMat=corrMatrix, columns=paramNames, skip=linked)
+        trialData = lhs(rvList, trials, corrMat=corrMatrix, columns=paramNames, skip=linked, rng=rng)
 
     elif method == 'full-factorial':
         trialData = genFullFactorialData(trials, paramFileObj, args)
@@ -189,9 +199,13 @@ def genTrialData(simId, trials, paramFileObj, args):
         trialData = genSALibData(trials, method, paramFileObj, args)
 
     linkedDistro.storeTrialData(trialData)  # stores trial data in class so its ppf() can access linked values
-    lhsAmend(trialData, linked, trials, shuffle=False)
+    lhsAmend(trialData, linked, trials, shuffle=False, rng=rng)
+
+    if start:
+        trialData.index += start
+        appendTrialDataFile(simId, trialData)
 
-    if method in ('montecarlo', 'full-factorial'):
+    elif method in ('montecarlo', 'full-factorial'):
         writeTrialDataFile(simId, trialData)
 
     df = DataFrame(data=trialData)
@@ -200,7 +214,9 @@ def genTrialData(simId, trials, paramFileObj, args):
 
 def saveTrialData(df, simId, start=0):
     """
-    Save the trial data in `df` to the SQL database, for the given simId.
+    Save the trial data in `df` to the SQL database, for the given simId, numbering
+    the trials from `start`, and set the simulation's trial count to `start` plus
+    the number of rows in `df`.
     """
     from ..Database import getDatabase
     from ..XMLParameterFile import XMLRandomVar
@@ -222,7 +238,7 @@ def saveTrialData(df, simId, start=0):
             varNum = var.getVarNum()
             param = var.getParameter()
             pname = param.getName()
-            value = df[pname][trial]
+            value = df[pname].iloc[trial]
             paramId = db.getParamId(pname)
             paramValues.append((trialNum, paramId, value, varNum))
 
@@ -231,7 +247,7 @@ def saveTrialData(df, simId, start=0):
 
     # SALib methods may not create exactly the number of trials requested
     # so we update the database to set the record straight.
-    db.updateSimTrials(simId, trials)
+    db.updateSimTrials(simId, start + trials)
     _logger.info(f'Saved {trials} trials for simId {simId}')
 
 
@@ -361,6 +377,64 @@ def genSimulation(simId, trials, paramPath, args):
     simParamFile = getSimParameterFile(simId)
     filecopy(paramPath, simParamFile)
 
+def _argSaveFile(simId):
+    '''
+    The file in which the arguments used to generate a simulation are saved.
+    '''
+    return os.path.join(getSimDir(simId), 'gcamGenSimArgs.txt')
+
+def addTrials(simId, trials, paramPath, args):
+    """
+    Extend an existing "montecarlo" simulation with the given number of new
+    trials, which are numbered following the existing ones. Only the new trials
+    are written to the trial data file and the database. The trials are generated
+    from the simulation's saved copy of the parameter file, which must match
+    `paramPath`, if given.
+    """
+    import filecmp
+    from ..Database import getDatabase
+    from ..error import PygcamMcsUserError
+    from ..util import getSimParameterFile, loadDict
+    from ..XMLParameterFile import XMLParameterFile
+
+    if args.method != 'montecarlo':
+        raise PygcamMcsUserError("--addTrials is supported only for the 'montecarlo' method")
+
+    # Check how the simulation was generated, using the arguments saved by gensim
+    argSaveFile = _argSaveFile(simId)
+    if not os.path.exists(argSaveFile):
+        raise PygcamMcsUserError(f"Can't add trials to simId {simId}: '{argSaveFile}' was not found")
+
+    savedArgs = loadDict(argSaveFile)
+    method = savedArgs.get('method')
+    if method != 'montecarlo':
+        raise PygcamMcsUserError(f"Can't add trials to simId {simId}: it was generated by the '{method}' method")
+
+    if savedArgs.get('dataFile', 'None') != 'None':
+        raise PygcamMcsUserError(f"Can't add trials to simId {simId}: its trial data was loaded from a file")
+
+    simParamFile = getSimParameterFile(simId)
+    if not os.path.exists(simParamFile):
+        raise PygcamMcsUserError(f"Can't add trials to simId {simId}: '{simParamFile}' was not found")
+
+    if paramPath and not filecmp.cmp(paramPath, simParamFile, shallow=False):
+        raise PygcamMcsUserError(f"Can't add trials to simId {simId}: '{paramPath}' differs from the parameter "
+                                 f"file used to generate it, '{simParamFile}'. Use -p to specify the saved copy.")
+
+    simDir = getSimDir(simId)
+    db = getDatabase()
+    start = db.getTrialCount(simId)
+    if not start:
+        raise PygcamMcsUserError(f"Can't add trials to simId {simId}: it has no existing trials")
+
+    # The XML input files needn't be loaded since no queries are run
+    paramFileObj = XMLParameterFile(simParamFile)
+    paramFileObj.generateRandomVars()
+
+    _logger.info(f"Generating trials {start}-{start + trials - 1} in {simDir}")
+    df = genTrialData(simId, trials, paramFileObj, args, start=start)
+    saveTrialData(df, simId, start=start)
+
 def _newsim(runWorkspace, trials):
     '''
     Setup the app and run directories for a given user app.
@@ -555,7 +629,7 @@ def driver(args, tool):
     desc   = args.desc
     trials = args.trials
 
-    if trials < 0:
+    if trials < 0 and not args.addTrials:
         raise PygcamMcsUserError("Trials argument is required: must be an integer >= 0")
 
     projectName = args.projectName
@@ -567,6 +641,13 @@ def driver(args, tool):
 
     runDir = getParam('MCS.RunDir', section=projectName)
 
+    if args.addTrials:
+        if args.addTrials < 0:
+            raise PygcamMcsUserError("The --addTrials argument must be a positive integer")
+
+        addTrials(simId, args.addTrials, paramFile, args)
+        return
+
     if args.delete:
         removeTreeSafely(runDir, ignore_errors=False)
 
@@ -586,9 +667,7 @@ def driver(args, tool):
 
     if trials:
         # Save a copy of the arguments used to create this simulation
-        simDir = getSimDir(simId)
-        argSaveFile = f'{simDir}/gcamGenSimArgs.txt'
-        saveDict(vars(args), argSaveFile)
+        saveDict(vars(args), _argSaveFile(simId))
 
 
 class GensimCommand(McsSubcommandABC):
@@ -598,6 +677,15 @@ class GensimCommand(McsSubcommandABC):
         super(GensimCommand, self).__init__('gensim', subparsers, kwargs)
 
     def addArgs(self, parser):
+        parser.add_argument('-a', '--addTrials', type=int, default=0, metavar='N',
+                            help=clean_help('''Add N trials to the existing simulation given by -s, rather
+                            than creating a new simulation. The new trials are numbered following the 
+                            existing ones and only they are saved to the trial data file and database.
+                            Supported only for simulations generated by the "montecarlo" method. The trials
+                            are generated from the simulation's saved copy of the parameter file, which must
+                            match the one given by -p or MCS.ParametersFile. If --seed is given, it is 
+                            combined with the number of existing trials so new values are generated.'''))
+
         parser.add_argument('--delete', action='store_true',
                             help=clean_help('''DELETE and recreate the simulation "run" directory.'''))
 
@@ -645,6 +733,11 @@ class GensimCommand(McsSubcommandABC):
         parser.add_argument('-S', '--calcSecondOrder', action='store_true',
                             help=clean_help('''For Sobol method only -- calculate second-order sensitivities.'''))
 
+        parser.add_argument('--seed', type=int, default=None,
+                            help=clean_help('''For the "montecarlo" method, the seed for the random number
+                            generator, so the same trial data can be generated again. By default, the
+                            generator is seeded from the operating system.'''))
+
         parser.add_argument('-s', '--simId', type=int, default=1,
                             help=clean_help('The id of the simulation. Default is 1.'))
 
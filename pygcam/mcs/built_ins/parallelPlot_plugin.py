@@ -58,6 +58,7 @@ class ParallelPlotCommand(McsSubcommandABC):
 
     def run(self, args, tool):
         from ..analysis import Analysis, makePlotPath
+        from ..summaryStats import isLinked
 
         simId = args.simId
         scenarioList = args.scenario.split(',')
@@ -74,7 +75,7 @@ class ParallelPlotCommand(McsSubcommandABC):
         inputDF = anaObj.getInputs()
 
         # Drop any inputs with names ending in '-linked' since these are an artifact
-        linked = [s for s in inputDF.columns if s.endswith('-linked')]
+        linked = list(filter(isLinked, inputDF.columns))
         if linked:
             inputDF = inputDF.drop(linked, axis=1)
 
@@ -170,8 +170,9 @@ class RunSimCommand(McsSubcommandABC):
                              defined trials.'''))
 
         parser.add_argument('-w', '--waitSecs', type=int, default=defaultWaitSecs,
-                            help=clean_help('''How many seconds to wait between queries to the ipyparallel
-                            controller for completed jobs. Default is %d.''' % defaultWaitSecs))
+                            help=clean_help('''How many seconds to wait between checks of the status of
+                            running trials and of the ipyparallel engines. (Completed trials are processed
+                            as they complete.) Default is %d.''' % defaultWaitSecs))
 
         return parser   # for auto-doc generation
 
@@ -13,7 +13,8 @@ import plotly.subplots as subplots
 from scipy import stats
 
 from pygcam.log import getLogger
-from pygcam.mcs.analysis import getCorrDF
+from pygcam.mcs.analysis import RankCorrelation
+from pygcam.mcs.summaryStats import isLinked
 from pygcam.config import getConfig, DEFAULT_SECTION, getParam, setParam, setSection, getSections
 from pygcam.mcs.Database import getDatabase
 from pygcam.gui.widgets import dataStore
@@ -108,7 +109,7 @@ class McsData(object):
         inputsDF = db.getParameterValues2(simId)
 
         # Drop any inputs with names ending in '-linked' since they're redundant
-        linked = [s for s in inputsDF.columns if s.endswith('-linked')]
+        linked = list(filter(isLinked, inputsDF.columns))
         if linked:
             inputsDF = inputsDF.drop(linked, axis=1, inplace=False)
 
@@ -350,18 +351,23 @@ class McsData(object):
         return plotData, title, annotations
 
     @cached
-    def getCorrDF(self, simId, scenario, resultName):
-        results = self.getOutValues(simId, scenario, resultName)
+    def getRankCorrelation(self, simId):
+        """
+        Return a RankCorrelation for the simulation's inputs, so the inputs
+        are ranked once for all scenarios and results.
+        """
         inputsDF = self.getParameterValues(simId)
-        inputsDF = inputsDF.iloc[results.index]      # select only trials for which we have results
+        return RankCorrelation(inputsDF)
 
-        corrDF = getCorrDF(inputsDF, results)
+    @cached
+    def getCorrDF(self, simId, scenario, resultName):
+        results = self.getOutValues(simId, scenario, resultName)
+        corrDF = self.getRankCorrelation(simId).corrDF(results)
         return corrDF
 
     @cached
     def getCorrByTrials(self, simId, scenario, resultName):
         results  = self.getOutValues(simId, scenario, resultName)
-        inputsDF = self.getParameterValues(simId)
 
         # # TBD: a hack to examine failures
         # idx = set(inputsDF.index[:max(results.index)]) - set(results.index)
@@ -375,26 +381,16 @@ class McsData(object):
         shuffle(idx) # performed in place
         results = results[idx]
 
-        inputsDF = inputsDF.iloc[results.index]      # select only trials for which we have results
-
         paramsToShow = 10
-        fullDF = getCorrDF(inputsDF, results)
+        fullDF = self.getCorrDF(simId, scenario, resultName)
         topParams = list(fullDF[:paramsToShow].index)
 
-        colsToDrop = set(inputsDF.columns) - set(topParams)
-        inputsDF = inputsDF.drop(colsToDrop, axis=1, inplace=False) # not inplace since it's a slice of the original
-
         trialSteps = list(range(CORR_STEP, len(results), CORR_STEP))    # produce corrDF for increments of 100 trials
         trialSteps.append(len(results))                                 # final value is for however many trials there were
 
-        corrByTrials = pd.DataFrame()
-
-        for count in trialSteps:
-            corrDF = getCorrDF(inputsDF[:count], results[:count])
-            corrDF['count'] = count
-            corrByTrials = corrByTrials.append(corrDF)
-
-        corrByTrials.reset_index(inplace=True)
+        # Computed from cumulative sums over the shuffled trials rather than per step
+        rankCorr = self.getRankCorrelation(simId)
+        corrByTrials = rankCorr.convergence(results, trialSteps, columns=topParams)
         return corrByTrials
 
 
@@ -460,7 +456,7 @@ class McsData(object):
             squared = corrDF.spearman ** 2
             corrDF['normalized'] = squared / squared.sum()
             corrDF['sign'] = 1
-            corrDF.ix[(corrDF.spearman < 0), 'sign'] = -1
+            corrDF.loc[(corrDF.spearman < 0), 'sign'] = -1
             corrDF['value'] = corrDF.normalized * corrDF.sign     # normalized squares with signs restored
             plotColumn = 'value'
             title = 'Normalized rank correlation'
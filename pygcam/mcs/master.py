@@ -14,7 +14,8 @@ from six import iteritems, string_types
 import os
 import stat
 import sys
-from time import sleep
+from six.moves.queue import Queue, Empty
+from time import sleep, time
 from IPython.paths import locate_profile
 
 import ipyparallel as ipp
@@ -24,7 +25,7 @@ from .context import Context
 from .Database import RUN_NEW, RUN_RUNNING, RUN_SUCCEEDED, RUN_QUEUED, RUN_KILLED, ENG_TERMINATE, getDatabase
 from .error import IpyparallelError, PygcamMcsSystemError, PygcamMcsUserError
 from .util import parseTrialString, createTrialString
-from ..config import getParam, getParamAsInt
+from ..config import getParam, getParamAsInt, getParamAsBoolean
 from ..log import getLogger
 
 # Exit values for Master.processTrials()
@@ -112,6 +113,8 @@ class Master(object):
         self.client = None
         self.finished = False
         self.idleEngines = set()
+        self.completed = None       # queue of completed tasks, set in run()
+        self.liveSummary = None     # set in run() if MCS.LiveSummary is True
 
         projectName = args.projectName
 
@@ -314,9 +317,12 @@ class Master(object):
 
     def resubmit(self, task, context, reason):
         _logger.info('Resubmitting task (%s) %s', reason, context)
-        self.client.resubmit(task)
+        ar = self.client.resubmit(task)
         self.setRunStatus(context, RUN_QUEUED)
 
+        if self.completed is not None:
+            self.watchTask(ar)
+
     def processTask(self, client, task, results):
         workerResult = None
 
@@ -387,50 +393,36 @@ class Master(object):
     def saveResults(self, results):
         '''
         Called on the master to save results to the database that were prepared by the worker.
+        Run statuses and the results of all successful runs are saved in one transaction, with
+        results written in bulk by db.saveRunResults. Stale results of failed runs for the
+        outputs they reported are deleted.
         '''
         db = getDatabase()
         session = db.Session()
 
         try:
-            # Delete all old values in first transaction
+            runResults = []
             for result in results:
                 context = result.context
                 resultsList = result.resultsList
-
-                if resultsList:
-                    # Delete any stale results for this runId (i.e., if re-running a given runId)
-                    names = [resultDict['paramName'] for resultDict in resultsList]
-                    ids = db.getOutputIds(names)
-                    db.deleteRunResults(context.runId, outputIds=ids, session=session)
-
-            db.commitWithRetry(session)
-
-            # Add all new values in a second transaction
-            for result in results:
-                context = result.context
-                resultsList = result.resultsList or []
-                runId   = context.runId
-
                 self.setRunStatus(context, session=session)
 
-                if context.status != RUN_SUCCEEDED:
+                if not resultsList:
                     continue
 
-                for resultDict in resultsList:
-                    paramName  = resultDict['paramName']
-                    value      = resultDict['value']
-                    regionName = resultDict['regionName']
-
-                    # Save the values to the database
-                    if resultDict['isScalar']:
-                        db.setOutValue(runId, paramName, value, session=session)
-                    else:
-                        regionId = db.getRegionId(regionName)   # cached; not a DB query
-                        units = resultDict['units']
-                        db.saveTimeSeries(runId, regionId, paramName, value, units=units, session=session)
+                if context.status == RUN_SUCCEEDED:
+                    runResults.append((context.runId, resultsList))
+                else:
+                    # Delete any stale results for this runId (i.e., if re-running a given runId)
+                    names = [resultDict['paramName'] for resultDict in resultsList]
+                    db.deleteRunResults(context.runId, outputIds=db.getOutputIds(names), session=session)
 
+            db.saveRunResults(runResults, session=session)
             db.commitWithRetry(session)
 
+            if self.liveSummary:
+                self.liveSummary.update(results)
+
         except Exception as e:
             session.rollback()
             # TBD: distinguish database save errors from data access errors?
@@ -467,9 +459,42 @@ class Master(object):
             except ipp.NoEnginesRegistered:
                 sleep(engineSleep)  # handled in loop
 
+    def watchTask(self, ar):
+        """
+        Arrange for the completion of the task represented by AsyncResult `ar`
+        to be handled by the loop in :py:meth:`run`.
+        """
+        self.remaining += 1
+        self.notStarted[ar.msg_ids[0]] = ar
+        ar.add_done_callback(self._taskDone)
+
+    def _taskDone(self, ar):
+        # Called by ipyparallel from its IO thread, so just hand the task to the main thread
+        self.completed.put(ar)
+
+    def processCompleted(self, ars):
+        """
+        Save the results of the given completed tasks in a single transaction.
+
+        :param ars: (list of AsyncResult) completed tasks
+        :return: none
+        """
+        finished = set([msgId for ar in ars for msgId in ar.msg_ids])
+        _logger.debug('%d completed tasks', len(finished))
+
+        results = self.getResults(finished)
+        if results:
+            self.saveResults(results)
+        else:
+            _logger.debug('Purging %d completed tasks with no results (engine died?)', len(finished))
+            self.client.purge_results(jobs=finished)
+
     def run(self):
         """
-        Run the main wait-and-process loop on `ars`, a list of async result instances.
+        Run the trials and process results as tasks complete. Completed tasks are
+        collected by a callback on each task's AsyncResult and saved in batches of
+        up to IPP.ResultBatchSize, while status changes of running trials and the
+        status of engines are checked every `args.waitSecs` seconds.
         Takes parameters from arguments passed from runsim plugin.
 
         :return: none
@@ -487,73 +512,78 @@ class Master(object):
         self.waitForWorkers()    # wait for engines to spin up
 
         shutdownWhenIdle = not args.dontShutdownWhenIdle
+        batchSize = getParamAsInt('IPP.ResultBatchSize')
+
+        if getParamAsBoolean('MCS.LiveSummary'):
+            from .summaryStats import LiveAggregator
+            self.liveSummary = LiveAggregator(self.db)
 
         ars = self.runTrials()
 
-        pending = copy.copy(self.client.outstanding)
+        # AsyncResults are futures: each calls _taskDone (in the client's IO thread)
+        # when it completes, so completions are handled as they arrive rather than
+        # found by comparing the set of outstanding tasks on each pass.
+        self.completed = Queue()
+        self.remaining = 0
+        self.notStarted = {}    # tasks that haven't yet reported that they're running, by msg_id
+        for ar in ars:
+            self.watchTask(ar)
 
-        counter = 0         # for occasionally displaying queue status
+        lastCheck = None        # time of last status check
+        checkIdle = shutdownWhenIdle    # shutdown idle engines on first check to handle initial over-allocation
+        counter = 0             # for occasionally displaying queue status
 
-        while pending:
+        while self.remaining:
 
             if not self.checkEngines():
                 return
 
-            state = 'nominal'   # set to 'completed' when some are completed, to set shorter sleep
+            # Wait for a task to complete, then take any others already completed
+            done = []
+            try:
+                done.append(self.completed.get(timeout=args.waitSecs))
+                while len(done) < batchSize:
+                    done.append(self.completed.get_nowait())
+            except Empty:
+                pass
 
-            # check for status updates
-            for ar in ars:
-                data = ar.data[0]
-                if data:
-                    context = data.get('context')
-                    if context:
-                        self.setRunStatus(context)
+            if done:
+                self.remaining -= len(done)
+                for ar in done:
+                    self.notStarted.pop(ar.msg_ids[0], None)
 
-            # finished is the set of msg_ids that are complete
-            finished = pending.difference(self.client.outstanding)
+                self.processCompleted(done)
+                checkIdle = shutdownWhenIdle
 
-            # update pending to exclude those that finished
-            pending = pending.difference(finished)
+            # Status changes and engine and queue status are checked every waitSecs
+            now = time()
+            if lastCheck is not None and now - lastCheck < args.waitSecs:
+                continue
 
-            if finished:
-                state = 'completed'
-                _logger.debug('%d completed tasks', len(finished))
+            lastCheck = now
 
-                results = self.getResults(finished)
-                if results:
-                    self.saveResults(results)
-                else:
-                    _logger.debug('Purging %d completed tasks with no results (engine died?)', len(finished))
-                    self.client.purge_results(jobs=finished)
+            # Workers publish a status change when a trial starts running
+            started = [(msgId, ar) for msgId, ar in iteritems(self.notStarted) if ar.data[0]]
+            for msgId, ar in started:
+                context = ar.data[0].get('context')
+                if context:
+                    self.setRunStatus(context)
 
-                # drop finished tasks from list to avoid checking status needlessly
-                toDelete = []
-                for ar in ars:
-                    id = ar.msg_id[0]
-                    if id in finished:
-                        toDelete.append(ar)
-                        finished.remove(id)
+                del self.notStarted[msgId]
 
-                for ar in toDelete:
-                    ars.remove(ar)
-
-                if shutdownWhenIdle:
-                    self.shutdownIdleEngines()
+            if checkIdle:
+                self.shutdownIdleEngines()
+                checkIdle = False
 
             if counter % 5 == 0:
                 totals = self.queueTotals()
-                _logger.info("%d clients; totals: %s", len(self.client), totals)
-
-            secs = args.waitSecs if state == 'nominal' else 2
-            _logger.debug('sleep(%d)', secs)
-            sleep(secs)
-
-            # handle the case of initial over-allocation
-            if counter == 0 and shutdownWhenIdle:
-                self.shutdownIdleEngines()
+                _logger.info("%d clients; %d tasks remaining; totals: %s", len(self.client), self.remaining, totals)
 
             counter += 1
 
+        if self.liveSummary:
+            self.liveSummary.update([], force=True)
+
         _logger.info("Shutting down hub")
         # self.client.shutdown(hub=False, block=False)    # doesn't seem to work any more
         stopCluster()
@@ -109,3 +109,41 @@ class TimeSeries(CoreMCSMixin, ORMBase):
     regionId = Column(Integer, ForeignKey('region.regionId', ondelete="CASCADE"))
     outputId = Column(Integer, ForeignKey('output.outputId', ondelete="CASCADE"))
     units = Column(String)
+
+
+class TimeSeriesValue(CoreMCSMixin, ORMBase):
+    '''
+    Time-series results in "long" format, i.e., one row per year, used instead
+    of the TimeSeries table if config variable MCS.TimeSeriesStorage is "long".
+    Units are stored in the Output table.
+    '''
+    runId    = Column(Integer, ForeignKey('run.runId', ondelete="CASCADE"), primary_key=True)
+    outputId = Column(Integer, ForeignKey('output.outputId', ondelete="CASCADE"), primary_key=True)
+    regionId = Column(Integer, ForeignKey('region.regionId', ondelete="CASCADE"), primary_key=True)
+    year     = Column(Integer, primary_key=True)
+    value    = Column(Float)
+    __table_args__ = (Index("timeseriesvalue_index1", "outputId", "runId", unique=False),)
+
+
+class LiveSummary(CoreMCSMixin, ORMBase):
+    '''
+    Running statistics for each scalar output of each experiment, saved by
+    "gt runsim" as results are committed if config variable MCS.LiveSummary
+    is True. The histogram and importance columns hold JSON: the histogram's
+    bin edges and counts, and the rank correlations of the most important inputs.
+    '''
+    simId      = Column(Integer, ForeignKey('sim.simId', ondelete="CASCADE"), primary_key=True)
+    expId      = Column(Integer, ForeignKey('experiment.expId', ondelete="CASCADE"), primary_key=True)
+    outputId   = Column(Integer, ForeignKey('output.outputId', ondelete="CASCADE"), primary_key=True)
+    count      = Column(Integer)
+    mean       = Column(Float)
+    stdev      = Column(Float)
+    skewness   = Column(Float)
+    minimum    = Column(Float)
+    median     = Column(Float)
+    maximum    = Column(Float)
+    ciLow      = Column(Float)      # 2.5th percentile
+    ciHigh     = Column(Float)      # 97.5th percentile
+    histogram  = Column(String)
+    importance = Column(String)
+    updated    = Column(DateTime, default=datetime.now, onupdate=datetime.now)
@@ -0,0 +1,504 @@
+# Copyright (c) 2019 Richard Plevin
+# See the https://opensource.org/licenses/MIT for license details.
+'''
+.. Statistics that can be computed incrementally or for many results at once,
+   without the plotting dependencies of the analysis module, and the aggregator
+   that "gt runsim" uses to summarize results as they are saved.
+'''
+import json
+from time import time
+
+import numpy as np
+import pandas as pd
+
+from pygcam.config import getParamAsInt
+from pygcam.log import getLogger
+
+from .error import PygcamMcsUserError
+
+_logger = getLogger(__name__)
+
+def isLinked(colname):
+    '''
+    Return True if `colname` names a "-linked" input, which is an artifact of
+    parameters whose values are linked to another parameter's. Column names
+    can look like 'foobar[0][34]', so the indexing part is ignored.
+    '''
+    pos = colname.find('[')
+    colname = colname if pos < 0 else colname[0:pos]
+    return colname.endswith('-linked')
+
+class RunningStats(object):
+    '''
+    Single-pass statistics over a growing set of values, used to check the
+    convergence of a simulation's results. The mean, variance, and skewness are
+    accumulated as running moments (using the pairwise update of Chan et al.,
+    a batch form of Welford's method), and values are kept in a sorted array,
+    merged batch by batch, so percentiles need no further sorting. NaN values
+    are ignored.
+    '''
+    def __init__(self, values=None):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0       # sum of squared deviations from the mean
+        self.m3 = 0.0       # sum of cubed deviations from the mean
+        self.sorted = np.empty(0)
+
+        if values is not None:
+            self.update(values)
+
+    def update(self, values):
+        '''
+        Add a batch of values.
+
+        :param values: (iterable of numbers) the new values
+        :return: none
+        '''
+        batch = np.asarray(values, dtype=np.float64).ravel()
+        batch = np.sort(batch[~np.isnan(batch)])
+
+        nB = len(batch)
+        if nB == 0:
+            return
+
+        meanB = batch.mean()
+        dev = batch - meanB
+        m2B = (dev ** 2).sum()
+        m3B = (dev ** 3).sum()
+
+        nA = self.count
+        n = nA + nB
+        delta = meanB - self.mean
+
+        self.m3 += (m3B + delta ** 3 * nA * nB * (nA - nB) / n ** 2 +
+                    3 * delta * (nA * m2B - nB * self.m2) / n)
+        self.m2 += m2B + delta ** 2 * nA * nB / n
+        self.mean += delta * nB / n
+        self.count = n
+
+        self.sorted = np.insert(self.sorted, np.searchsorted(self.sorted, batch), batch)
+
+    def std(self):
+        '''Return the sample standard deviation, as computed by pandas.Series.std()'''
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+    def skew(self):
+        '''Return the bias-adjusted sample skewness, as computed by pandas.Series.skew()'''
+        n = self.count
+        if n < 3:
+            return np.nan
+
+        if self.m2 == 0:
+            return 0.0
+
+        return n * (n - 1) ** 0.5 / (n - 2) * self.m3 / self.m2 ** 1.5
+
+    def percentile(self, q):
+        '''
+        Return the q-th percentile of the values, interpolated linearly as by
+        np.percentile.
+
+        :param q: (float) percentile in the range [0, 100]
+        :return: (float) the percentile value
+        '''
+        n = self.count
+        if n == 0:
+            return np.nan
+
+        pos = q / 100.0 * (n - 1)
+        lo = int(np.floor(pos))
+        hi = min(lo + 1, n - 1)
+        return self.sorted[lo] + (pos - lo) * (self.sorted[hi] - self.sorted[lo])
+
+    def summary(self):
+        '''
+        Return the statistics plotted by plotConvergence.
+
+        :return: (dict) values for keys 'Mean', 'Stdev', 'Skewness', and '95% CI',
+            the last being the width of the central 95% interval.
+        '''
+        return {'Mean': self.mean if self.count else np.nan,
+                'Stdev': self.std(),
+                'Skewness': self.skew(),
+                '95% CI': self.percentile(97.5) - self.percentile(2.5)}
+
+
+
+def _standardize(ranks):
+    '''
+    Center each column of the 2-D array `ranks` and scale it to unit length, so
+    the dot product of two columns is their Pearson correlation. Constant
+    columns become NaN.
+    '''
+    ranks = ranks - ranks.mean(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return ranks / np.sqrt((ranks ** 2).sum(axis=0))
+
+
+class RankCorrelation(object):
+    '''
+    Computes Spearman rank correlations between the inputs of a simulation and
+    any number of outputs. The input matrix is ranked once for each set of
+    trials with results (usually just one set, all trials) and the ranks are
+    cached, so the correlations of all inputs with many outputs are computed
+    with a single matrix product of standardized ranks.
+    '''
+    def __init__(self, inputs):
+        '''
+        :param inputs: (pandas.DataFrame) input values for each parameter, indexed by trialNum
+        '''
+        self.inputs = inputs
+        self.values = inputs.to_numpy(dtype=np.float64)
+        self.cache = {}     # row mask (bytes) => (rows, standardized ranks)
+
+    def _rows(self, trials):
+        rows = self.inputs.index.get_indexer(trials)
+        if (rows < 0).any():
+            raise PygcamMcsUserError("Results include trials that have no input values")
+        return rows
+
+    def _inputRanks(self, rows, standardize=True):
+        '''
+        Return the ranks of the input values in the given rows, optionally standardized.
+        '''
+        key = (rows.tobytes(), standardize)
+        ranks = self.cache.get(key)
+        if ranks is None:
+            ranks = pd.DataFrame(self.values[rows]).rank().to_numpy()
+            if standardize:
+                ranks = _standardize(ranks)
+            self.cache[key] = ranks
+
+        return ranks
+
+    def correlate(self, outputs):
+        '''
+        Compute the Spearman rank correlations between each input and each output.
+        Trials with missing (NaN) output values are ignored.
+
+        :param outputs: (pandas.Series or pandas.DataFrame) values for one or more
+            model results, indexed by trialNum
+        :return: (pandas.Series or pandas.DataFrame) for a Series, the correlations
+            of each input with the output, in a Series named "spearman"; for a
+            DataFrame, the correlations indexed by input and with one column per output.
+        '''
+        if isinstance(outputs, pd.Series):
+            corr = self.correlate(outputs.to_frame())
+            return pd.Series(corr.iloc[:, 0].values, index=corr.index, name='spearman')
+
+        result = pd.DataFrame(index=self.inputs.columns, columns=outputs.columns, dtype=np.float64)
+
+        # Outputs with values for the same trials share one ranking of the inputs
+        valid = outputs.notna().to_numpy()
+        groups = {}
+        for i, mask in enumerate(valid.T):
+            groups.setdefault(mask.tobytes(), []).append(i)
+
+        for cols in groups.values():
+            mask = valid[:, cols[0]]
+            rows = self._rows(outputs.index[mask])
+            inputRanks = self._inputRanks(rows)
+            outputRanks = _standardize(outputs.iloc[mask, cols].rank().to_numpy())
+            result.iloc[:, cols] = inputRanks.T.dot(outputRanks)
+
+        return result
+
+    def corrDF(self, output):
+        '''
+        Generate a DataFrame with rank correlations between each input and the
+        given output, sorted by abs(correlation), descending. See analysis.getCorrDF.
+        '''
+        corrDF = pd.DataFrame(self.correlate(output))
+        corrDF['abs'] = corrDF.spearman.abs()
+        corrDF.sort_values('abs', ascending=False, inplace=True)
+        return corrDF
+
+    def convergence(self, output, counts, columns=None):
+        '''
+        Compute the rank correlations between inputs and `output` using the first
+        `count` trials, for each count in `counts`. The inputs and output are ranked
+        once, over all trials with results, and the correlations for each count are
+        computed from cumulative sums of the ranks, their squares, and their products.
+        Thus each value is the correlation of these overall ranks over the first
+        `count` trials, which equals the Spearman correlation at the full count.
+
+        :param output: (pandas.Series) values for one model result, indexed by
+            trialNum, in the order in which trials are to be accumulated
+        :param counts: (iterable of int) the numbers of trials to compute correlations for
+        :param columns: (list of str) the inputs to compute correlations for;
+            by default, all inputs.
+        :return: (pandas.DataFrame) with columns "paramName", "spearman", "abs",
+            and "count", sorted by count and, within each count, by abs(spearman),
+            descending.
+        '''
+        output = output.dropna()
+        rows = self._rows(output.index)
+
+        # The cached ranks are for trials in index order
+        order = np.argsort(rows, kind='stable')
+        x = np.empty((len(rows), self.values.shape[1]))
+        x[order] = self._inputRanks(np.sort(rows), standardize=False)
+
+        names = self.inputs.columns
+        if columns is not None:
+            selected = names.get_indexer(columns)
+            x = x[:, selected]
+            names = names[selected]
+
+        # Centering at the mean rank keeps the cumulative sums small
+        x -= (len(rows) + 1) / 2.0
+        y = output.rank().to_numpy() - (len(rows) + 1) / 2.0
+
+        counts = np.asarray(list(counts))
+        idx = counts - 1
+        n = counts[:, np.newaxis].astype(np.float64)
+
+        sx  = np.cumsum(x, axis=0)[idx]
+        sxx = np.cumsum(x * x, axis=0)[idx]
+        sxy = np.cumsum(x * y[:, np.newaxis], axis=0)[idx]
+        sy  = np.cumsum(y)[idx][:, np.newaxis]
+        syy = np.cumsum(y * y)[idx][:, np.newaxis]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = (sxy - sx * sy / n) / np.sqrt((sxx - sx * sx / n) * (syy - sy * sy / n))
+
+        df = pd.DataFrame({'paramName': np.tile(np.asarray(names), len(counts)),
+                           'spearman': corr.ravel(),
+                           'count': np.repeat(counts, len(names))})
+        df['abs'] = df.spearman.abs()
+        df.sort_values(['count', 'abs'], ascending=[True, False], inplace=True)
+        df.reset_index(drop=True, inplace=True)
+        return df[['paramName', 'spearman', 'abs', 'count']]
+
+
+
+class _LiveOutput(object):
+    '''
+    The running statistics and the values, by trial, of one output of one scenario.
+    '''
+    def __init__(self):
+        self.stats = RunningStats()
+        self.trials = {}        # trialNum => value
+        self.dirty = False
+
+    def add(self, trialNums, values):
+        '''
+        Add values for trials not already seen. Values for re-run trials are
+        ignored, since values can't be removed from the running statistics.
+        '''
+        new = [(trialNum, value) for trialNum, value in zip(trialNums, values)
+               if trialNum not in self.trials and value is not None and not np.isnan(value)]
+        if not new:
+            return
+
+        self.trials.update(new)
+        self.stats.update([value for _, value in new])
+        self.dirty = True
+
+
+class LiveAggregator(object):
+    '''
+    Maintains running statistics, histograms, and rank-correlation importance
+    estimates for each scalar output of each scenario as :py:meth:`Master.saveResults`
+    commits results, and saves them to the "livesummary" table at most every
+    `interval` seconds, so "gt analyze --live" can show a simulation's progress
+    without reading the "outvalue" table. When an output is first seen, the values
+    already in the database (e.g., from an earlier run of the simulation) are read
+    once. Failures are logged and otherwise ignored so they can't interrupt a run.
+    '''
+    def __init__(self, db, interval=None, bins=None, maxVars=None):
+        '''
+        :param db: (CoreDatabase) the database to read results from and save summaries to
+        :param interval: (int) minimum number of seconds between saves; defaults to
+            the value of config variable ``MCS.LiveSummaryInterval``.
+        :param bins: (int) number of histogram bins; defaults to ``MCS.LiveSummaryBins``.
+        :param maxVars: (int) number of most important inputs to save for each output;
+            defaults to ``MCS.LiveSummaryVars``.
+        '''
+        self.db = db
+        self.interval = getParamAsInt('MCS.LiveSummaryInterval') if interval is None else interval
+        self.bins     = bins or getParamAsInt('MCS.LiveSummaryBins')
+        self.maxVars  = getParamAsInt('MCS.LiveSummaryVars') if maxVars is None else maxVars
+
+        self.outputs = {}       # (simId, expName, outputName) => _LiveOutput
+        self.rankCorr = {}      # simId => RankCorrelation of the trial data
+        self.lastSave = time()
+
+    def update(self, results, force=False):
+        '''
+        Add the scalar results of successful runs and save the summaries if
+        `interval` seconds have passed since they were last saved.
+
+        :param results: (list of worker.Result) results that have been committed
+        :param force: (bool) save the summaries regardless of the time
+        :return: none
+        '''
+        try:
+            self._addResults(results)
+            if force or time() - self.lastSave >= self.interval:
+                self.save()
+
+        except Exception as e:
+            _logger.warning("Failed to update live summary: %s", e)
+
+    def _addResults(self, results):
+        from .Database import RUN_SUCCEEDED
+
+        newValues = {}      # (simId, expName, outputName) => ([trialNum], [value])
+        for result in results:
+            context = result.context
+            if context.status != RUN_SUCCEEDED or not result.resultsList:
+                continue
+
+            for resultDict in result.resultsList:
+                if resultDict['isScalar']:
+                    key = (context.simId, context.scenario, resultDict['paramName'])
+                    trialNums, values = newValues.setdefault(key, ([], []))
+                    trialNums.append(context.trialNum)
+                    values.append(float(resultDict['value']))
+
+        self._readExisting([key for key in newValues if key not in self.outputs])
+
+        for key, (trialNums, values) in newValues.items():
+            self.outputs[key].add(trialNums, values)
+
+    def _readExisting(self, keys):
+        '''
+        Create entries for outputs seen for the first time, reading the values
+        already in the database with one query per simulation and scenario.
+        '''
+        groups = {}
+        for simId, expName, outputName in keys:
+            groups.setdefault((simId, expName), []).append(outputName)
+
+        for (simId, expName), outputNames in groups.items():
+            df = self.db.getOutValuesBulk(simId, [expName], outputNames)
+            for outputName in outputNames:
+                entry = self.outputs[(simId, expName, outputName)] = _LiveOutput()
+                if (expName, outputName) in df.columns:
+                    series = df[(expName, outputName)].dropna()
+                    entry.add(series.index, series.values)
+
+    def _getRankCorrelation(self, simId, trialNums):
+        '''
+        Return the RankCorrelation of the trial data for `simId`, re-reading
+        the file if trials have been added since it was read.
+        '''
+        from .util import readTrialDataFile
+
+        rankCorr = self.rankCorr.get(simId)
+        if rankCorr is None or not set(trialNums).issubset(rankCorr.inputs.index):
+            df = readTrialDataFile(simId)
+            linked = list(filter(isLinked, df.columns))
+            self.rankCorr[simId] = rankCorr = RankCorrelation(df.drop(linked, axis=1))
+
+        return rankCorr
+
+    def _importance(self, simId, entries):
+        '''
+        Return a dict keyed by output name of dicts of the largest rank
+        correlations between the inputs and each of the outputs in `entries`.
+        '''
+        outputs = pd.DataFrame({outputName: pd.Series(entry.trials)
+                                for outputName, entry in entries.items() if entry.stats.count >= 3})
+        if outputs.empty:
+            return {}
+
+        corr = self._getRankCorrelation(simId, outputs.index).correlate(outputs)
+
+        importance = {}
+        for outputName in corr.columns:
+            spearman = corr[outputName].dropna()
+            top = spearman.abs().sort_values(ascending=False).index[:self.maxVars]
+            importance[outputName] = {name: round(float(spearman[name]), 4) for name in top}
+
+        return importance
+
+    def save(self):
+        '''
+        Save the summaries of all outputs with new values to the database.
+        '''
+        groups = {}     # (simId, expName) => {outputName: _LiveOutput}
+        for (simId, expName, outputName), entry in self.outputs.items():
+            if entry.dirty:
+                groups.setdefault((simId, expName), {})[outputName] = entry
+
+        # Input ranks are shared by the scenarios saved together, but the
+        # trials with results differ from one save to the next.
+        for rankCorr in self.rankCorr.values():
+            rankCorr.cache.clear()
+
+        rows = []
+        for (simId, expName), entries in groups.items():
+            importance = self._importance(simId, entries) if self.maxVars else {}
+
+            for outputName, entry in entries.items():
+                stats = entry.stats
+                counts, edges = np.histogram(stats.sorted, bins=self.bins)
+                histogram = {'edges': [float(edge) for edge in edges], 'counts': counts.tolist()}
+
+                rows.append(dict(simId=simId, expName=expName, outputName=outputName,
+                                 count=stats.count, mean=stats.mean, stdev=stats.std(),
+                                 skewness=stats.skew(), minimum=stats.percentile(0),
+                                 median=stats.percentile(50), maximum=stats.percentile(100),
+                                 ciLow=stats.percentile(2.5), ciHigh=stats.percentile(97.5),
+                                 histogram=json.dumps(histogram),
+                                 importance=json.dumps(importance.get(outputName, {}))))
+
+        if rows:
+            self.db.saveLiveSummary(rows)
+            _logger.debug("Saved live summary of %d outputs", len(rows))
+
+        for entries in groups.values():
+            for entry in entries.values():
+                entry.dirty = False
+
+        self.lastSave = time()
+
+
+def _formatStat(value):
+    '''
+    Format a statistic, which is None or NaN if there were too few values to compute it.
+    '''
+    return 'n/a' if value is None or pd.isnull(value) else '%.4g' % value
+
+def printLiveSummary(simId, expList=None, resultList=None, maxVars=5):
+    '''
+    Print the running statistics saved by "gt runsim" (see LiveAggregator)
+    for the given simulation, which may still be running.
+
+    :param simId: (int) simulation ID
+    :param expList: (list of str) experiments to show; default is all
+    :param resultList: (list of str) results to show; default is all
+    :param maxVars: (int) the number of most important inputs to show
+    :return: none
+    '''
+    from .Database import getDatabase
+
+    db = getDatabase()
+    df = db.getLiveSummary(simId, expList=expList, outputList=resultList)
+    if df.empty:
+        print("No live summary found for simId %d. (Is MCS.LiveSummary set to True?)" % simId)
+        return
+
+    trials = db.getTrialCount(simId) or 0
+
+    for row in df.itertuples():
+        stats = [_formatStat(value) for value in (row.mean, row.median, row.stdev, row.skewness,
+                                                  row.minimum, row.maximum, row.ciLow, row.ciHigh)]
+        print('''
+%s, %s (updated %s):
+     count: %d of %d trials
+      mean: %s
+    median: %s
+     stdev: %s
+      skew: %s
+       min: %s
+       max: %s
+    95%% CI: [%s, %s]''' % tuple([row.expName, row.outputName, row.updated, row.count, trials] + stats))
+
+        importance = list(row.importance.items())[:maxVars]
+        if importance:
+            print('  rank correlations:')
+            for name, value in importance:
+                print('    %6.3f  %s' % (value, name))
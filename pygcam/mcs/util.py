@@ -28,7 +28,8 @@ YEAR_COL_PREFIX = 'y'
 
 def writeTrialDataFile(simId, df):
     '''
-    Save the trial DataFrame in the file 'trialData.csv' in the simDir.
+    Save the trial DataFrame in the file 'trialData.csv' in the simDir, and
+    the corresponding trial matrix (see writeTrialMatrix).
     '''
     simDir = getSimDir(simId)
     dataFile = os.path.join(simDir, 'trialData.csv')
@@ -40,14 +41,60 @@ def writeTrialDataFile(simId, df):
         pass
 
     df.to_csv(dataFile, index_label='trialNum')
+    writeTrialMatrix(dataFile, df)
 
 
-def readTrialDataFile(simId):
+def appendTrialDataFile(simId, df):
     """
-    Load trial data (e.g., saved by writeTrialDataFile) and return a DataFrame
+    Append the trials in `df` to the file 'trialData.csv' in the simDir, and
+    extend the corresponding trial matrix (see writeTrialMatrix) without
+    re-reading the existing trials from the CSV file.
+
+    :param simId: (int) the simulation id
+    :param df: (pandas.DataFrame) the new trials, indexed by trialNum, with
+        the same columns as the existing file (in any order)
+    :return: none
     """
-    import pandas as pd
+    import csv
+    import numpy as np
 
+    simDir = getSimDir(simId)
+    dataFile = os.path.join(simDir, 'trialData.csv')
+
+    if not os.path.exists(dataFile):
+        raise PygcamMcsUserError("Can't append trials: trial data file %s does not exist" % dataFile)
+
+    with open(dataFile, newline='') as f:
+        columns = next(csv.reader(f))[1:]
+
+    if set(columns) != set(df.columns):
+        raise PygcamMcsUserError("Can't append trials to %s: parameter names differ from those in the file" % dataFile)
+
+    df = df[columns]
+    loaded = _loadTrialMatrix(dataFile)
+
+    df.to_csv(dataFile, mode='a', header=False)
+
+    if loaded is None:
+        writeTrialMatrix(dataFile)
+        return
+
+    header, matrix = loaded
+    firstTrial = header['firstTrial']
+    if df.index[0] != firstTrial + matrix.shape[0]:
+        writeTrialMatrix(dataFile)
+        return
+
+    try:
+        combined = np.concatenate([matrix, df.to_numpy(dtype=np.float64)])
+        _saveTrialMatrix(dataFile, combined, columns, firstTrial)
+    except Exception as e:
+        _logger.debug("Failed to extend trial matrix for %s: %s", dataFile, e)
+
+def getTrialDataPath(simId):
+    """
+    Return the pathname of the trial data file read by readTrialDataFile.
+    """
     simDir = getSimDir(simId)
 
     # If SALib version exists, use it; otherwise use legacy file
@@ -55,9 +102,165 @@ def readTrialDataFile(simId):
     if not os.path.lexists(dataFile):
         dataFile = os.path.join(simDir, 'trialData.csv')
 
+    return dataFile
+
+def _trialMatrixPaths(dataFile):
+    base = os.path.splitext(dataFile)[0]
+    return base + '.npy', base + '.columns.json'
+
+def _fileStamp(pathname):
+    st = os.stat(pathname)
+    return [st.st_size, st.st_mtime_ns]
+
+def _saveTrialMatrix(dataFile, matrix, columns, firstTrial):
+    """
+    Write `matrix` and its JSON header for the CSV file `dataFile`. Each file is
+    written to a temporary name and renamed so readers never see a partial file.
+    """
+    import json
+    import numpy as np
+
+    matrixFile, columnsFile = _trialMatrixPaths(dataFile)
+    tmpSuffix = '.%d.tmp' % os.getpid()
+
+    header = {'columns': [str(col) for col in columns],
+              'firstTrial': firstTrial,
+              'shape': list(matrix.shape),
+              'source': _fileStamp(dataFile)}
+    try:
+        # The header is written last since it identifies the matrix as current
+        with open(matrixFile + tmpSuffix, 'wb') as f:
+            np.save(f, matrix)
+        os.replace(matrixFile + tmpSuffix, matrixFile)
+
+        with open(columnsFile + tmpSuffix, 'w') as f:
+            json.dump(header, f)
+        os.replace(columnsFile + tmpSuffix, columnsFile)
+
+    except Exception:
+        for path in (matrixFile, columnsFile):
+            try:
+                os.remove(path + tmpSuffix)
+            except OSError:
+                pass
+        raise
+
+def writeTrialMatrix(dataFile, df=None):
+    """
+    Save the trial data as a float64 matrix in a ".npy" file alongside the CSV
+    file `dataFile`, so single trials can be read from a memory map rather than
+    by parsing the entire CSV file. The column names, the first trial number,
+    and the size and modification time of `dataFile` are saved in a JSON file
+    with the suffix ".columns.json". A matrix is not written if the trial numbers
+    are not consecutive or the data are not numeric. Failures are logged and
+    otherwise ignored, since readTrialDataFile falls back to the CSV file.
+
+    :param dataFile: (str) the pathname of the trial data CSV file
+    :param df: (pandas.DataFrame) the contents of `dataFile`, indexed by
+        trialNum; if None, `dataFile` is read.
+    :return: (bool) True if the matrix was written
+    """
+    import numpy as np
+    import pandas as pd
+
+    try:
+        if df is None:
+            df = pd.read_table(dataFile, sep=',', index_col='trialNum')
+
+        trialNums = np.asarray(df.index)
+        firstTrial = int(trialNums[0]) if len(trialNums) else 0
+        if not np.array_equal(trialNums, np.arange(firstTrial, firstTrial + len(trialNums))):
+            _logger.debug("Not writing trial matrix for %s: trial numbers are not consecutive", dataFile)
+            return False
+
+        _saveTrialMatrix(dataFile, df.to_numpy(dtype=np.float64), df.columns, firstTrial)
+
+    except Exception as e:
+        _logger.debug("Failed to write trial matrix for %s: %s", dataFile, e)
+        return False
+
+    _logger.debug("Wrote trial matrix %s", _trialMatrixPaths(dataFile)[0])
+    return True
+
+def _loadTrialMatrix(dataFile):
+    """
+    Return a tuple of the JSON header and the memory-mapped trial matrix for
+    `dataFile`, or None if the matrix is missing or not current.
+    """
+    import json
+    import numpy as np
+
+    matrixFile, columnsFile = _trialMatrixPaths(dataFile)
+    try:
+        with open(columnsFile) as f:
+            header = json.load(f)
+
+        if header['source'] != _fileStamp(dataFile):
+            return None
+
+        matrix = np.load(matrixFile, mmap_mode='r')
+
+    except Exception as e:
+        _logger.debug("Can't use trial matrix for %s: %s", dataFile, e)
+        return None
+
+    if list(matrix.shape) != header['shape']:
+        return None
+
+    return header, matrix
+
+def _readTrialRow(dataFile, trialNum):
+    """
+    Return the row for `trialNum` from the trial matrix for `dataFile` as a
+    one-row DataFrame, or None if the matrix is missing or not current.
+    """
+    import numpy as np
+    import pandas as pd
+
+    loaded = _loadTrialMatrix(dataFile)
+    if loaded is None:
+        return None
+
+    header, matrix = loaded
+    row = trialNum - header['firstTrial']
+    if not 0 <= row < matrix.shape[0]:
+        raise PygcamMcsUserError("Trial %d is not in trial data file %s" % (trialNum, dataFile))
+
+    index = pd.Index([trialNum], name='trialNum')
+    return pd.DataFrame(np.array(matrix[row:row + 1]), index=index, columns=header['columns'])
+
+def readTrialDataFile(simId, trialNum=None):
+    """
+    Load trial data (e.g., saved by writeTrialDataFile) and return a DataFrame
+    indexed by trialNum.
+
+    :param simId: (int) the simulation id
+    :param trialNum: (int) if not None, return a DataFrame holding only the row
+        for this trial, which is read from the trial matrix written by
+        writeTrialMatrix without parsing the CSV file. If the matrix is missing
+        or out of date, it is rebuilt from the CSV file.
+    :return: (pandas.DataFrame) the trial data
+    """
+    import pandas as pd
+
+    dataFile = getTrialDataPath(simId)
+
+    if trialNum is not None:
+        df = _readTrialRow(dataFile, trialNum)
+        if df is not None:
+            return df
+
     df = pd.read_table(dataFile, sep=',', index_col='trialNum')
+
+    if trialNum is not None:
+        writeTrialMatrix(dataFile, df)
+
+        if trialNum not in df.index:
+            raise PygcamMcsUserError("Trial %d is not in trial data file %s" % (trialNum, dataFile))
+
+        df = df.loc[[trialNum]]
+
     return df
-    # return df.as_matrix()
 
 def createOutputDir(outputDir):
     from ..utils import removeFileOrTree
@@ -363,6 +566,15 @@ def saveDict(d, filename):
         for key, value in d.items():
             f.write('%s=%s\n' % (key, value))
 
+def loadDict(filename):
+    '''
+    Read a file written by saveDict and return a dict of the (string) values.
+    '''
+    with open(filename) as f:
+        pairs = [line.rstrip('\n').split('=', 1) for line in f if '=' in line]
+
+    return dict(pairs)
+
 def fullClassname(obj):
     module = obj.__class__.__module__
     if module is None or module == str.__class__.__module__:
@@ -429,25 +641,35 @@ def getRunQueryDir():
     path = os.path.join(workspace, QueryDirName)
     return path
 
-def hardlink_directory_contents(src_dir, dst_dir):
+def hardlink_directory_contents(src_dir, dst_dir, method='hardlink'):
     """
     Recursively hard link all files in the source directory ``src_dir`` in the
-    destination directory ``dst_dir``. Subdirectories are created in the same
-    relative location in ``dst_dir``, and all files are linked.
-
-    :param src_dir: (str or pathlib.Path) the directory to create links to
-    :param dst_dir: (str or pathlib.Path) the directory in which to create links
+    destination directory ``dst_dir``, in one pass over ``src_dir``. This is used
+    to create MCS trial sandboxes from a template (see MCS.SandboxTemplate).
+    Subdirectories are created in the same relative location in ``dst_dir``,
+    symbolic links are recreated with the same targets, and all files are linked
+    or, depending on ``method``, cloned or copied (see pygcam.utils.cloneFile).
+    Existing files in ``dst_dir`` are left as is.
+
+    :param src_dir: (str) the directory to create links to
+    :param dst_dir: (str) the directory in which to create links
+    :param method: (str) "hardlink", "reflink", or "copy"
     :return: none
     """
-    mkdirs(dst_dir)
+    from pygcam.utils import cloneFile
 
-    src_dir_len = len(src_dir)
+    mkdirs(dst_dir)
 
     for item in os.scandir(src_dir):
-        rel_path = item.path[src_dir_len:]
-        dst_abs_path = dst_dir + rel_path
+        dst_abs_path = os.path.join(dst_dir, item.name)
+
+        if item.is_symlink():
+            if os.path.lexists(dst_abs_path):
+                continue
+            os.symlink(os.readlink(item.path), dst_abs_path)
+
+        elif item.is_dir():
+            hardlink_directory_contents(item.path, dst_abs_path, method=method)
 
-        if item.is_dir():
-            hardlink_directory_contents(item.path, dst_abs_path)
-        else:
-            os.link(item.path, dst_abs_path, follow_symlinks=True)
+        elif not os.path.lexists(dst_abs_path):
+            cloneFile(item.path, dst_abs_path, method)
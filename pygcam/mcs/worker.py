@@ -67,6 +67,110 @@ def _readParameterInfo(context, paramPath):
     paramFile.runQueries()
     return paramFile
 
+def _fileStamp(pathname):
+    try:
+        st = os.stat(pathname)
+        return (st.st_size, st.st_mtime_ns)
+    except OSError:
+        return None
+
+class _ParameterCache(object):
+    """
+    Engine-resident cache of the parsed parameter file and the GCAM XML files it
+    modifies (with the results of the parameter queries). An engine running many
+    baseline trials of one simulation reads these once; each trial then only
+    reads and applies its row of trial data. Since the values of
+    queried elements are computed from the original values saved by
+    XMLVariable.storeFloatValue, re-applying a trial to the cached trees is
+    equivalent to applying it to freshly-read files.
+
+    The cache is discarded if the simulation, scenario group, or any of the
+    files read to build it change. It is not used if parameters use trial
+    functions or input files use write functions, since these can make
+    arbitrary changes to the XML trees.
+    """
+    key = None
+    stamps = None       # (size, mtime) of each file read, keyed by pathname
+    paramFile = None
+
+    @classmethod
+    def get(cls, key):
+        if cls.key != key:
+            return None
+
+        if any(_fileStamp(path) != stamp for path, stamp in cls.stamps.items()):
+            _logger.info("Parameter cache is stale; re-reading parameter info")
+            return None
+
+        return cls.paramFile
+
+    @classmethod
+    def save(cls, key, paramFile, filenames):
+        from pygcam.mcs.XMLParameterFile import XMLInputFile
+
+        if any(param.dataSrc.isTrialFunc() for param in XMLParameter.getInstances()) or \
+                any(xmlFile.inputFile.writeFuncs for xmlFile in XMLInputFile.getModifiedXMLFiles()):
+            _logger.debug("Not caching parameter info: trial or write functions are defined")
+            cls.clear()
+            return
+
+        cls.key = key
+        cls.stamps = {path: _fileStamp(path) for path in filenames}
+        cls.paramFile = paramFile
+
+    @classmethod
+    def clear(cls):
+        cls.key = cls.stamps = cls.paramFile = None
+
+def _loadParameterInfo(context):
+    """
+    Return the XMLParameterFile for a baseline trial, from the engine's cache
+    if it is current, otherwise by reading it.
+    """
+    from pygcam.mcs.XMLConfigFile import XMLConfigFile
+    from pygcam.mcs.XMLParameterFile import XMLInputFile, XMLDataFile
+
+    simId = context.simId
+    paramPath = os.path.abspath(getParam('MCS.ParametersFile'))  # TBD: gensim has optional override of param file. Keep it?
+    key = (context.projectName, context.groupName, simId, paramPath)
+
+    cached = _ParameterCache.get(key)
+    if cached:
+        _logger.debug("Using cached parameter info for %s", context)
+        return cached
+
+    # Forget instances from the last run
+    decache()
+    _ParameterCache.clear()
+
+    paramFile = _readParameterInfo(context, paramPath)
+
+    filenames = [paramPath, getParam('GCAM.ScenarioSetupFile')]
+    filenames += [xmlFile.getAbsPath() for xmlFile in XMLInputFile.getModifiedXMLFiles()]
+    filenames += [cfg.getFilename() for cfg in XMLConfigFile.instances.values()]
+    filenames += list(XMLDataFile.cache.keys())
+
+    _ParameterCache.save(key, paramFile, filenames)
+    return paramFile
+
+def _readTrialData(context):
+    """
+    Return a DataFrame holding the trial data for the context's trial. Only that
+    trial's row is read unless parameters use trial functions, which are passed
+    the data for all trials.
+    """
+    isTrialFunc = any(param.dataSrc.isTrialFunc() for param in XMLParameter.getInstances())
+    df = readTrialDataFile(context.simId, trialNum=None if isTrialFunc else context.trialNum)
+    columns = df.columns
+
+    # add data for linked columns if not present
+    linkPairs = XMLParameter.getParameterLinks()
+    for linkName, dataCol in linkPairs:
+        if linkName not in columns:
+            df[linkName] = df[dataCol]
+
+    return df
+
 def _applySingleTrialData(df, context, paramFile):
     simId    = context.simId
     trialNum = context.trialNum
@@ -88,32 +192,20 @@ def _runGcamTool(context, noGCAM=False, noBatchQueries=False,
     '''
     _logger.debug("_runGcamTool: %s", context)
 
-    # For running in an ipyparallel engine, forget instances from last run
-    decache()
-
     # TBD: #### set to True to help debug ipyparallel issues ####
     debuggingOnly = False
     if debuggingOnly:
         time.sleep(30)
         return RUNNER_SUCCESS
 
-    simId = context.simId
     baselineName = context.baseline
     isBaseline = not baselineName
 
     if isBaseline and not noGCAM:
-        paramPath = getParam('MCS.ParametersFile')      # TBD: gensim has optional override of param file. Keep it?
-        paramFile = _readParameterInfo(context, paramPath)
-
-        df = readTrialDataFile(simId)
-        columns = df.columns
-
-        # add data for linked columns if not present
-        linkPairs = XMLParameter.getParameterLinks()
-        for linkName, dataCol in linkPairs:
-            if linkName not in columns:
-                df[linkName] = df[dataCol]
-
+        # For running in an ipyparallel engine, instances from the last run are
+        # reused if still current, otherwise they're forgotten and re-read.
+        paramFile = _loadParameterInfo(context)
+        df = _readTrialData(context)
         _applySingleTrialData(df, context, paramFile)
 
     if noGCAM:
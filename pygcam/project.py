@@ -12,11 +12,12 @@ import glob
 import os
 import re
 import shlex
+import subprocess
 import sys
 
 from lxml import etree as ET
 
-from .config import getParam, setParam, getConfigDict, unixPath, pathjoin
+from .config import getParam, getParamAsBoolean, getParamAsFloat, setParam, getConfigDict, unixPath, pathjoin
 from .constants import LOCAL_XML_NAME, XML_SRC_NAME
 from .error import PygcamException, CommandlineError, FileFormatError
 from .log import getLogger
@@ -55,6 +56,50 @@ def dropArgs(args, shortArg, longArg, takesArgs=True):
 
     return args
 
+def availableMemoryGB():
+    """
+    Return the memory available to new processes, in GB, or None if it
+    can't be determined on this platform.
+    """
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024.0 ** 2    # value is in kB
+    except IOError:
+        pass
+
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_AVPHYS_PAGES') / 1024.0 ** 3
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def localJobLimit(jobs, count, section=None):
+    """
+    Return the number of scenarios to run concurrently on the local host, which
+    is the smallest of `jobs` (if not 0), `count`, the number of CPUs, and, if
+    config variable GCAM.RunJobMemoryGB is not 0, the number of jobs that fit
+    in the available memory. The result is at least 1.
+
+    :param jobs: (int) the number of concurrent jobs requested, or 0 for no limit
+    :param count: (int) the number of scenarios to run
+    :param section: (str) the config section to read
+    :return: (int) the number of scenarios to run concurrently
+    """
+    from multiprocessing import cpu_count
+
+    limits = [count, cpu_count()]
+    if jobs:
+        limits.append(jobs)
+
+    memPerJob = getParamAsFloat('GCAM.RunJobMemoryGB', section=section)
+    if memPerJob > 0:
+        available = availableMemoryGB()
+        if available is not None:
+            limits.append(int(available // memPerJob))
+
+    return max(1, min(limits))
+
 def decacheVariables():
     SimpleVariable.decache()
     _TmpFileBase.decache()
@@ -83,6 +128,13 @@ class _TmpFileBase(object):
     def decache(cls):
         _TmpFileBase.Instances = {}
 
+    @classmethod
+    def paths(cls):
+        """
+        Return the pathnames of the files written by :py:meth:`writeFiles`.
+        """
+        return [obj.path for obj in cls.Instances.values() if obj.path]
+
     @classmethod
     def writeFiles(cls, argDict):
         """
@@ -194,13 +246,27 @@ class Step(object):
         return "<Step name='%s' seq='%s' runFor='%s'>%s</Step>" % \
                (self.name, self.seq, self.runFor, self.command)
 
-    def run(self, project, baseline, scenario, argDict, tool, noRun=False):
+    def key(self):
+        return "%s-%d" % (self.name, self.seq)
+
+    def runsFor(self, isBaseline):
+        """
+        Return True if the step applies to baseline scenarios, if `isBaseline`
+        is True, otherwise to policy scenarios.
+        """
         runFor = self.runFor
-        isBaseline = (baseline == scenario.name)
-        isPolicy = not isBaseline
+        return runFor == 'all' or runFor == ('baseline' if isBaseline else 'policy')
 
+    def run(self, project, baseline, scenario, argDict, tool, noRun=False, fingerprints=None):
+        """
+        Run the step for the given scenario, if it applies to this scenario.
+
+        :param fingerprints: (StepFingerprints) if not None, the step is skipped if
+            its fingerprint matches the one recorded when it last ran successfully.
+            Otherwise the step is run and, on success, its fingerprint recorded.
+        """
         # See if this step should be run.
-        if runFor != 'all' and ((isBaseline and runFor != 'baseline') or (isPolicy and runFor != 'policy')):
+        if not self.runsFor(baseline == scenario.name):
             return
 
         # User can substitute an empty command to delete a default step
@@ -212,15 +278,33 @@ class Step(object):
         except KeyError as e:
             raise FileFormatError("%s -- No such variable exists in the project XML file" % e)
 
+        fingerprint = None
+        if fingerprints is not None:
+            key = self.key()
+            tmpFiles = _TmpFileBase.paths()
+            fingerprint = fingerprints.stepFingerprint(key, command, tmpFiles=tmpFiles)
+            if fingerprints.isCurrent(key, fingerprint):
+                _logger.info("[%s, %s, %s] Skipping unchanged step", scenario.name, self.seq, self.name)
+                return
+
         _logger.info("[%s, %s, %s] %s", scenario.name, self.seq, self.name, command)
 
         if not noRun:
-            if command[0] == '@':       # run internally in gt
-                argList = shlex.split(command[1:])
-                argList = flatten(map(lambda s: glob.glob(s) or [s], argList))  # expand shell wildcards
-                tool.run(argList=argList)
-            else:
-                shellCommand(command, shell=True)   # shell=True to expand shell wildcards and so on
+            before = fingerprints.snapshot(command) if fingerprint else None
+            try:
+                if command[0] == '@':       # run internally in gt
+                    argList = shlex.split(command[1:])
+                    argList = flatten(map(lambda s: glob.glob(s) or [s], argList))  # expand shell wildcards
+                    tool.run(argList=argList)
+                else:
+                    shellCommand(command, shell=True)   # shell=True to expand shell wildcards and so on
+            except:
+                if fingerprint:
+                    fingerprints.forget(key)
+                raise
+
+            if fingerprint:
+                fingerprints.record(key, command, before, tmpFiles=tmpFiles)
 
 class SimpleVariable(object):
     """
@@ -346,6 +430,9 @@ class Project(XMLFile):
         self.scenarioGroupDict = self.scenarioSetup.groupDict
         self.setGroup(groupName)    # if None, resets scenarioGroupName to default group
 
+        # Number steps from 1 each time a project is read so step keys, which are
+        # recorded in incremental runs, don't depend on what was read before.
+        Step.maxStep = 0
         dfltSteps = [Step(item) for item in defaultsNode.findall('./steps/step')] if hasDefaults else []
         projSteps = [Step(item) for item in projectNode.findall('./steps/step')]
         allSteps  = dfltSteps + projSteps
@@ -571,9 +658,22 @@ class Project(XMLFile):
         shellArgs = dropArgs(tool.shellArgs, '-S', '--scenario')
         shellArgs = dropArgs(shellArgs, '-D', '--distribute', takesArgs=False)
         shellArgs = dropArgs(shellArgs, '-a', '--allGroups', takesArgs=False)
+        shellArgs = dropArgs(shellArgs, '-j', '--jobs')
 
         baselineJobId = None
 
+        incremental = (args.incremental or getParamAsBoolean('GCAM.IncrementalRun', section=projectName)) \
+                      and not args.distribute
+        baselineFingerprints = None
+
+        if args.jobs is not None and not args.distribute:
+            # set so GCAM.BatchLogDir is relative to the sandbox being used
+            setParam('GCAM.SandboxDir', sandboxDir, section=projectName)
+            scenarios = [name for name in scenarios if self.scenarioDict[name].isActive]
+            newArgs = ['+P', projectName] + shellArgs + ['-g', scenarioGroupName]
+            self.runLocally(scenarios, newArgs, args.jobs, quitProgram=quitProgram, run=run)
+            return
+
         for scenarioName in scenarios:
             scenario = self.scenarioDict[scenarioName]
 
@@ -610,6 +710,13 @@ class Project(XMLFile):
             Variable.evaluateVars(argDict)
             _TmpFileBase.writeFiles(argDict)
 
+            fingerprints = None
+            if incremental:
+                fingerprints = self.stepFingerprints(scenario, scenarioDir, cfgDict,
+                                                     baselineFingerprints, argDict['baselineDir'])
+                if scenario.isBaseline:
+                    baselineFingerprints = fingerprints
+
             try:
                 # Loop over all steps and run those that user has requested
                 for step in self.sortedSteps:
@@ -622,13 +729,125 @@ class Project(XMLFile):
                             continue
 
                         argDict['step'] = step.name
-                        step.run(self, baseline, scenario, argDict, tool, noRun=args.noRun)
+                        step.run(self, baseline, scenario, argDict, tool, noRun=args.noRun,
+                                 fingerprints=fingerprints)
             except PygcamException as e:
                 if quitProgram:
                     raise
                 _logger.error("Error running step '%s': %s", step.name, e)
 
 
+    def runLocally(self, scenarios, shellArgs, jobs, quitProgram=True, run=True):
+        """
+        Run each scenario in a separate "gt run" process on the local host, running
+        up to `jobs` scenarios concurrently. The baseline, if in `scenarios`, is run
+        first, and the remaining scenarios are started when it completes. Each
+        process's output is written to {GCAM.BatchLogDir}/run-{scenario}.log.
+
+        :param scenarios: (list of str) names of the scenarios to run, baseline first
+        :param shellArgs: (list of str) arguments to "gt" for the run sub-command,
+            excluding the -S flag, which is added for each scenario
+        :param jobs: (int) the maximum number of scenarios to run concurrently, which
+            is further limited by :py:func:`localJobLimit`. If 0, the limit is
+            set by :py:func:`localJobLimit` alone.
+        :param quitProgram: (bool) if True, raise an error if the baseline fails,
+            rather than running the policy scenarios, or if any scenario fails.
+        :param run: (bool) if False, print the commands rather than running them
+        :return: none
+        :raises: PygcamException if a scenario fails and `quitProgram` is True
+        """
+        from multiprocessing.pool import ThreadPool
+        from .utils import mkdirs
+
+        commands = [(name, ['gt'] + shellArgs + ['-S', name]) for name in scenarios]
+
+        if not run:
+            for name, command in commands:
+                print(' '.join(command))
+            return
+
+        logDir = getParam('GCAM.BatchLogDir', section=self.projectName)
+        mkdirs(logDir)
+
+        jobs = localJobLimit(jobs, len(commands), section=self.projectName)
+        _logger.info("Running %d scenarios, %d at a time; logs are in %s", len(commands), jobs, logDir)
+
+        def runScenario(name, command):
+            logFile = pathjoin(logDir, 'run-%s.log' % name)
+            _logger.info("[%s] Started: %s", name, ' '.join(command))
+            with open(logFile, 'w') as log:
+                status = subprocess.call(command, stdout=log, stderr=subprocess.STDOUT)
+
+            if status:
+                _logger.error("[%s] Failed with exit status %d; see %s", name, status, logFile)
+            else:
+                _logger.info("[%s] Completed", name)
+
+            return status
+
+        failed = []
+        pool = ThreadPool(jobs)
+        try:
+            if commands and self.scenarioDict[commands[0][0]].isBaseline:
+                name, command = commands.pop(0)
+                if pool.apply(runScenario, (name, command)):
+                    failed.append(name)
+                    if quitProgram:
+                        raise PygcamException("Baseline '%s' failed; dependent scenarios were not run" % name)
+
+            results = [(name, pool.apply_async(runScenario, (name, command))) for name, command in commands]
+            failed += [name for name, result in results if result.get()]
+        finally:
+            pool.close()
+            pool.join()
+
+        if failed:
+            msg = "Scenarios failed: %s" % ', '.join(failed)
+            if quitProgram:
+                raise PygcamException(msg)
+            _logger.error(msg)
+
+    def stepFingerprints(self, scenario, scenarioDir, cfgDict, baselineFingerprints, baselineDir):
+        """
+        Create the StepFingerprints object used to skip unchanged steps for `scenario`
+        in an incremental run.
+
+        :param scenario: (xmlSetup.Scenario) the scenario being run
+        :param scenarioDir: (str) the scenario's sandbox directory
+        :param cfgDict: (dict) the project's config variables
+        :param baselineFingerprints: (StepFingerprints) the baseline's fingerprints,
+            if the baseline was processed in this run, else None. Policy steps
+            depend on the fingerprints and outputs of the baseline steps named in
+            ``GCAM.IncrementalBaselineSteps``, as described in
+            :py:class:`~pygcam.fingerprint.StepFingerprints`.
+        :param baselineDir: (str) the baseline's sandbox directory, used to read the
+            baseline's fingerprints if `baselineFingerprints` is None
+        :return: (StepFingerprints) the new object
+        """
+        from six import StringIO
+        from .fingerprint import StepFingerprints
+
+        fingerprints = StepFingerprints(scenarioDir)
+
+        stream = StringIO()
+        scenario.writeXML(stream)
+
+        srcGroupDir = self.scenarioGroup.srcGroupDir or (self.scenarioGroupName if self.scenarioGroup.useGroupDir else '')
+        xmlSrcDir = pathjoin(getParam('GCAM.XmlSrc', section=self.projectName), srcGroupDir,
+                             scenario.subdir or scenario.name)
+
+        if scenario.isBaseline:
+            baselineResults = None
+        else:
+            baselineFingerprints = baselineFingerprints or StepFingerprints(baselineDir)
+            stepNames = getParam('GCAM.IncrementalBaselineSteps', section=self.projectName).split()
+            baselineResults = baselineFingerprints.results(stepNames=stepNames)
+
+        stepKeys = [step.key() for step in self.sortedSteps if step.runsFor(scenario.isBaseline)]
+        fingerprints.setInputs(cfgDict, stream.getvalue(), xmlSrcDir, baselineResults=baselineResults,
+                               stepKeys=stepKeys)
+        return fingerprints
+
     def dump(self, steps, scenarios):
         print("Scenario group:", self.scenarioGroupName)
         print("Requested steps:", steps)
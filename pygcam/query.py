@@ -7,18 +7,21 @@
 import os
 import re
 import subprocess
+from multiprocessing import Pool, cpu_count
 
 from lxml import etree as ET
 from semver import VersionInfo
 
 from .Xvfb import Xvfb
-from .config import getParam, getParamAsBoolean, parse_version_info, pathjoin, unixPath
+from .config import getParam, getParamAsBoolean, getParamAsInt, parse_version_info, pathjoin, unixPath
 from .constants import NUM_AEZS
 from .error import PygcamException, ConfigFileError, FileFormatError, CommandlineError
 from .log import getLogger
 from .queryFile import QueryFile, RewriteSetParser, Query
+from .queryIndex import QueryIndex
 from .utils import (mkdirs, deleteFile, ensureExtension, ensureCSV, saveToFile, getRegionList,
-                    getExeDir, writeXmldbDriverProperties, digitColumns)
+                    getExeDir, writeXmldbDriverProperties, digitColumns, QueryResultsDir,
+                    initWorkerProcess)
 from .temp_file import TempFile, getTempFile
 
 _logger = getLogger(__name__)
@@ -38,30 +41,6 @@ def limitYears(df, years):
     df.drop(dropYears, axis=1, inplace=True)
     return df
 
-# TBD: simplify using this approach:
-
-def interp(df):
-    from numpy import nan
-
-    df = df.copy()
-    years = digitColumns(df, asInt=True)
-    all_years = range(years[0], years[-1] + 1)
-    interp_yrs = sorted(set(all_years) - set(years))
-
-    # create the annual cols and set values to NaN for interpolate()
-    for y in interp_yrs:
-        df[str(y)] = nan
-
-    df.sort_index(axis='columns', inplace=True)
-
-    year_cols = [str(col) for col in all_years]
-    interp_cols = [str(col) for col in interp_yrs]
-
-    new_df = df[year_cols].interpolate(axis=1)
-    df[interp_cols] = new_df[interp_cols]
-    return df
-
-
 def interpolateYears(df, startYear=0, inplace=False):
     """
     Interpolate linearly between each pair of years in the GCAM output. The
@@ -70,43 +49,68 @@ def interpolateYears(df, startYear=0, inplace=False):
     The years to interpolate between are read from `df`, so there's no dependency
     on any particular time-step, or even on the time-step being constant.
 
+    Annual values are computed with NumPy from the 2-D array of year columns,
+    one broadcast operation per time-step, and the result is built in a single
+    allocation.
+
     :param df: (DataFrame) Data of the format returned by batch queries
         on the GCAM XML database
-    :param startYear: (int) If non-zero, begin interpolation at this year.
+    :param startYear: (int) If non-zero, begin interpolation at this year. Values
+        for years before `startYear` are held constant at the prior time-step's value.
     :param inplace: (bool) If True, modify `df` in place; otherwise modify a copy.
     :return: if `inplace` is True, `df` is returned; otherwise a copy
       of `df` with interpolated values is returned.
     """
+    import numpy as np
+    import pandas as pd
+
     yearCols = digitColumns(df)
-    years = [int(y) for y in yearCols]
+    years = np.array([int(y) for y in yearCols])
+
+    # Work with years as rows so each year's values are contiguous in memory
+    order = np.argsort(years, kind='stable')
+    years = years[order]
+    values = np.asarray(df[yearCols].values, dtype=float).T[order]
+
+    allYears = np.arange(years[0], years[-1] + 1) if len(years) else years
+    isOrig = np.isin(allYears, years)
 
-    for i in range(0, len(years)-1):
-        start = years[i]
-        end   = years[i+1]
-        timestep = end - start
+    result = np.empty((len(allYears), values.shape[1]), dtype=float)
+    positions = years - allYears[0] if len(years) else years
+    result[positions] = values
 
-        if timestep == 1:       # don't interpolate annual results if already annual
+    # Fill each time-step's interior rows in one broadcast operation. Years
+    # before startYear keep the value of the time-step's first year.
+    for i in range(len(years) - 1):
+        first, last = positions[i], positions[i + 1]
+        if last - first < 2:
             continue
 
-        startCol = df[str(start)]
-        endCol   = df[str(end)]
+        interior = allYears[first + 1:last]
+        counted = np.maximum(interior - max(years[i] + 1, startYear) + 1, 0)
+        frozen = np.count_nonzero(counted == 0)
 
-        # compute vector of annual deltas for each row
-        delta = (endCol - startCol) / timestep
+        block = result[first + 1:last]
+        block[:frozen] = values[i]
 
-        # interpolate the whole column -- but don't interpolate before the start year
-        for j in range(1, timestep):
-            nextYear = start + j
-            df[str(nextYear)] = df[str(nextYear-1)] + (0 if nextYear < startYear else delta)
+        weight = (counted[frozen:] / (years[i + 1] - years[i]))[:, np.newaxis]
+        np.multiply(weight, values[i + 1] - values[i], out=block[frozen:])
+        block[frozen:] += values[i]
 
-    # get annualized year columns and sort as integers
-    years = digitColumns(df, asInt=True)
-    years.sort()
-    yearCols = [str(y) for y in years]       # convert back to strings, now sorted
+    result = result.T
+    interpYears = allYears[~isOrig]
 
-    nonYearCols = list(set(df.columns) - set(yearCols))
-    result = df.reindex(nonYearCols + yearCols, axis=1, copy=(not inplace))
-    return result
+    annualCols = [str(y) for y in allYears]
+    yearColSet = set(yearCols)
+    nonYearCols = [col for col in df.columns if col not in yearColSet]
+
+    if inplace:
+        newCols = [str(y) for y in interpYears]
+        df[newCols] = pd.DataFrame(result[:, ~isOrig], index=df.index, columns=newCols)
+        return df.reindex(nonYearCols + annualCols, axis=1, copy=False)
+
+    yearDF = pd.DataFrame(result, index=df.index, columns=annualCols)
+    return pd.concat([df[nonYearCols], yearDF], axis=1)
 
 def readCsv(filename, skiprows=1, years=None, interpolate=False, startYear=0, cache=False):
     """
@@ -315,24 +319,6 @@ def _addRewriteSet(rewriteSetList, rewriteParser, rewriteList, title):
 
     rewriteList.set('append-values', 'true' if appendValues else 'false')
 
-def _findQueryByName(tree, title):
-    """
-    Try the title and variations thereof to locate the query by name
-    """
-    # This Xpath supports both Main_Queries-type files and batch query files
-    xpathPattern = '/queries//queryGroup/*[@title="{title}"]|/queries/aQuery/*[@title="{title}"]'
-
-    patterns = (None, '_', '-', '[-_]')
-
-    for pattern in patterns:
-        altTitle = re.sub(pattern, ' ', title) if pattern else title
-        xpath = xpathPattern.format(title=altTitle)
-        elts = tree.xpath(xpath)  # returns empty list or list of elements found
-        if len(elts) != 0:
-            return elts
-
-    return None
-
 def _findOrCreateQueryFile(title, queryPath, regions, outputDir=None, tmpFiles=True,
                            regionMap=None, rewriteSetList=None, rewriteParser=None,
                            delete=True):
@@ -346,8 +332,6 @@ def _findOrCreateQueryFile(title, queryPath, regions, outputDir=None, tmpFiles=T
     sep = os.path.pathsep           # ';' on Windows, ':' on Unix
     items = queryPath.split(sep)
 
-    parser = ET.XMLParser(remove_blank_text=True)
-
     for item in items:
         if os.path.isdir(item):
             pathname = pathjoin(item, title + '.xml')
@@ -356,11 +340,10 @@ def _findOrCreateQueryFile(title, queryPath, regions, outputDir=None, tmpFiles=T
             else:
                 continue
 
-        # Find the query within an XML query file
-        tree = ET.parse(item, parser=parser)
-        elts = _findQueryByName(tree, title)
+        # Find the query within an XML query file, using an index of its query titles
+        queryElt = QueryIndex.get(item).find(title)
 
-        if elts is None or len(elts) == 0:
+        if queryElt is None:
             continue # to next item in QueryPath
 
         _logger.debug("Found query '{}' in {}".format(title, item))
@@ -371,7 +354,6 @@ def _findOrCreateQueryFile(title, queryPath, regions, outputDir=None, tmpFiles=T
         for region in regions:
             aQuery.append(ET.Element('region', name=region))
 
-        queryElt = elts[0]
         aQuery.append(queryElt)
 
         if regionMap or rewriteSetList:
@@ -425,7 +407,6 @@ def extractQueries(titles, xmlFiles, delete=True):
     titles = path_to_list(titles)
     xmlFiles = path_to_list(xmlFiles)
 
-    parser = ET.XMLParser(remove_blank_text=True)
     root = ET.Element("queries")
     queryXmlPath = getTempFile(suffix='.query.xml', delete=delete)
 
@@ -434,15 +415,13 @@ def extractQueries(titles, xmlFiles, delete=True):
 
         for xmlFile in xmlFiles:
             # Look for the query in the XML query file
-            tree = ET.parse(xmlFile, parser=parser)
-            elts = _findQueryByName(tree, title)
+            elt = QueryIndex.get(xmlFile).find(title)
 
-            if elts is None or len(elts) == 0:
+            if elt is None:
                 continue # to next item xml file
 
             _logger.debug(f"Found query '{title}' in {xmlFile}")
 
-            elt = elts[0]
             aQuery = elt.getparent()
             root.append(aQuery)
 
@@ -607,37 +586,16 @@ def _createBatchCommandElement(scenario, queryName, queryPath, outputDir=None, t
     return batchCommand
 
 
-def createBatchFile(scenario, queries, xmldb='', queryPath=None, outputDir=None,
-                    regions=None, regionMap=None, rewriteParser=None,
-                    batchFileIn=None, batchFileOut=None,
-                    tmpFiles=True, noDelete=False):
+def createBatchCommands(scenario, queries, xmldb='', queryPath=None, outputDir=None,
+                        regions=None, regionMap=None, rewriteParser=None,
+                        batchFileIn=None, batchFileOut=None,
+                        tmpFiles=True, noDelete=False):
     """
-    Create an optionally-temporary XML file that will run multiple queries, by extracting
-    queries into separate temp files and referencing them from the batch query file.
+    Generate the <command> elements for a batch file that will run multiple queries,
+    by extracting queries into separate temp files and referencing them from the
+    commands. Arguments are as for :py:func:`createBatchFile`.
 
-    :param scenario: (str) the name of the scenario to perform the query on
-    :param queries: (list of str query names and/or Query instances)
-    :param xmldb: (str) path to XMLDB, or '' to use in-memory DB
-    :param queryPath: (str) a list of directories or XML filenames, separated
-        by a colon (on Unix) or a semi-colon (on Windows)
-    :param outputDir: (str) the directory in which to write the .CSV
-        with query results, default is value of GCAM.OutputDir.
-    :param regions: (iterable of str) the regions you want to include in the query. If not
-        specified here, the value appearing in the <Query states="xxx"> statement is used
-        to return the indicated region names.
-    :param regionMap: (dict-like) keys are the names of regions that should be rewritten.
-        The value is the name of the aggregate region to map into.
-    :param rewriteParser: (RewriteSetParser instance) parsed representation of
-        rewriteSets.xml
-    :param batchFileIn: (str) the name of a pre-formed batch file to run
-    :param batchFileOut: (str) where to write output from batchFileIn, if given
-    :param singleCSV: (bool) if True, write a batch file that puts all results in a
-        single CSV output file.
-    :param tmpFiles: (bool) if True temporary files are used and deleted when the
-        program exits, otherwise normal files are create in outputDir.
-    :param noDelete: (bool) if True, temporary files created by this function are
-        not deleted (use for debugging)
-    :return: (str) the pathname of the temporary batch query file
+    :return: (list of str) the generated batch command strings
     """
     commands = []
 
@@ -683,6 +641,54 @@ def createBatchFile(scenario, queries, xmldb='', queryPath=None, outputDir=None,
                                              csvFile=batchFileOut, xmldb=xmldb)
         commands.append(command)
 
+    return commands
+
+
+def createBatchFile(scenario, queries, xmldb='', queryPath=None, outputDir=None,
+                    regions=None, regionMap=None, rewriteParser=None,
+                    batchFileIn=None, batchFileOut=None,
+                    tmpFiles=True, noDelete=False):
+    """
+    Create an optionally-temporary XML file that will run multiple queries, by extracting
+    queries into separate temp files and referencing them from the batch query file.
+
+    :param scenario: (str) the name of the scenario to perform the query on
+    :param queries: (list of str query names and/or Query instances)
+    :param xmldb: (str) path to XMLDB, or '' to use in-memory DB
+    :param queryPath: (str) a list of directories or XML filenames, separated
+        by a colon (on Unix) or a semi-colon (on Windows)
+    :param outputDir: (str) the directory in which to write the .CSV
+        with query results, default is value of GCAM.OutputDir.
+    :param regions: (iterable of str) the regions you want to include in the query. If not
+        specified here, the value appearing in the <Query states="xxx"> statement is used
+        to return the indicated region names.
+    :param regionMap: (dict-like) keys are the names of regions that should be rewritten.
+        The value is the name of the aggregate region to map into.
+    :param rewriteParser: (RewriteSetParser instance) parsed representation of
+        rewriteSets.xml
+    :param batchFileIn: (str) the name of a pre-formed batch file to run
+    :param batchFileOut: (str) where to write output from batchFileIn, if given
+    :param tmpFiles: (bool) if True temporary files are used and deleted when the
+        program exits, otherwise normal files are create in outputDir.
+    :param noDelete: (bool) if True, temporary files created by this function are
+        not deleted (use for debugging)
+    :return: (str) the pathname of the temporary batch query file
+    """
+    commands = createBatchCommands(scenario, queries, xmldb=xmldb, queryPath=queryPath,
+                                   outputDir=outputDir, regions=regions, regionMap=regionMap,
+                                   rewriteParser=rewriteParser, batchFileIn=batchFileIn,
+                                   batchFileOut=batchFileOut, tmpFiles=tmpFiles, noDelete=noDelete)
+
+    return _writeBatchFile(commands, outputDir=outputDir, tmpFiles=tmpFiles, noDelete=noDelete)
+
+
+def _writeBatchFile(commands, outputDir=None, tmpFiles=True, noDelete=False):
+    """
+    Write a batch query file holding the given <command> elements.
+    Arguments are as for :py:func:`createBatchFile`.
+
+    :return: (str) the pathname of the batch query file
+    """
     # Create the file batch-query.xml in the same dir as the CSV files. It can't be
     # a temp file because this step runs separately from the step running GCAM, and
     # the batch file would be either deleted prematurely or not at all.
@@ -703,7 +709,8 @@ def createBatchFile(scenario, queries, xmldb='', queryPath=None, outputDir=None,
 
 def runMultiQueryBatch(scenario, queries, xmldb='', queryPath=None, outputDir=None,
                        miLogFile=None, regions=None, regionMap=None, rewriteParser=None,
-                       batchFileIn=None, batchFileOut=None, noRun=False, noDelete=False):
+                       batchFileIn=None, batchFileOut=None, noRun=False, noDelete=False,
+                       useServer=False):
     """
     Create a single GCAM XML batch file that runs multiple queries, placing the
     each query's results in a file named of the form {queryName}-{scenario}.csv.
@@ -726,12 +733,39 @@ def runMultiQueryBatch(scenario, queries, xmldb='', queryPath=None, outputDir=No
         don't run it.
     :param noDelete: (bool) if True, temporary files created by this function are
         not deleted (use for debugging)
+    :param useServer: (bool) if True, submit the queries to the query server started
+        by "gt query --server" (see :py:mod:`pygcam.queryServer`) rather than running
+        ModelInterface in this process. If the server can't be reached, the queries
+        are run locally.
     :return: none
+    :raises: PygcamException if any query run by the query server failed
     """
-    batchFile = createBatchFile(scenario, queries, xmldb=xmldb, queryPath=queryPath,
-                                outputDir=outputDir, regions=regions, regionMap=regionMap,
-                                rewriteParser=rewriteParser, noDelete=noDelete,
-                                batchFileIn=batchFileIn, batchFileOut=batchFileOut)
+    commands = createBatchCommands(scenario, queries, xmldb=xmldb, queryPath=queryPath,
+                                   outputDir=outputDir, regions=regions, regionMap=regionMap,
+                                   rewriteParser=rewriteParser, noDelete=noDelete,
+                                   batchFileIn=batchFileIn, batchFileOut=batchFileOut)
+
+    if useServer and not noRun:
+        from .queryServer import runQueriesOnServer, serverAddress
+
+        try:
+            failed = runQueriesOnServer(scenario, xmldb, commands)
+        except (IOError, EOFError) as e:
+            host, port = serverAddress()
+            _logger.warning("Query server at %s:%d is unavailable (%s); running queries locally",
+                            host, port, e)
+        else:
+            if failed:
+                # As in runModelInterface, delete CSV files holding error messages
+                for csvPath in failed:
+                    deleteFile(csvPath)
+
+                raise PygcamException("%d queries for scenario '%s' failed: %s" %
+                                      (len(failed), scenario, ', '.join(failed)))
+            return
+
+    # The temporary query files referenced by the commands are reused if the server was unavailable
+    batchFile = _writeBatchFile(commands, outputDir=outputDir, noDelete=noDelete)
 
     runModelInterface(scenario, outputDir, xmldb=xmldb, batchFile=batchFile,
                       miLogFile=miLogFile, noDelete=noDelete, noRun=noRun)
@@ -1087,6 +1121,139 @@ def csv2xlsx(inFiles, outFile, skiprows=0, interpolate=False, years=None, startY
             worksheet.write_url(1, 0, "internal:index!A1", linkFmt, "Back to index")
 
 
+def _queryScenario(scenario, xmldb, outputDir, queries, queryPath=None, miLogFile=None,
+                   regions=None, regionMap=None, rewriteParser=None, batchFileIn=None,
+                   batchFileOut=None, batchMultiple=True, noRun=False, noDelete=False,
+                   useServer=False):
+    """
+    Run post-GCAM queries against the XML database for one scenario.
+
+    :param scenario: (str) the name of the scenario to query
+    :param xmldb: (str) the path to the scenario's XML database
+    :param outputDir: (str) the directory in which to write the CSV files
+    :param queries: (list of str query names and/or Query instances)
+    :param miLogFile: (str) the basename of the ModelInterface log file to
+        write in outputDir, or None
+    :param batchMultiple: (bool) if True, run all queries in a single batch file,
+        otherwise (deprecated) run each query separately.
+    :return: none
+
+    Other arguments are as for :py:func:`runMultiQueryBatch`.
+    """
+    mkdirs(outputDir)
+    xmldb = unixPath(xmldb, abspath=True)
+
+    if miLogFile:
+        miLogFile = pathjoin(outputDir, miLogFile, abspath=True)
+        deleteFile(miLogFile)       # remove it, if any, to start fresh
+
+    # If not a prequery step, we're running queries post-GCAM, which means a database on disk
+    # For now, we support running multiple queries in a single batch file, or the old way,
+    # running each one individually. The latter is probably not needed, except for debugging.
+    if batchMultiple:
+        runMultiQueryBatch(scenario, queries, xmldb=xmldb, queryPath=queryPath, outputDir=outputDir,
+                           miLogFile=miLogFile, regions=regions, regionMap=regionMap,
+                           batchFileIn=batchFileIn, batchFileOut=batchFileOut,
+                           rewriteParser=rewriteParser, noRun=noRun, noDelete=noDelete,
+                           useServer=useServer)
+    else:
+        # (Deprecated) Otherwise run them individually.
+        queryNames = [obj for obj in queries if not isinstance(obj, Query)]
+        queryNodes = [obj for obj in queries if isinstance(obj, Query)]
+        _runSingleQueryBatch(scenario, xmldb=xmldb, queryNames=queryNames, queryNodes=queryNodes,
+                             queryPath=queryPath, outputDir=outputDir, rewriteParser=rewriteParser,
+                             miLogFile=miLogFile, regions=regions, regionMap=regionMap,
+                             noRun=noRun, noDelete=noDelete)
+
+def _queryScenarioWorker(queryFile, rewriteSetsFile, regionFile, kwargs):
+    """
+    Process pool entry point that calls :py:func:`_queryScenario`. Only file names
+    are passed to the child process, which parses the files itself, so the arguments
+    are cheap to pickle. Temporary files created in the child are deleted here since
+    the parent process never learns of them.
+
+    :return: (str) an error message, or None on success
+    """
+    existing = set(TempFile.Instances)  # forked children inherit the parent's instances
+    try:
+        queryFileObj = QueryFile.parse(queryFile) if queryFile else None
+        kwargs['queries'] += queryFileObj.queries if queryFileObj else []
+        kwargs['rewriteParser'] = RewriteSetParser.parse(rewriteSetsFile) if rewriteSetsFile else None
+        kwargs['regionMap'] = readRegionMap(regionFile) if regionFile else None
+        _queryScenario(**kwargs)
+
+    except Exception as e:
+        return str(e) or e.__class__.__name__
+
+    finally:
+        for path in set(TempFile.Instances) - existing:
+            TempFile.remove(path, raiseError=False)
+
+    return None
+
+def _runParallelQueries(jobs, scenarioKwargs, queryFile, rewriteSetsFile, regionFile):
+    """
+    Run :py:func:`_queryScenario` for several scenarios in a pool of at most `jobs`
+    processes, each of which runs its own ModelInterface.
+
+    :param jobs: (int) the maximum number of scenarios to query concurrently
+    :param scenarioKwargs: (list of dict) keyword args to :py:func:`_queryScenario`
+        for each scenario, with 'queries' holding only query names, and without
+        'rewriteParser' or 'regionMap', which are read from the named files.
+    :return: none
+    :raises: PygcamException if queries for any scenario failed
+    """
+    from .config import getSection
+
+    section = getSection()
+    _logger.info("Querying %d scenarios using %d processes", len(scenarioKwargs), jobs)
+
+    pool = Pool(processes=jobs, initializer=initWorkerProcess, initargs=(section,))
+    try:
+        pending = [(kwargs['scenario'],
+                    pool.apply_async(_queryScenarioWorker,
+                                     (queryFile, rewriteSetsFile, regionFile, kwargs)))
+                   for kwargs in scenarioKwargs]
+        pool.close()
+
+        failed = []
+        for scenario, result in pending:
+            error = result.get()
+            if error:
+                _logger.error("Queries for scenario '%s' failed: %s", scenario, error)
+                failed.append(scenario)
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    if failed:
+        raise PygcamException("Queries failed for scenarios: %s" % ', '.join(failed))
+
+def _scenariosToQuery(args):
+    """
+    Return a list of (scenario, groupDir) tuples for the scenarios named by the
+    --scenario and --scenarioGroup arguments.
+    """
+    names = [name for name in args.scenario.split(',') if name] if args.scenario else []
+    groupName = args.scenarioGroup
+
+    if not groupName:
+        return [(name, args.groupDir) for name in names or ['Reference']]
+
+    from .project import Project
+
+    project = Project.readProjectFile(getParam('GCAM.ProjectName'))
+    group = project.setGroup(groupName)
+    groupDir = args.groupDir or (group.name if group.useGroupDir else '')
+
+    active = [name for name in project.getKnownScenarios() if project.scenarioDict[name].isActive]
+    if names:
+        project.validateProjectArgs(names, active, 'scenarios')
+
+    return [(name, groupDir) for name in (names or active)]
+
 def queryMain(args):
     # """
     # Main driver for query sub-command
@@ -1094,13 +1261,18 @@ def queryMain(args):
     # :param args:
     # :return: none
     # """
+    if args.server or args.stopServer:
+        from .queryServer import QueryServer, stopServer
+        if args.server:
+            QueryServer().serve()
+        else:
+            stopServer()
+        return
+
     v_4_2_0     = VersionInfo(4, 2, 0)
     miLogFile   = getParam('GCAM.MI.LogFile')
-    outputDir   = args.outputDir or getParam('GCAM.OutputDir')
-    groupDir    = args.groupDir
-    scenario    = args.scenario
-    sandbox     = args.workspace or pathjoin(getParam('GCAM.SandboxDir'), groupDir, scenario)
-    xmldb       = args.xmldb     or pathjoin(sandbox, 'output', getParam('GCAM.DbFile'))
+    scenarios   = _scenariosToQuery(args)
+    multiple    = len(scenarios) > 1
     queryPath   = args.queryPath or getParam('GCAM.QueryPath')
     queryFile   = args.queryXmlFile
     regionFile  = args.regionMap or getParam('GCAM.RegionMapFile')
@@ -1117,7 +1289,9 @@ def queryMain(args):
     batchMultiple   = internalQueries or getParamAsBoolean('GCAM.BatchMultipleQueries')
     rewriteSetsFile = args.rewriteSetsFile or getParam('GCAM.RewriteSetsFile')
     batchFileIn  = args.batchFile
-    batchFileOut = pathjoin(outputDir, args.batchOutput, abspath=True)
+
+    if multiple and (args.workspace or args.xmldb or batchFileIn):
+        raise CommandlineError("The -w, -d, and -b flags apply to a single scenario only")
 
     # Post-GCAM queries are not possible when using in-memory database.
     # The 'prequery' step writes the XMLDBDriver.properties file used
@@ -1134,9 +1308,6 @@ def queryMain(args):
         _logger.info('Skipping post-GCAM query step: using in-memory database')
         return
 
-    if not (xmldb or inMemory):
-        raise CommandlineError('Must specify xmldb if not using in-memory database')
-
     if queryNames:
         _logger.debug("Query names: %s", queryNames)
 
@@ -1150,42 +1321,70 @@ def queryMain(args):
     rewriteParser = RewriteSetParser.parse(rewriteSetsFile) if rewriteSetsFile else None
     regionMap = readRegionMap(regionFile) if regionFile else None
 
-    mkdirs(outputDir)
+    # Compute the sandbox, database, and output directory for each scenario. When
+    # querying several scenarios, results go to each scenario's query results dir
+    # unless an outputDir is given, which may refer to "{scenario}".
+    scenarioKwargs = []
+    for scenario, groupDir in scenarios:
+        sandbox = args.workspace or pathjoin(getParam('GCAM.SandboxDir'), groupDir, scenario)
+        xmldb   = args.xmldb or pathjoin(sandbox, 'output', getParam('GCAM.DbFile'))
+
+        if not (xmldb or inMemory):
+            raise CommandlineError('Must specify xmldb if not using in-memory database')
+
+        if args.outputDir:
+            outputDir = args.outputDir.replace('{scenario}', scenario)
+        else:
+            outputDir = pathjoin(sandbox, QueryResultsDir) if multiple else getParam('GCAM.OutputDir')
+
+        scenarioKwargs.append(dict(scenario=scenario, xmldb=xmldb, outputDir=outputDir,
+                                   sandbox=sandbox, miLogFile=miLogFile))
+
+    # Scenarios sharing an output directory each get their own ModelInterface log
+    if miLogFile and len(set(kw['outputDir'] for kw in scenarioKwargs)) < len(scenarioKwargs):
+        base, ext = os.path.splitext(miLogFile)
+        for kwargs in scenarioKwargs:
+            kwargs['miLogFile'] = '%s-%s%s' % (base, kwargs['scenario'], ext)
 
     # TBD: if setupWorkspace is performed in 'setup' step, can be removed from here
     # When writing the XMLDB to disk, we call ModelInterface separately. When
     # using an in-memory database, GCAM runs the queries for us, so here we
     # just create the XMLDBDriver.properties and batch files and return.
     if args.prequery:
-        exeDir = getExeDir(sandbox, chdir=True)
-        batchFile = createBatchFile(scenario, queries, queryPath=queryPath, outputDir=outputDir,
-                                    regions=regions, regionMap=regionMap, rewriteParser=rewriteParser,
-                                    batchFileIn=batchFileIn, batchFileOut=batchFileOut,
-                                    tmpFiles=False, noDelete=noDelete) \
-            if batchMultiple else ''
-
         filterFile = getParam('GCAM.FilterFile')
-        writeXmldbDriverProperties(inMemory=inMemory, outputDir=exeDir, filterFile=filterFile,
-                                   batchFile=batchFile, batchLog='logs/batch-query.log')
+
+        for kwargs in scenarioKwargs:
+            outputDir = kwargs['outputDir']
+            mkdirs(outputDir)
+            exeDir = getExeDir(kwargs['sandbox'], chdir=True)
+            batchFileOut = pathjoin(outputDir, args.batchOutput, abspath=True)
+            batchFile = createBatchFile(kwargs['scenario'], queries, queryPath=queryPath, outputDir=outputDir,
+                                        regions=regions, regionMap=regionMap, rewriteParser=rewriteParser,
+                                        batchFileIn=batchFileIn, batchFileOut=batchFileOut,
+                                        tmpFiles=False, noDelete=noDelete) \
+                if batchMultiple else ''
+
+            writeXmldbDriverProperties(inMemory=inMemory, outputDir=exeDir, filterFile=filterFile,
+                                       batchFile=batchFile, batchLog='logs/batch-query.log')
         return
 
-    xmldb = unixPath(xmldb, abspath=True)
+    common = dict(queryPath=queryPath, regions=regions, batchMultiple=batchMultiple,
+                  noRun=args.noRun, noDelete=noDelete,
+                  useServer=args.useServer or getParamAsBoolean('GCAM.MI.UseServer'))
 
-    if miLogFile:
-        miLogFile = pathjoin(outputDir, miLogFile, abspath=True)
-        deleteFile(miLogFile)       # remove it, if any, to start fresh
+    for kwargs in scenarioKwargs:
+        del kwargs['sandbox']
+        kwargs.update(common)
+        kwargs['batchFileIn']  = batchFileIn
+        kwargs['batchFileOut'] = pathjoin(kwargs['outputDir'], args.batchOutput, abspath=True)
 
-    # If not a prequery step, we're running queries post-GCAM, which means a database on disk
-    # For now, we support running multiple queries in a single batch file, or the old way,
-    # running each one individually. The latter is probably not needed, except for debugging.
-    if batchMultiple:
-        runMultiQueryBatch(scenario, queries, xmldb=xmldb, queryPath=queryPath, outputDir=outputDir,
-                           miLogFile=miLogFile, regions=regions, regionMap=regionMap,
-                           batchFileIn=batchFileIn, batchFileOut=batchFileOut,
-                           rewriteParser=rewriteParser, noRun=args.noRun, noDelete=noDelete)
+    jobs = min(args.jobs or getParamAsInt('GCAM.MI.QueryJobs') or cpu_count(), len(scenarioKwargs))
+
+    if jobs > 1 and not args.noRun:
+        for kwargs in scenarioKwargs:
+            kwargs['queries'] = list(queryNames)    # Query nodes are re-read in each child process
+
+        _runParallelQueries(jobs, scenarioKwargs, queryFile, rewriteSetsFile, regionFile)
     else:
-        # (Deprecated) Otherwise run them individually.
-        _runSingleQueryBatch(scenario, xmldb=xmldb, queryNames=queryNames, queryNodes=queryNodes,
-                             queryPath=queryPath, outputDir=outputDir, rewriteParser=rewriteParser,
-                             miLogFile=miLogFile, regions=regions, regionMap=regionMap,
-                             noRun=args.noRun, noDelete=args.noDelete)
+        for kwargs in scenarioKwargs:
+            _queryScenario(queries=queries, rewriteParser=rewriteParser, regionMap=regionMap, **kwargs)
@@ -0,0 +1,196 @@
+'''
+.. An index of the queries defined in GCAM query XML files (e.g., Main_Queries.xml),
+   mapping each query title to a serialized ``<aQuery>`` element holding it, so
+   queries can be extracted without re-parsing the (often multi-megabyte) file.
+
+.. Copyright (c) 2019 Richard Plevin
+   See the https://opensource.org/licenses/MIT for license details.
+'''
+import os
+import pickle
+import re
+from copy import deepcopy
+
+from lxml import etree as ET
+
+from .log import getLogger
+
+_logger = getLogger(__name__)
+
+# Identifies the file contents an index was built from
+_KEY_FORMAT = '{size}:{mtime}'
+
+# Increment if the format of the stored index changes
+_INDEX_VERSION = 1
+
+# Supports both Main_Queries-type files and batch query files
+_QUERY_XPATH = '/queries//queryGroup/*[@title]|/queries/aQuery/*[@title]'
+
+def _fileKey(filename):
+    st = os.stat(filename)
+    return _KEY_FORMAT.format(size=st.st_size, mtime=st.st_mtime_ns)
+
+def _titleVariants(title):
+    """
+    Generate the title and variations thereof, with "-" and "_" replaced by " ".
+    """
+    for pattern in (None, '_', '-', '[-_]'):
+        yield re.sub(pattern, ' ', title) if pattern else title
+
+
+class QueryIndex(object):
+    """
+    Maps the titles of the queries in one query XML file to serialized ``<aQuery>``
+    elements. Queries that appear in an ``<aQuery>`` are stored with that element;
+    queries in a ``<queryGroup>`` are stored in a new ``<aQuery>``. If a title
+    appears more than once, the first occurrence is used.
+
+    Indices are cached in memory and, if config variable ``GCAM.QueryIndexSubdir``
+    is not empty, saved in that subdirectory of the query file's directory. A
+    cached index is used as long as the query file's size and modification time
+    are unchanged.
+    """
+    instances = {}   # keyed by absolute pathname of query file
+
+    def __init__(self, filename, key, queries):
+        self.filename = filename
+        self.key = key
+        self.queries = queries   # title => serialized <aQuery> (bytes)
+
+    @classmethod
+    def get(cls, filename):
+        """
+        Return a current index for the query file `filename`, reading a saved
+        index or building a new one if needed.
+
+        :param filename: (str) the pathname of a query XML file
+        :return: (QueryIndex) the index
+        """
+        filename = os.path.abspath(filename)
+        key = _fileKey(filename)
+
+        obj = cls.instances.get(filename)
+        if obj is None or obj.key != key:
+            obj = cls._load(filename, key)
+            if obj is None:
+                obj = cls.build(filename, key)
+                obj.save()
+
+            cls.instances[filename] = obj
+
+        return obj
+
+    @classmethod
+    def build(cls, filename, key=None):
+        """
+        Parse the query file `filename` and index its queries by title.
+
+        :param filename: (str) the pathname of a query XML file
+        :param key: (str) the key identifying the file's contents; computed if not given
+        :return: (QueryIndex) the new index
+        """
+        _logger.debug("Indexing queries in %s", filename)
+        key = key or _fileKey(filename)
+
+        parser = ET.XMLParser(remove_blank_text=True)
+        tree = ET.parse(filename, parser=parser)
+
+        queries = {}
+        for elt in tree.xpath(_QUERY_XPATH):
+            title = elt.get('title')
+            if title in queries:
+                continue
+
+            parent = elt.getparent()
+            if parent.tag == 'aQuery':
+                aQuery = parent
+            else:
+                aQuery = ET.Element('aQuery')
+                aQuery.append(deepcopy(elt))
+
+            queries[title] = ET.tostring(aQuery, with_tail=False)
+
+        return cls(filename, key, queries)
+
+    @classmethod
+    def indexPath(cls, filename):
+        """
+        Return the pathname of the saved index for `filename`, or None if
+        indices are not saved.
+        """
+        from .config import getParam
+
+        subdir = getParam('GCAM.QueryIndexSubdir')
+        if not subdir:
+            return None
+
+        dirname, basename = os.path.split(filename)
+        return os.path.join(dirname, subdir, basename + '.pkl')
+
+    @classmethod
+    def _load(cls, filename, key):
+        path = cls.indexPath(filename)
+        if not (path and os.path.exists(path)):
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                version, storedKey, queries = pickle.load(f)
+
+        except Exception as e:
+            _logger.debug("Ignoring unreadable query index %s: %s", path, e)
+            return None
+
+        if version != _INDEX_VERSION or storedKey != key:
+            return None
+
+        _logger.debug("Read query index %s", path)
+        return cls(filename, key, queries)
+
+    def save(self):
+        """
+        Save the index next to the query file. The file is written to a temporary
+        name and renamed so concurrent readers never see a partial file. Failures
+        (e.g., read-only directories) are logged and otherwise ignored.
+        """
+        path = self.indexPath(self.filename)
+        if not path:
+            return
+
+        tmpPath = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmpPath, 'wb') as f:
+                pickle.dump((_INDEX_VERSION, self.key, self.queries), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            os.replace(tmpPath, path)
+            _logger.debug("Wrote query index %s", path)
+
+        except Exception as e:
+            _logger.debug("Failed to write query index for %s: %s", self.filename, e)
+            try:
+                os.remove(tmpPath)
+            except OSError:
+                pass
+
+    def titles(self):
+        return list(self.queries.keys())
+
+    def find(self, title):
+        """
+        Find the query with the given title, or with "-" and "_" in the title
+        replaced by spaces.
+
+        :param title: (str) the title of a query
+        :return: (lxml.etree.Element) a new copy of the query element, whose parent
+            is its ``<aQuery>`` element, or None if the query is not in the index.
+        """
+        for altTitle in _titleVariants(title):
+            text = self.queries.get(altTitle)
+            if text is not None:
+                aQuery = ET.fromstring(text)
+                for elt in aQuery:
+                    if elt.get('title') == altTitle:
+                        return elt
+
+        return None
@@ -0,0 +1,328 @@
+"""
+.. A local server that runs ModelInterface batch queries on behalf of other
+   processes, e.g., "gt query --useServer" invoked for many scenarios or
+   MCS trials.
+
+   ModelInterface has no resident (server) mode, so each batch still runs in
+   a JVM. The server amortizes JVM startup by combining all jobs waiting in
+   its queue into a single batch file, with commands grouped by XML database
+   so each database is queried in one contiguous run. Clients block until
+   their queries have completed and are told which result files failed.
+
+.. Copyright (c) 2019 Richard Plevin
+   See the https://opensource.org/licenses/MIT for license details.
+"""
+import os
+import re
+import threading
+from multiprocessing.connection import Listener, Client
+from six.moves.queue import Queue, Empty
+
+from .config import getParam, getParamAsInt
+from .error import PygcamException
+from .log import getLogger
+
+_logger = getLogger(__name__)
+
+OP_QUERY = 'query'
+OP_STOP  = 'stop'
+
+_outFilePattern = re.compile(r'<outFile>(.*?)</outFile>')
+_javaErrorPattern = re.compile('java.*Exception', flags=re.IGNORECASE)
+
+
+def serverAddress():
+    """
+    Return the (host, port) address of the query server, from config variables
+    ``GCAM.MI.ServerHost`` and ``GCAM.MI.ServerPort``.
+    """
+    return (getParam('GCAM.MI.ServerHost'), getParamAsInt('GCAM.MI.ServerPort'))
+
+def _keyFile():
+    return getParam('GCAM.MI.ServerKeyFile')
+
+def _saveAuthkey(key):
+    """
+    Save a server's key in the file named by ``GCAM.MI.ServerKeyFile``, readable
+    only by the current user, so that only this user's processes can connect.
+    """
+    from .utils import mkdirs
+
+    path = _keyFile()
+    mkdirs(os.path.dirname(path))
+
+    tmpPath = '%s.%d.tmp' % (path, os.getpid())
+    fd = os.open(tmpPath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+
+    os.chmod(tmpPath, 0o600)    # in case the file existed with other permissions
+    os.replace(tmpPath, path)
+
+def _readAuthkey():
+    """
+    Read the key saved by the running server.
+
+    :raises: IOError if the key file doesn't exist, i.e., no server is running
+    """
+    with open(_keyFile(), 'rb') as f:
+        return f.read()
+
+def _queryFailed(csvPath):
+    """
+    ModelInterface always exits with status 0, but when a query fails, it
+    writes an error message to the CSV file or writes nothing at all.
+    """
+    try:
+        with open(csvPath, 'r') as f:
+            line = f.readline()
+    except Exception:
+        return True
+
+    return bool(_javaErrorPattern.search(line))
+
+
+class QueryJob(object):
+    def __init__(self, scenario, xmldb, commands, conn):
+        self.scenario = scenario
+        self.xmldb = xmldb
+        self.commands = commands
+        self.conn = conn
+
+    def csvPaths(self):
+        return [path for cmd in self.commands for path in _outFilePattern.findall(cmd)]
+
+    def reply(self, response):
+        try:
+            self.conn.send(response)
+        except Exception as e:
+            _logger.warning("Failed to reply to client for scenario '%s': %s", self.scenario, e)
+        finally:
+            self.conn.close()
+
+
+class QueryServer(object):
+    """
+    Accept batch query jobs over a local socket and run them in as few
+    ModelInterface invocations as possible.
+    """
+    def __init__(self, address=None, authkey=None, maxJobs=None, miLogFile=None):
+        """
+        :param address: (tuple of (str, int)) the host and port to listen on;
+            defaults to :py:func:`serverAddress`.
+        :param authkey: (bytes) key clients must present; by default a random
+            key is generated and saved in the file ``GCAM.MI.ServerKeyFile``.
+        :param maxJobs: (int) the maximum number of jobs to combine into one
+            ModelInterface invocation; defaults to ``GCAM.MI.ServerMaxJobs``.
+        :param miLogFile: (str) file to which ModelInterface output is appended;
+            defaults to ``GCAM.MI.ServerLogFile``.
+        """
+        self.address = address or serverAddress()
+        self.authkey = authkey
+        self.maxJobs = maxJobs or getParamAsInt('GCAM.MI.ServerMaxJobs')
+        self.miLogFile = miLogFile or getParam('GCAM.MI.ServerLogFile') or None
+
+        self.queue = Queue()
+        self.listener = None
+        self.stopping = False
+
+        self.batches = 0
+        self.jobs = 0
+
+    def serve(self):
+        """
+        Run the server until a client sends a "stop" request.
+        """
+        # Connected clients can send arbitrary pickled objects to the server,
+        # so by default we use a random key, saved once the address is bound.
+        ownKey = self.authkey is None
+        if ownKey:
+            self.authkey = os.urandom(32)
+
+        self.listener = Listener(self.address, authkey=self.authkey)
+        if ownKey:
+            _saveAuthkey(self.authkey)
+
+        _logger.info("Query server listening on %s:%d", *self.address)
+
+        acceptThread = threading.Thread(target=self._acceptLoop)
+        acceptThread.daemon = True
+        acceptThread.start()
+
+        try:
+            self._runLoop()
+        finally:
+            self.listener.close()
+            if ownKey:
+                from .utils import deleteFile
+                deleteFile(_keyFile())
+            _logger.info("Query server stopped after running %d jobs in %d batches",
+                         self.jobs, self.batches)
+
+    def _acceptLoop(self):
+        while not self.stopping:
+            try:
+                conn = self.listener.accept()
+            except Exception as e:
+                if not self.stopping:
+                    _logger.error("Query server failed to accept connection: %s", e)
+                continue
+
+            thread = threading.Thread(target=self._receive, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _receive(self, conn):
+        try:
+            msg = conn.recv()
+        except Exception as e:
+            _logger.warning("Query server failed to read request: %s", e)
+            conn.close()
+            return
+
+        def replyError(error):
+            _logger.warning("Query server rejected request: %s", error)
+            try:
+                conn.send({'status': 'error', 'error': error})
+            except Exception:
+                pass
+            finally:
+                conn.close()
+
+        if not isinstance(msg, dict):
+            replyError('Request must be a dict, got %s' % type(msg).__name__)
+            return
+
+        op = msg.get('op')
+        if op == OP_STOP:
+            conn.send({'status': 'ok'})
+            conn.close()
+            self.stopping = True
+            self.queue.put(None)    # wake the run loop
+
+        elif op == OP_QUERY:
+            try:
+                job = QueryJob(msg['scenario'], msg['xmldb'], msg['commands'], conn)
+            except KeyError as e:
+                replyError('Query request is missing %s' % e)
+                return
+
+            _logger.debug("Received %d queries for scenario '%s'", len(job.commands), job.scenario)
+            self.queue.put(job)
+
+        else:
+            replyError('Unknown operation: %s' % op)
+
+    def _nextJobs(self):
+        """
+        Wait for a job, then take any others already queued, up to maxJobs.
+        """
+        job = self.queue.get()
+        jobs = [job] if job else []
+
+        while job and len(jobs) < self.maxJobs:
+            try:
+                job = self.queue.get_nowait()
+            except Empty:
+                break
+
+            if job:
+                jobs.append(job)
+
+        return jobs
+
+    def _runLoop(self):
+        # After a stop request, jobs already queued are run before exiting
+        while not (self.stopping and self.queue.empty()):
+            jobs = self._nextJobs()
+            if jobs:
+                self.runJobs(jobs)
+
+    def runJobs(self, jobs):
+        """
+        Run all commands of the given jobs in a single ModelInterface batch
+        and reply to each job's client.
+
+        :param jobs: (list of QueryJob) the jobs to run
+        :return: none
+        """
+        from .query import runModelInterface, MultiCommandTemplate
+        from .temp_file import getTempFile, TempFile
+        from .utils import saveToFile
+
+        # Group commands by database so each is queried in one contiguous run
+        jobs = sorted(jobs, key=lambda job: job.xmldb)
+        batchCommands = ''.join([cmd for job in jobs for cmd in job.commands])
+
+        batchFile = getTempFile(suffix='.batch.xml')
+        saveToFile(MultiCommandTemplate.format(batchCommands=batchCommands), filename=batchFile)
+
+        _logger.info("Running %d jobs for %d databases in one ModelInterface batch",
+                     len(jobs), len(set(job.xmldb for job in jobs)))
+        error = None
+        try:
+            runModelInterface(None, None, batchFile=batchFile, miLogFile=self.miLogFile)
+        except Exception as e:
+            error = str(e)
+            _logger.error("Query batch failed: %s", e)
+        finally:
+            TempFile.remove(batchFile, raiseError=False)
+
+        self.batches += 1
+        self.jobs += len(jobs)
+
+        for job in jobs:
+            if error:
+                job.reply({'status': 'error', 'error': error})
+                continue
+
+            failed = [path for path in job.csvPaths() if _queryFailed(path)]
+            job.reply({'status': 'failed' if failed else 'ok', 'failed': failed})
+
+
+def _connect(address=None, authkey=None):
+    address = address or serverAddress()
+    return Client(address, authkey=authkey or _readAuthkey())
+
+def runQueriesOnServer(scenario, xmldb, commands, address=None, authkey=None):
+    """
+    Submit batch query commands to a running query server and wait for them
+    to complete.
+
+    :param scenario: (str) the name of the scenario being queried
+    :param xmldb: (str) the path to the XML database being queried
+    :param commands: (list of str) batch <command> elements, as returned by
+        :py:func:`pygcam.query.createBatchCommands`
+    :param address: (tuple of (str, int)) the server address; defaults to
+        :py:func:`serverAddress`.
+    :param authkey: (bytes) the server's key; by default, read from the file
+        ``GCAM.MI.ServerKeyFile``.
+    :return: (list of str) pathnames of CSV files for queries that failed
+    :raises: IOError if the server is not running;
+        PygcamException if the server failed to run the queries.
+    """
+    conn = _connect(address, authkey)
+    try:
+        conn.send({'op': OP_QUERY, 'scenario': scenario, 'xmldb': xmldb, 'commands': commands})
+        response = conn.recv()
+    finally:
+        conn.close()
+
+    if response['status'] == 'error':
+        raise PygcamException("Query server failed to run queries for '%s': %s" % (scenario, response['error']))
+
+    for path in response['failed']:
+        _logger.error("Query for scenario '%s' failed; see '%s'", scenario, path)
+
+    return response['failed']
+
+def stopServer(address=None, authkey=None):
+    """
+    Ask a running query server to exit after finishing queued jobs.
+    """
+    conn = _connect(address, authkey)
+    try:
+        conn.send({'op': OP_STOP})
+        conn.recv()
+    finally:
+        conn.close()
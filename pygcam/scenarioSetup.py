@@ -10,7 +10,8 @@ from .config import getParam, getParamAsBoolean, pathjoin, parse_version_info
 from .constants import LOCAL_XML_NAME, DYN_XML_NAME
 from .error import SetupException
 from .log import getLogger
-from .utils import copyFileOrTree, removeFileOrTree, mkdirs, symlinkOrCopyFile, removeTreeSafely, pushd
+from .utils import (copyFileOrTree, removeFileOrTree, mkdirs, symlinkOrCopyFile, removeTreeSafely, pushd,
+                    getCopyMethod, COPY_METHOD_COPY)
 
 _logger = getLogger(__name__)
 
@@ -36,10 +37,11 @@ def _remakeSymLink(source, linkname):
     removeFileOrTree(linkname)
     symlinkOrCopyFile(source, linkname)
 
-def _workspaceLinkOrCopy(src, srcWorkspace, dstWorkspace, copyFiles=False):
+def _workspaceLinkOrCopy(src, srcWorkspace, dstWorkspace, copyFiles=False, method=COPY_METHOD_COPY):
     '''
     Create a link (or copy) in the new workspace to the
-    equivalent file in the given source workspace.
+    equivalent file in the given source workspace. Files are
+    copied using `method` (see utils.cloneFile).
     '''
     # Set automatically on Windows for users without symlink permission
     copyFiles = copyFiles or getParamAsBoolean('GCAM.CopyAllFiles')
@@ -68,11 +70,93 @@ def _workspaceLinkOrCopy(src, srcWorkspace, dstWorkspace, copyFiles=False):
     if not os.path.lexists(dstPath):
         if copyFiles:
             _logger.info('Copying %s to %s' % (srcPath, dstPath))
-            copyFileOrTree(srcPath, dstPath)
+            copyFileOrTree(srcPath, dstPath, method=method)
         else:
             symlinkOrCopyFile(srcPath, dstPath)
 
 
+def _treeStamps(srcWorkspace, filename):
+    '''
+    Return a list of [relative path, size, modification time] for `filename` in
+    `srcWorkspace` or, if it's a directory, for each file and link below it.
+    Symbolic links are not followed.
+    '''
+    path = pathjoin(srcWorkspace, filename)
+    if not os.path.isdir(path) or os.path.islink(path):
+        paths = [path]
+    else:
+        paths = []
+        for dirPath, dirNames, fileNames in os.walk(path):
+            dirNames.sort()
+            # os.walk doesn't descend into linked directories, so stamp the links
+            paths += [pathjoin(dirPath, name) for name in dirNames if os.path.islink(pathjoin(dirPath, name))]
+            paths += [pathjoin(dirPath, name) for name in sorted(fileNames)]
+
+    stamps = []
+    for path in paths:
+        relPath = os.path.relpath(path, srcWorkspace)
+        try:
+            st = os.lstat(path)
+            stamps.append([relPath, st.st_size, st.st_mtime_ns])
+        except OSError:
+            stamps.append([relPath])
+
+    return stamps
+
+def _sandboxTemplate(srcWorkspace, filesToCopy, filesToLink, method):
+    '''
+    Return the path to a template sandbox in `srcWorkspace` holding copies of
+    `filesToCopy` and links to `filesToLink`, creating it if needed. Templates are
+    named by a digest of the file lists and of the size and modification time
+    of each file to copy (or each file within a directory to copy), so a new one
+    is created when these change, replacing any older templates. A template
+    is built under a temporary name and renamed, so concurrent trials never see
+    a partial template.
+    '''
+    import hashlib
+    import json
+    import shutil
+    from glob import glob
+
+    srcWorkspace = os.path.abspath(srcWorkspace)   # links in the template must be absolute
+
+    stamps = []
+    for filename in sorted(filesToCopy):
+        stamps += _treeStamps(srcWorkspace, filename)
+
+    text = json.dumps([stamps, sorted(filesToLink)])
+    digest = hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+    prefix = pathjoin(srcWorkspace, '.sandbox-template-')
+    template = prefix + digest
+
+    if os.path.isdir(template):
+        return template
+
+    _logger.info("Creating sandbox template '%s'", template)
+    tmpDir = '%s.%d.tmp' % (template, os.getpid())
+    shutil.rmtree(tmpDir, ignore_errors=True)
+    mkdirs(tmpDir)
+
+    for filename in filesToCopy:
+        _workspaceLinkOrCopy(filename, srcWorkspace, tmpDir, copyFiles=True, method=method)
+
+    for filename in filesToLink:
+        _workspaceLinkOrCopy(filename, srcWorkspace, tmpDir, copyFiles=False)
+
+    try:
+        os.rename(tmpDir, template)
+    except OSError:
+        # Another process created the template first
+        shutil.rmtree(tmpDir, ignore_errors=True)
+
+    # Remove templates superseded by this one, but not others' temporary dirs
+    for oldTemplate in glob(prefix + '?' * len(digest)):
+        if oldTemplate != template:
+            _logger.info("Removing old sandbox template '%s'", oldTemplate)
+            shutil.rmtree(oldTemplate, ignore_errors=True)
+
+    return template
+
 def createSandbox(sandbox, srcWorkspace=None, forceCreate=False, mcsMode=None):
     '''
     Set up a run-time sandbox in which to run GCAM. This involves copying
@@ -122,12 +206,19 @@ def createSandbox(sandbox, srcWorkspace=None, forceCreate=False, mcsMode=None):
         mkdirs(restartDir)
 
     filesToCopy, filesToLink = _getFilesToCopyAndLink('GCAM.SandboxFilesToLink')
+    method = getCopyMethod()
 
-    for filename in filesToCopy:
-        _workspaceLinkOrCopy(filename, srcWorkspace, sandbox, copyFiles=True)
+    if mcsMode == 'trial' and getParamAsBoolean('MCS.SandboxTemplate'):
+        from .mcs.util import hardlink_directory_contents
 
-    for filename in filesToLink:
-        _workspaceLinkOrCopy(filename, srcWorkspace, sandbox, copyFiles=False)
+        template = _sandboxTemplate(srcWorkspace, filesToCopy, filesToLink, method)
+        hardlink_directory_contents(template, sandbox, method=method)
+    else:
+        for filename in filesToCopy:
+            _workspaceLinkOrCopy(filename, srcWorkspace, sandbox, copyFiles=True, method=method)
+
+        for filename in filesToLink:
+            _workspaceLinkOrCopy(filename, srcWorkspace, sandbox, copyFiles=False)
 
     outputDir = pathjoin(sandbox, 'output')
 
@@ -450,13 +450,86 @@ def symlinkOrCopyFile(src, dst):
     else:
         os.symlink(src, dst)
 
-def copyFileOrTree(src, dst):
+# Values for GCAM.SandboxCopyMethod
+COPY_METHOD_COPY     = 'copy'
+COPY_METHOD_REFLINK  = 'reflink'
+COPY_METHOD_HARDLINK = 'hardlink'
+COPY_METHODS = (COPY_METHOD_COPY, COPY_METHOD_REFLINK, COPY_METHOD_HARDLINK)
+
+# ioctl request code for FICLONE (from linux/fs.h)
+_FICLONE = 0x40049409
+
+def getCopyMethod():
+    """
+    Return the value of config variable GCAM.SandboxCopyMethod, in lowercase.
+
+    :raises: PygcamException if the value isn't one of COPY_METHODS
+    """
+    method = getParam('GCAM.SandboxCopyMethod').lower()
+    if method not in COPY_METHODS:
+        raise PygcamException("GCAM.SandboxCopyMethod must be one of %s; got '%s'" % (COPY_METHODS, method))
+
+    return method
+
+def _reflinkFile(src, dst):
+    """
+    Try to create `dst` as a copy-on-write clone of `src`, which shares the
+    data blocks of `src` until either file is modified. This is supported on
+    Linux by file systems such as btrfs and XFS.
+
+    :return: (bool) True if the clone was created
+    """
+    try:
+        import fcntl
+    except ImportError:     # not available on Windows
+        return False
+
+    try:
+        with open(src, 'rb') as srcFile, open(dst, 'wb') as dstFile:
+            fcntl.ioctl(dstFile.fileno(), _FICLONE, srcFile.fileno())
+
+    except (IOError, OSError):
+        deleteFile(dst)
+        return False
+
+    shutil.copystat(src, dst)
+    return True
+
+def cloneFile(src, dst, method=COPY_METHOD_COPY):
+    """
+    Create `dst` with the contents of the file `src`, as cheaply as `method`
+    allows. With "reflink", a copy-on-write clone is tried before copying. With
+    "hardlink", a clone and then a hard link are tried before copying. Note that
+    a hard link shares the file itself, so files linked this way must be replaced
+    rather than modified in place.
+
+    :param src: (str) path to a source file
+    :param dst: (str) path to the file to create, which must not exist
+    :param method: (str) one of COPY_METHODS
+    :return: (str) the method used: "reflink", "hardlink", or "copy"
+    """
+    if method != COPY_METHOD_COPY:
+        if _reflinkFile(src, dst):
+            return COPY_METHOD_REFLINK
+
+        if method == COPY_METHOD_HARDLINK:
+            try:
+                os.link(src, dst)
+                return COPY_METHOD_HARDLINK
+            except OSError:
+                pass
+
+    shutil.copy2(src, dst)
+    return COPY_METHOD_COPY
+
+def copyFileOrTree(src, dst, method=COPY_METHOD_COPY):
     """
     Copy src to dst, where the two can both be files or directories.
     If `src` and `dst` are directories, `dst` must not exist yet.
 
     :param src: (str) path to a source file or directory
     :param dst: (str) path to a destination file or directory.
+    :param method: (str) how to copy each file; see :py:func:`cloneFile`
     :return: none
     """
     if getParamAsBoolean('GCAM.CopyAllFiles') and src[0] == '.':   # convert relative paths
@@ -467,9 +540,9 @@ def copyFileOrTree(src, dst):
 
     if os.path.isdir(src):
         removeTreeSafely(dst)
-        shutil.copytree(src, dst)
+        shutil.copytree(src, dst, copy_function=lambda s, d: cloneFile(s, d, method))
     else:
-        shutil.copy2(src, dst)
+        cloneFile(src, dst, method)
 
 # used only in gcamtool modules
 # TBD: rename to removeTree
@@ -571,6 +644,22 @@ def shellCommand(command, shell=True, raiseError=True):
 
     return exitStatus
 
+def initWorkerProcess(section):
+    """
+    Initializer for processes in a ``multiprocessing.Pool``. The config section
+    must be set if child processes are spawned rather than forked, and the default
+    SIGTERM handling is restored (replacing the handler set by ``catchSignals``)
+    so the pool can terminate its processes.
+
+    :param section: (str) the name of the config file section to use
+    :return: none
+    """
+    import signal
+    from .config import setSection
+
+    setSection(section)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
 def flatten(listOfLists):
     """
     Flatten one level of nesting given a list of lists. That is, convert
@@ -24,6 +24,7 @@ import os
 import re
 import shutil
 import six
+import weakref
 from lxml import etree as ET
 from semver import VersionInfo
 
@@ -31,6 +32,7 @@ from .config import getParam, getParamAsBoolean, parse_version_info, unixPath, p
 from .constants import LOCAL_XML_NAME, DYN_XML_NAME
 from .error import SetupException, PygcamException
 from .log import getLogger
+from .lruCache import LRUCache, sizeofXmlFile
 from .policy import (policyMarketXml, policyConstraintsXml, DEFAULT_MARKET_TYPE,
                      DEFAULT_POLICY_ELT, DEFAULT_POLICY_TYPE)
 from .utils import (coercible, mkdirs, printSeries, symlinkOrCopyFile, removeTreeSafely,
@@ -102,11 +104,20 @@ def copyIfMissing(src, dst, makedirs=False):
         shutil.copy(src, dst)
         os.chmod(dst, 0o644)
 
+def _writeEvictedFile(filename, item):
+    item.decache()
+
 class CachedFile(object):
     parser = ET.XMLParser(remove_blank_text=True)
 
-    # Store parsed XML trees here and use with xmlSel/xmlEdit if useCache is True
-    cache = {}
+    # Store parsed XML trees here and use with xmlSel/xmlEdit if useCache is True.
+    # Edited trees are written back to disk if evicted to stay within GCAM.CacheMaxMB.
+    cache = LRUCache('XML', sizeof=lambda item: sizeofXmlFile(item.filename),
+                     onEvict=_writeEvictedFile)
+
+    # All instances still referenced by a caller, including those evicted from
+    # the cache, so a file is never represented by two trees at once.
+    live = weakref.WeakValueDictionary()
 
     def __init__(self, filename):
         self.filename = filename = os.path.realpath(filename)
@@ -114,23 +125,30 @@ class CachedFile(object):
 
         _logger.debug("Reading '%s'", filename)
         self.tree = ET.parse(filename, self.parser)
+        self.live[filename] = self
         self.cache[filename] = self
 
     @classmethod
     def getFile(cls, filename):
         filename = os.path.realpath(filename)  # operate on canonical pathnames
 
-        if filename in cls.cache:
-            #_logger.debug("Found '%s' in cache", filename)
-            item = cls.cache[filename]
-        else:
-            item = CachedFile(filename)
+        item = cls.cache.get(filename)
+        if item is None:
+            item = cls.live.get(filename)
+            if item is None:
+                item = CachedFile(filename)
+            else:
+                cls.cache[filename] = item     # evicted, but still in use
 
         return item
 
     def setEdited(self):
         self.edited = True
 
+        # If evicted while still in use, re-register so the edits are written
+        if self.filename not in self.cache:
+            self.cache[self.filename] = self
+
     def write(self):
         _logger.info("Writing '%s'", self.filename)
         self.tree.write(self.filename, xml_declaration=True, encoding='utf-8', pretty_print=True)
@@ -0,0 +1,72 @@
+import argparse
+import os
+import shutil
+from unittest import TestCase
+
+from pygcam.mcs import util
+from pygcam.mcs.built_ins import gensim_plugin
+from pygcam.mcs.error import PygcamMcsUserError
+from pygcam.utils import mkdirs
+
+SimId = 1
+
+class TestAddTrials(TestCase):
+    def setUp(self):
+        self.simDir = '/tmp/testAddTrials'
+        shutil.rmtree(self.simDir, ignore_errors=True)
+        mkdirs(self.simDir)
+
+        self.savedGetSimDir = (util.getSimDir, gensim_plugin.getSimDir)
+        util.getSimDir = gensim_plugin.getSimDir = lambda simId, create=False: self.simDir
+
+        self.paramFile = os.path.join(self.simDir, 'user-parameters.xml')
+        self.write(self.paramFile, '<ParameterList/>')
+
+        simParamFile = util.getSimParameterFile(SimId)
+        mkdirs(os.path.dirname(simParamFile))
+        shutil.copy(self.paramFile, simParamFile)
+
+        self.args = argparse.Namespace(method='montecarlo', seed=None)
+
+    def tearDown(self):
+        util.getSimDir, gensim_plugin.getSimDir = self.savedGetSimDir
+        shutil.rmtree(self.simDir, ignore_errors=True)
+
+    def write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def saveArgs(self, **kwargs):
+        args = dict(method='montecarlo', dataFile=None, trials=10)
+        args.update(kwargs)
+        util.saveDict(args, gensim_plugin._argSaveFile(SimId))
+
+    def assertRefused(self, message):
+        with self.assertRaises(PygcamMcsUserError) as cm:
+            gensim_plugin.addTrials(SimId, 5, self.paramFile, self.args)
+
+        self.assertIn(message, str(cm.exception))
+
+    def test_method(self):
+        self.assertRefused('gcamGenSimArgs.txt')
+
+        # The generation method is read from the arguments saved by gensim
+        for method in ('sobol', 'fast', 'morris', 'full-factorial'):
+            self.saveArgs(method=method)
+            self.assertRefused("generated by the '%s' method" % method)
+
+        self.saveArgs(dataFile='/tmp/trialData.csv')
+        self.assertRefused('loaded from a file')
+
+        self.args.method = 'sobol'
+        self.assertRefused("only for the 'montecarlo' method")
+
+    def test_parameterFile(self):
+        self.saveArgs()
+
+        # The parameter file was changed after the simulation was generated
+        self.write(self.paramFile, '<ParameterList><!-- changed --></ParameterList>')
+        self.assertRefused('differs from the parameter file')
+
+        os.remove(util.getSimParameterFile(SimId))
+        self.assertRefused('was not found')
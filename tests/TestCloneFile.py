@@ -0,0 +1,45 @@
+import os
+import shutil
+from unittest import TestCase
+
+from pygcam.utils import mkdirs, cloneFile, COPY_METHOD_COPY, COPY_METHOD_REFLINK, COPY_METHOD_HARDLINK
+
+class TestCloneFile(TestCase):
+    def setUp(self):
+        self.tmpDir = '/tmp/testCloneFile'
+        self.removeTmpDir()
+        mkdirs(self.tmpDir)
+
+        self.src = os.path.join(self.tmpDir, 'src.xml')
+        with open(self.src, 'w') as f:
+            f.write('<config/>\n')
+
+    def tearDown(self):
+        self.removeTmpDir()
+
+    def removeTmpDir(self):
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def clone(self, method):
+        dst = os.path.join(self.tmpDir, method + '.xml')
+        used = cloneFile(self.src, dst, method)
+
+        with open(dst) as f:
+            self.assertEqual(f.read(), '<config/>\n')
+
+        return dst, used
+
+    def test_copy(self):
+        dst, used = self.clone(COPY_METHOD_COPY)
+        self.assertEqual(used, COPY_METHOD_COPY)
+        self.assertFalse(os.path.samefile(self.src, dst))
+
+    def test_reflink(self):
+        dst, used = self.clone(COPY_METHOD_REFLINK)
+        self.assertIn(used, (COPY_METHOD_REFLINK, COPY_METHOD_COPY))
+        self.assertFalse(os.path.samefile(self.src, dst))
+
+    def test_hardlink(self):
+        dst, used = self.clone(COPY_METHOD_HARDLINK)
+        self.assertIn(used, (COPY_METHOD_REFLINK, COPY_METHOD_HARDLINK))
+        self.assertEqual(os.path.samefile(self.src, dst), used == COPY_METHOD_HARDLINK)
@@ -0,0 +1,45 @@
+import os
+import shutil
+import time
+from unittest import TestCase
+
+from pygcam.csvCache import readCachedCsv, binaryCachePath
+from pygcam.utils import mkdirs
+
+class TestCsvCache(TestCase):
+    def setUp(self):
+        self.tmpDir = '/tmp/testCsvCache'
+        self.removeTmpDir()
+        mkdirs(self.tmpDir)
+
+        src = './data/ws/base-0/queryResults/Purpose-grown_biomass_production-base-0.csv'
+        self.csvFile = os.path.join(self.tmpDir, 'result.csv')
+        shutil.copy(src, self.csvFile)
+
+    def tearDown(self):
+        self.removeTmpDir()
+
+    def removeTmpDir(self):
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def test_binaryCache(self):
+        df1 = readCachedCsv(self.csvFile)
+        binPath = binaryCachePath(self.csvFile)
+        self.assertTrue(os.path.exists(binPath), 'Binary cache file was not created')
+
+        df2 = readCachedCsv(self.csvFile)
+        self.assertTrue(df1.equals(df2), 'Data read from binary cache differs from CSV data')
+
+    def test_staleCache(self):
+        df1 = readCachedCsv(self.csvFile)
+
+        # Rewrite the CSV with one fewer row; the binary copy must be ignored
+        with open(self.csvFile) as f:
+            lines = f.readlines()
+
+        time.sleep(0.01)
+        with open(self.csvFile, 'w') as f:
+            f.writelines(lines[:-1])
+
+        df2 = readCachedCsv(self.csvFile)
+        self.assertEqual(len(df2), len(df1) - 1, 'Stale binary cache was used')
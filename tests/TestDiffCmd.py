@@ -3,7 +3,10 @@ import shutil
 from unittest import TestCase
 
 from pygcam.query import readCsv, readQueryResult
-from pygcam.diff import computeDifference
+from pygcam.config import setParam
+from pygcam.diff import (computeDifference, writeDiffsToCSV, writeStreamingDiffsToCSV,
+                         writeGroupDiffs, diffCsvPathname, queryCsvPathname)
+import pygcam.diff
 from pygcam.utils import QueryResultsDir, mkdirs
 
 class TestDiffCmd(TestCase):
@@ -51,5 +54,83 @@ class TestDiffCmd(TestCase):
         bools = abs(testDiff[yearCols]) > 1e-8
         self.assertFalse(bools.all().all())
 
+    def test_streamingDiff(self):
+        files = [os.path.join(self.getFilename(scenario), 'Purpose-grown_biomass_production-%s.csv' % scenario)
+                 for scenario in (self.baseline, self.policy)]
 
+        expectedFile = os.path.join(self.tmpDir, 'expected.csv')
+        writeDiffsToCSV(expectedFile, files[0], files[1:], years=self.years)
 
+        # Force several chunks and partitions for these small files
+        chunkRows = pygcam.diff.STREAM_CHUNK_ROWS
+        pygcam.diff.STREAM_CHUNK_ROWS = 10
+        setParam('GCAM.DiffStreamMB', '0.002')
+        try:
+            streamFile = os.path.join(self.tmpDir, 'streamed.csv')
+            writeStreamingDiffsToCSV(streamFile, files[0], files[1:], years=self.years)
+        finally:
+            pygcam.diff.STREAM_CHUNK_ROWS = chunkRows
+            setParam('GCAM.DiffStreamMB', '64')
+
+        expected = readCsv(expectedFile)
+        streamed = readCsv(streamFile)
+        self.assertEqual(list(streamed.columns), list(expected.columns))
+
+        keyCols = [col for col in expected.columns if not col.isdigit()]
+        expected = expected.sort_values(keyCols).reset_index(drop=True)
+        streamed = streamed.sort_values(keyCols).reset_index(drop=True)
+        self.assertTrue(streamed.equals(expected), 'Streamed diffs differ from in-memory diffs')
+
+    def test_streamingDiffKeyDtypes(self):
+        # The "tech" key column is parsed as int in the reference file and as
+        # object in the other, and "vintage" is all-NaN in the first chunk
+        refFile = os.path.join(self.tmpDir, 'ref.csv')
+        with open(refFile, 'w') as f:
+            f.write('title\nregion,tech,vintage,2015,2050,Units\n')
+            f.write(''.join(['USA,%d,,1,2,EJ\n' % i for i in range(20)]))
+            f.write('USA,99,old,1,2,EJ\n')
+
+        otherFile = os.path.join(self.tmpDir, 'other.csv')
+        with open(otherFile, 'w') as f:
+            f.write('title\nregion,tech,vintage,2015,2050,Units\n')
+            f.write('USA,99,old,2,4,EJ\n')
+            f.write(''.join(['USA,%d,,2,4,EJ\n' % i for i in range(20)]))
+            f.write('USA,b,new,2,4,EJ\n')
+
+        chunkRows = pygcam.diff.STREAM_CHUNK_ROWS
+        pygcam.diff.STREAM_CHUNK_ROWS = 5
+        setParam('GCAM.DiffStreamMB', '0.0001')
+        try:
+            streamFile = os.path.join(self.tmpDir, 'streamed.csv')
+            writeStreamingDiffsToCSV(streamFile, refFile, [otherFile])
+        finally:
+            pygcam.diff.STREAM_CHUNK_ROWS = chunkRows
+            setParam('GCAM.DiffStreamMB', '64')
+
+        streamed = readCsv(streamFile)
+        self.assertEqual(len(streamed), 21, 'Rows with matching keys were dropped')
+        self.assertEqual(sorted(streamed['2050'].unique()), [2])
+
+    def test_groupDiffs(self):
+        query = 'Purpose-grown_biomass_production'
+        workingDir = os.path.join(self.tmpDir, 'ws')
+        shutil.copytree(self.ws, workingDir)
+
+        longFile = os.path.join(self.tmpDir, 'long.csv')
+        writeGroupDiffs([query], self.baseline, [self.policy], workingDir=workingDir, jobs=2,
+                        longFile=longFile, years=self.years)
+
+        expectedFile = os.path.join(self.tmpDir, 'expected.csv')
+        writeDiffsToCSV(expectedFile, queryCsvPathname(query, self.baseline, workingDir=workingDir),
+                        [queryCsvPathname(query, self.policy, workingDir=workingDir)], years=self.years)
+
+        diffFile = diffCsvPathname(query, self.baseline, self.policy, workingDir=workingDir)
+        with open(diffFile) as f1, open(expectedFile) as f2:
+            self.assertEqual(f1.read(), f2.read())
+
+        expected = readCsv(expectedFile)
+        longDF = readCsv(longFile, skiprows=0)
+        yearCols = [col for col in expected.columns if col.isdigit()]
+        self.assertEqual(len(longDF), len(expected) * len(yearCols))
+        self.assertEqual(set(longDF.scenario), {self.policy})
+        self.assertAlmostEqual(longDF.value.sum(), expected[yearCols].values.sum())
@@ -0,0 +1,42 @@
+from io import BytesIO
+from unittest import TestCase
+
+from pygcam.error import GcamError, GcamSolverError
+from pygcam.gcam import _OutputScanner, WRAPPER_OUTPUT_SAMPLE
+
+class TestOutputScanner(TestCase):
+    def feedAll(self, scanner, chunks):
+        for chunk in chunks + [b'']:
+            error = scanner.feed(chunk)
+            if error:
+                return error
+        return None
+
+    def test_copyOutput(self):
+        out = BytesIO()
+        scanner = _OutputScanner(out)
+        error = self.feedAll(scanner, [b'line 1\nline', b' 2\nline 3'])
+
+        self.assertIsNone(error)
+        self.assertEqual(out.getvalue(), b'line 1\nline 2\nline 3')
+        self.assertEqual(scanner.bytes, 20)
+        self.assertEqual(scanner.lines, 2)
+
+    def test_errors(self):
+        out = BytesIO()
+        scanner = _OutputScanner(out)
+        error = self.feedAll(scanner, [b'ok\nperiod 5: Model did', b' not solve\nnot written\n'])
+
+        self.assertIsInstance(error, GcamSolverError)
+        self.assertEqual(out.getvalue(), b'ok\nperiod 5: Model did not solve\n')
+
+        error = self.feedAll(_OutputScanner(BytesIO()), [b'org.basex.core.BaseXException: oops\n'])
+        self.assertEqual(type(error), GcamError)
+
+    def test_sample(self):
+        out = BytesIO()
+        scanner = _OutputScanner(out, verbosity=WRAPPER_OUTPUT_SAMPLE, sampleLines=3)
+        text = b''.join(b'%d\n' % i for i in range(10))
+        self.feedAll(scanner, [text[:7], text[7:]])
+
+        self.assertEqual(out.getvalue(), b'0\n3\n6\n9\n')
@@ -0,0 +1,161 @@
+import argparse
+import os
+import shutil
+from unittest import TestCase
+
+from pygcam.built_ins.run_plugin import RunCommand
+from pygcam.config import getConfig, getParam, setParam, getSection, setSection
+from pygcam.project import projectMain, decacheVariables
+from pygcam.utils import mkdirs
+
+ProjectName = 'incrTest'
+
+ProjectText = '''<?xml version="1.0" encoding="UTF-8"?>
+<projects>
+  <project name="{project}">
+    <scenariosFile name="scenarios.xml"/>
+    <steps>
+      <step name="setup"    runFor="all">echo setup-{{scenario}} >> {log}</step>
+      <step name="prequery" runFor="all">cat "{{queryXmlFile}}" > /dev/null; echo prequery-{{scenario}} >> {log}</step>
+      <step name="gcam"     runFor="all">echo gcam-{{scenario}} >> {log}</step>
+      <step name="query"    runFor="all">mkdir -p "{{batchDir}}"; cat "{{queryXmlFile}}" "{dir}/queries.xml" > "{{batchDir}}/result.csv"; echo query-{{scenario}} >> {log}</step>
+      <step name="diff"     runFor="policy">cat "{{diffPlots}}" > /dev/null; echo diff-{{scenario}} >> {log}</step>
+    </steps>
+    <queries varName="queryXmlFile">
+      <query name="total_climate_forcing"/>
+    </queries>
+    <tmpFile varName="diffPlots">
+      <text>total_climate_forcing-{{scenario}}-{{reference}}.csv</text>
+    </tmpFile>
+  </project>
+</projects>
+'''
+
+ScenariosText = '''<?xml version="1.0" encoding="UTF-8"?>
+<scenarios name="incrTest" defaultGroup="group">
+  <scenarioGroup name="group" useGroupDir="0">
+    <scenario name="base" baseline="1"/>
+    <scenario name="policy"/>
+  </scenarioGroup>
+</scenarios>
+'''
+
+class Tool(object):
+    shellArgs = []
+
+class TestIncrementalRun(TestCase):
+    def setUp(self):
+        self.tmpDir = '/tmp/testIncrementalRun'
+        self.removeTmpDir()
+        mkdirs(self.tmpDir)
+
+        self.log = os.path.join(self.tmpDir, 'steps.log')
+        self.projectFile = os.path.join(self.tmpDir, 'project.xml')
+        with open(self.projectFile, 'w') as f:
+            f.write(ProjectText.format(project=ProjectName, log=self.log, dir=self.tmpDir))
+
+        self.queriesFile = os.path.join(self.tmpDir, 'queries.xml')
+        with open(self.queriesFile, 'w') as f:
+            f.write('<queries/>')
+
+        with open(os.path.join(self.tmpDir, 'scenarios.xml'), 'w') as f:
+            f.write(ScenariosText)
+
+        config = getConfig()
+        if not config.has_section(ProjectName):
+            config.add_section(ProjectName)
+
+        self.savedSection = getSection()
+        self.savedDefaultProject = getParam('GCAM.DefaultProject', section='DEFAULT')
+        setParam('GCAM.DefaultProject', ProjectName, section='DEFAULT')
+        setSection(ProjectName)
+
+        setParam('GCAM.SandboxDir', os.path.join(self.tmpDir, 'sandboxes'), section=ProjectName)
+        setParam('GCAM.XmlSrc', os.path.join(self.tmpDir, 'xmlsrc'), section=ProjectName)
+        setParam('GCAM.ScenarioSetupOutputFile', '', section=ProjectName)
+
+        self.parser = argparse.ArgumentParser()
+        RunCommand(self.parser.add_subparsers())
+
+    def tearDown(self):
+        setParam('GCAM.DefaultProject', self.savedDefaultProject, section='DEFAULT')
+        setSection(self.savedSection)
+        self.removeTmpDir()
+
+    def removeTmpDir(self):
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def runProject(self, *flags):
+        decacheVariables()
+        if os.path.exists(self.log):
+            os.remove(self.log)
+
+        args = self.parser.parse_args(['run', '-I', '-f', self.projectFile] + list(flags))
+        args.projectName = ProjectName
+        projectMain(args, Tool())
+
+        if not os.path.exists(self.log):
+            return []
+
+        with open(self.log) as f:
+            return f.read().split()
+
+    def test_secondRunSkipsSteps(self):
+        steps = self.runProject()
+        self.assertEqual(len(steps), 9)
+
+        steps = self.runProject()
+        self.assertEqual(steps, [], 'Unchanged steps were re-run')
+
+    def editProject(self, old, new):
+        with open(self.projectFile) as f:
+            text = f.read()
+
+        with open(self.projectFile, 'w') as f:
+            f.write(text.replace(old, new))
+
+    def test_changedBaseline(self):
+        self.runProject()
+
+        # Re-running the baseline's gcam step re-runs the later baseline steps and
+        # the policy steps from gcam on, but not the earlier steps.
+        self.editProject('echo gcam-', 'true; echo gcam-')
+
+        steps = self.runProject()
+        self.assertEqual(steps, ['gcam-base', 'query-base', 'gcam-policy', 'query-policy', 'diff-policy'])
+
+    def test_changedInputFile(self):
+        self.runProject()
+
+        # Steps reading a file named in their command are re-run when it changes,
+        # as are policy steps following the baseline's query step.
+        with open(self.queriesFile, 'w') as f:
+            f.write('<queries><query name="x"/></queries>')
+
+        steps = self.runProject()
+        self.assertEqual(steps, ['query-base', 'query-policy', 'diff-policy'])
+
+    def test_changedOutput(self):
+        self.runProject()
+
+        # A step whose output was removed is re-run. Since it produces the same
+        # output, later steps are not.
+        os.remove(os.path.join(self.tmpDir, 'sandboxes', 'base', 'queryResults', 'result.csv'))
+
+        steps = self.runProject()
+        self.assertEqual(steps, ['query-base'])
+
+    def test_selectedSteps(self):
+        self.runProject()
+
+        # Fingerprints don't depend on which steps are selected
+        self.assertEqual(self.runProject('-s', 'query'), [])
+        self.assertEqual(self.runProject('-k', 'gcam'), [])
+
+        # Steps following a re-run step are re-run when next selected
+        self.editProject('echo gcam-', 'true; echo gcam-')
+        self.assertEqual(self.runProject('-s', 'gcam'), ['gcam-base', 'gcam-policy'])
+
+        steps = self.runProject()
+        self.assertEqual(sorted(steps), ['diff-policy', 'query-base', 'query-policy'])
+        self.assertEqual(self.runProject(), [])
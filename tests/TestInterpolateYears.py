@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+from unittest import TestCase
+
+from pygcam.query import interpolateYears
+from pygcam.utils import digitColumns
+
+def loopInterpolateYears(df, startYear=0):
+    """
+    The original column-by-column implementation of interpolateYears, used
+    as a reference for correctness and as a benchmark baseline.
+    """
+    df = df.copy()
+    years = digitColumns(df, asInt=True)
+
+    for i in range(0, len(years)-1):
+        start = years[i]
+        end   = years[i+1]
+        timestep = end - start
+
+        if timestep == 1:
+            continue
+
+        delta = (df[str(end)] - df[str(start)]) / timestep
+
+        for j in range(1, timestep):
+            nextYear = start + j
+            df[str(nextYear)] = df[str(nextYear-1)] + (0 if nextYear < startYear else delta)
+
+    years = sorted(digitColumns(df, asInt=True))
+    yearCols = [str(y) for y in years]
+    nonYearCols = [col for col in df.columns if col not in yearCols]
+    return df[nonYearCols + yearCols]
+
+def makeData(rows, years=(1990, 2005, 2010, 2015, 2020, 2025, 2030, 2035, 2040, 2045, 2050, 2060, 2080, 2100)):
+    rng = np.random.RandomState(0)
+    df = pd.DataFrame({'region': ['r%d' % (i % 32) for i in range(rows)],
+                       'LandLeaf': ['leaf%d' % i for i in range(rows)]})
+    for year in years:
+        df[str(year)] = rng.uniform(0, 100, rows)
+    df['Units'] = 'thous km2'
+    return df
+
+class TestInterpolateYears(TestCase):
+    def assertSameResult(self, df, startYear=0):
+        expected = loopInterpolateYears(df, startYear=startYear)
+        result = interpolateYears(df, startYear=startYear)
+
+        self.assertEqual(list(result.columns), list(expected.columns))
+        yearCols = digitColumns(expected)
+        np.testing.assert_allclose(result[yearCols].values, expected[yearCols].values, rtol=1e-12)
+
+    def test_interpolate(self):
+        self.assertSameResult(makeData(50))
+
+    def test_startYear(self):
+        df = makeData(50)
+        for startYear in (2000, 2012, 2015, 2051):
+            self.assertSameResult(df, startYear=startYear)
+
+    def test_nan(self):
+        df = makeData(5)
+        df.loc[0, '2020'] = np.nan
+        df.loc[1, '2050'] = np.nan
+        self.assertSameResult(df, startYear=2035)
+
+    def test_inplace(self):
+        df = makeData(5)
+        result = interpolateYears(df, inplace=True)
+        self.assertIn('2011', df.columns)
+        self.assertEqual(list(result.columns), list(loopInterpolateYears(makeData(5)).columns))
+
+
+if __name__ == '__main__':
+    # Benchmark the vectorized version against the original loop
+    import timeit
+
+    for rows in (1000, 10000, 100000):
+        df = makeData(rows)
+        loopSecs = min(timeit.repeat(lambda: loopInterpolateYears(df, startYear=2015), number=1, repeat=3))
+        vecSecs  = min(timeit.repeat(lambda: interpolateYears(df, startYear=2015), number=1, repeat=3))
+        print("%7d rows: loop %.4fs, vectorized %.4fs (%.1fx)" % (rows, loopSecs, vecSecs, loopSecs / vecSecs))
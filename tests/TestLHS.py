@@ -0,0 +1,49 @@
+from unittest import TestCase
+
+import numpy as np
+from scipy import stats
+
+from pygcam.mcs.LHS import rankCorrCoef, lhs
+
+class DataSrc(object):
+    def __init__(self, rv):
+        self.rv = rv
+        self.distroName = 'uniform'
+
+class Param(object):
+    def __init__(self, rv):
+        self.dataSrc = DataSrc(rv)
+
+class RandomVar(object):
+    def __init__(self, rv):
+        self.param = Param(rv)
+
+    def ppf(self, q):
+        return self.param.dataSrc.rv.ppf(q)
+
+
+class TestLHS(TestCase):
+    def setUp(self):
+        self.params = [RandomVar(stats.uniform(loc=i, scale=2)) for i in range(6)] + \
+                      [RandomVar(stats.triang(0.5, loc=0, scale=1))]
+
+    def test_rankCorrCoef(self):
+        m = np.random.RandomState(0).random_sample((200, 5))
+        m[:10, 2] = 0.5     # ties
+        self.assertTrue(np.allclose(rankCorrCoef(m), stats.spearmanr(m).correlation))
+
+    def test_stratified(self):
+        trials = 100
+        samples = lhs(self.params, trials, rng=1)
+
+        for i, param in enumerate(self.params):
+            percentiles = np.sort(param.param.dataSrc.rv.cdf(samples[:, i]))
+            self.assertTrue(np.array_equal(np.floor(percentiles * trials), np.arange(trials)))
+
+    def test_seed(self):
+        corrMat = np.eye(len(self.params))
+        corrMat[0, 1] = corrMat[1, 0] = 0.9
+
+        samples = lhs(self.params, 500, corrMat=corrMat, rng=7)
+        self.assertTrue(np.array_equal(samples, lhs(self.params, 500, corrMat=corrMat, rng=7)))
+        self.assertGreater(stats.spearmanr(samples[:, 0], samples[:, 1]).correlation, 0.8)
@@ -0,0 +1,84 @@
+import os
+import shutil
+from unittest import TestCase
+
+from pygcam.lruCache import LRUCache
+from pygcam.utils import mkdirs
+from pygcam.xmlEditor import CachedFile
+
+class TestLRUCache(TestCase):
+    def setUp(self):
+        self.evicted = []
+        self.cache = LRUCache('test', sizeof=len, onEvict=lambda key, value: self.evicted.append(key))
+        LRUCache.setMaxMB(30.0 / (1024 * 1024))     # 30 bytes
+
+    def tearDown(self):
+        self.cache.clear()
+        LRUCache.instances.remove(self.cache)
+        LRUCache._maxBytes = None
+
+    def test_eviction(self):
+        cache = self.cache
+        cache['a'] = 'x' * 10
+        cache['b'] = 'x' * 10
+        cache['c'] = 'x' * 10
+
+        cache['a']                      # 'a' is now most recently used
+        cache['d'] = 'x' * 10           # exceeds budget; evicts 'b'
+
+        self.assertEqual(self.evicted, ['b'])
+        self.assertEqual(set(cache.keys()), {'a', 'c', 'd'})
+        self.assertEqual(cache.bytes, 30)
+
+    def test_counters(self):
+        cache = self.cache
+        cache['a'] = 'abc'
+        cache.get('a')
+        cache.get('missing')
+
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+        cache['a'] = 'abcdef'           # replacing an item updates the byte count
+        self.assertEqual(cache.bytes, 6)
+
+        del cache['a']
+        self.assertEqual(cache.bytes, 0)
+
+class TestCachedFile(TestCase):
+    def setUp(self):
+        self.tmpDir = '/tmp/testCachedFile'
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+        mkdirs(self.tmpDir)
+
+        self.files = []
+        for name in ('a', 'b'):
+            filename = os.path.join(self.tmpDir, name + '.xml')
+            with open(filename, 'w') as f:
+                f.write('<root><value>0</value></root>')
+            self.files.append(filename)
+
+        CachedFile.cache.clear()
+
+    def tearDown(self):
+        CachedFile.cache.clear()
+        LRUCache._maxBytes = None
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def test_evictedWhileInUse(self):
+        LRUCache.setMaxMB(1.0 / (1024 * 1024))      # room for only one file
+
+        item = CachedFile.getFile(self.files[0])
+        CachedFile.getFile(self.files[1])           # evicts the first file
+        self.assertNotIn(item.filename, CachedFile.cache)
+
+        # The instance still held is returned rather than a second copy
+        self.assertIs(CachedFile.getFile(self.files[0]), item)
+
+        CachedFile.getFile(self.files[1])           # evicts it again
+        item.tree.find('value').text = '1'
+        item.setEdited()
+        CachedFile.decacheAll()
+
+        with open(self.files[0]) as f:
+            self.assertIn('<value>1</value>', f.read())
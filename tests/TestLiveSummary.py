@@ -0,0 +1,147 @@
+import shutil
+import sys
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+from six import StringIO
+
+from pygcam.config import getParam, setParam
+from pygcam.mcs import util
+from pygcam.mcs.Database import GcamDatabase, RUN_SUCCEEDED, RUN_FAILED
+from pygcam.mcs.schema import Run
+from pygcam.mcs.summaryStats import LiveAggregator, printLiveSummary
+
+SimId = 1
+Trials = 20
+
+class Context(object):
+    def __init__(self, trialNum, status=RUN_SUCCEEDED, scenario='base'):
+        self.simId = SimId
+        self.trialNum = trialNum
+        self.scenario = scenario
+        self.status = status
+
+class Result(object):
+    def __init__(self, trialNum, values, status=RUN_SUCCEEDED):
+        self.context = Context(trialNum, status=status)
+        self.resultsList = [dict(paramName=name, value=value, isScalar=True)
+                            for name, value in values.items()]
+
+class TestLiveSummary(TestCase):
+    def setUp(self):
+        self.tmpDir = '/tmp/testLiveSummary'
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+        self.savedGetSimDir = util.getSimDir
+        util.getSimDir = lambda simId: self.tmpDir
+
+        self.saved = {name: getParam(name) for name in ('MCS.RunDbDir', 'MCS.DbURL', 'MCS.LiveSummary')}
+        setParam('MCS.RunDbDir', self.tmpDir)
+        setParam('MCS.DbURL', 'sqlite:///%s/live.sqlite' % self.tmpDir)
+        setParam('MCS.LiveSummary', 'True')
+
+        GcamDatabase.close()
+        self.db = db = GcamDatabase.getDatabase()
+        db.createSim(Trials, 'test', simId=SimId)
+        db.createExp('base')
+        db.createOutput('out1')
+        db.createOutput('out2')
+
+        # out1 depends mostly on input "a"; out2 on input "b"
+        rng = np.random.RandomState(42)
+        self.inputs = pd.DataFrame(rng.rand(Trials, 3), columns=['a', 'b', 'c'])
+
+        # A linked copy of "a", which must not be reported as important
+        util.writeTrialDataFile(SimId, self.inputs.assign(**{'a-linked[0]': self.inputs.a}))
+        self.outputs = pd.DataFrame({'out1': 10 * self.inputs.a + self.inputs.c,
+                                     'out2': -10 * self.inputs.b + self.inputs.c})
+
+    def tearDown(self):
+        GcamDatabase.close()
+        util.getSimDir = self.savedGetSimDir
+        for name, value in self.saved.items():
+            setParam(name, value)
+
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def results(self, trialNums):
+        return [Result(trialNum, self.outputs.loc[trialNum].to_dict()) for trialNum in trialNums]
+
+    def summary(self):
+        return self.db.getLiveSummary(SimId).set_index('outputName')
+
+    def checkRow(self, row, values):
+        self.assertEqual(row['count'], len(values))
+        self.assertAlmostEqual(row['mean'], values.mean())
+        self.assertAlmostEqual(row['stdev'], values.std())
+        self.assertAlmostEqual(row['skewness'], values.skew())
+        self.assertAlmostEqual(row['median'], values.median())
+        self.assertAlmostEqual(row['minimum'], values.min())
+        self.assertAlmostEqual(row['maximum'], values.max())
+        self.assertEqual(sum(row['histogram']['counts']), len(values))
+
+    def test_update(self):
+        agg = LiveAggregator(self.db, interval=3600, bins=5, maxVars=1)
+
+        # Not saved until the interval has passed, or when forced
+        agg.update(self.results([0]))
+        self.assertTrue(self.db.getLiveSummary(SimId).empty)
+
+        agg.update([], force=True)
+        self.assertEqual(agg.rankCorr, {})     # too few values to correlate
+        df = self.summary()
+        self.assertEqual(list(df['count']), [1, 1])
+        self.assertTrue(pd.isnull(df.loc['out1', 'stdev']))
+
+        # Statistics that can't be computed yet are shown as "n/a"
+        stdout = sys.stdout
+        sys.stdout = output = StringIO()
+        try:
+            printLiveSummary(SimId)
+        finally:
+            sys.stdout = stdout
+
+        self.assertIn('stdev: n/a', output.getvalue())
+
+        # The inputs are read and ranked once per simulation
+        agg.update(self.results(range(1, 10)), force=True)
+        rankCorr = agg.rankCorr[SimId]
+        self.assertEqual(list(rankCorr.inputs.columns), ['a', 'b', 'c'])
+
+        # Failed runs and re-run trials are ignored
+        results = self.results(range(10, Trials))
+        results.append(Result(Trials, {'out1': 1e6, 'out2': 1e6}, status=RUN_FAILED))
+        results.append(Result(0, {'out1': 1e6, 'out2': 1e6}))
+        agg.update(results, force=True)
+
+        df = self.summary()
+        for name in ('out1', 'out2'):
+            self.checkRow(df.loc[name], self.outputs[name])
+
+        self.assertEqual(list(df.loc['out1', 'importance'].keys()), ['a'])
+        self.assertEqual(list(df.loc['out2', 'importance'].keys()), ['b'])
+        self.assertLess(df.loc['out2', 'importance']['b'], 0)
+        self.assertIs(agg.rankCorr[SimId], rankCorr)
+
+    def test_existingResults(self):
+        # Results saved before the aggregator was created are read when
+        # the output is first seen.
+        db = self.db
+        with db.sessionScope() as session:
+            for trialNum in range(10):
+                db.createRun(SimId, trialNum, expName='base', status=RUN_SUCCEEDED, session=session)
+
+        with db.sessionScope() as session:
+            runIds = dict(session.query(Run.trialNum, Run.runId).all())
+
+        db.saveRunResults([(runIds[result.context.trialNum], result.resultsList)
+                           for result in self.results(range(10))])
+
+        agg = LiveAggregator(db, interval=0, bins=5, maxVars=0)
+        agg.update(self.results(range(10, Trials)))
+
+        df = self.summary()
+        for name in ('out1', 'out2'):
+            self.checkRow(df.loc[name], self.outputs[name])
+            self.assertEqual(df.loc[name, 'importance'], {})
@@ -0,0 +1,112 @@
+import shutil
+from unittest import TestCase
+
+import numpy as np
+
+from pygcam.config import getParam, setParam
+from pygcam.mcs.analysis import Analysis
+from pygcam.mcs.Database import GcamDatabase, RUN_SUCCEEDED
+from pygcam.mcs.error import PygcamMcsSystemError
+from pygcam.mcs.schema import Run
+
+SimId = 1
+
+# Trials run for each experiment, and outputs missing for some trials
+Trials = {'base': [0, 1, 2, 3, 4], 'policy': [2, 3, 5, 6]}
+Missing = {('policy', 3): 'o2'}
+
+def value(expName, trialNum, outputName):
+    return trialNum * 10.0 + (100 if expName == 'policy' else 0) + (1 if outputName == 'o2' else 0)
+
+class TestOutValuesBulk(TestCase):
+    def setUp(self):
+        self.dbDir = '/tmp/testOutValuesBulk'
+        shutil.rmtree(self.dbDir, ignore_errors=True)
+
+        self.saved = {name: getParam(name) for name in ('MCS.RunDbDir', 'MCS.DbURL')}
+        setParam('MCS.RunDbDir', self.dbDir)
+        setParam('MCS.DbURL', 'sqlite:///%s/values.sqlite' % self.dbDir)
+
+        GcamDatabase.close()
+        self.db = db = GcamDatabase.getDatabase()
+        db.createSim(7, 'test', simId=SimId)
+        for expName in Trials:
+            db.createExp(expName)
+
+        db.createOutput('o1')
+        db.createOutput('o2')
+
+        with db.sessionScope() as session:
+            for expName, trialNums in Trials.items():
+                for trialNum in trialNums:
+                    db.createRun(SimId, trialNum, expName=expName, status=RUN_SUCCEEDED, session=session)
+
+        with db.sessionScope() as session:
+            runs = session.query(Run.runId, Run.trialNum, Run.expId).all()
+            expNames = {db.getExpId(expName): expName for expName in Trials}
+
+        runResults = []
+        for runId, trialNum, expId in runs:
+            expName = expNames[expId]
+            results = [dict(paramName=name, isScalar=True, value=value(expName, trialNum, name))
+                       for name in ('o1', 'o2') if Missing.get((expName, trialNum)) != name]
+            runResults.append((runId, results))
+
+        db.saveRunResults(runResults)
+
+    def tearDown(self):
+        GcamDatabase.close()
+        for name, val in self.saved.items():
+            setParam(name, val)
+
+        shutil.rmtree(self.dbDir, ignore_errors=True)
+
+    def checkValues(self, df, expected):
+        for (expName, outputName), trialNums in expected.items():
+            values = df[(expName, outputName)].dropna()
+            self.assertEqual(list(values.index), trialNums)
+            self.assertEqual(list(values), [value(expName, trialNum, outputName) for trialNum in trialNums])
+
+    def test_values(self):
+        df = self.db.getOutValuesBulk(SimId, ['base', 'policy'], ['o1', 'o2'])
+
+        # The index is the union of the experiments' trials
+        self.assertEqual(list(df.index), [0, 1, 2, 3, 4, 5, 6])
+        self.checkValues(df, {('base', 'o1'): [0, 1, 2, 3, 4],
+                              ('base', 'o2'): [0, 1, 2, 3, 4],
+                              ('policy', 'o1'): [2, 3, 5, 6],
+                              ('policy', 'o2'): [2, 5, 6]})
+
+        trialNums, columns, data = self.db.getOutValuesBulk(SimId, ['policy'], ['o2'], asArrays=True)
+        self.assertEqual(list(trialNums), [2, 5, 6])
+        self.assertEqual(columns, [('policy', 'o2')])
+        self.assertTrue(np.array_equal(data[:, 0], [value('policy', t, 'o2') for t in (2, 5, 6)]))
+
+    def test_limit(self):
+        # The first `limit` trials with values for each experiment and output
+        df = self.db.getOutValuesBulk(SimId, ['base', 'policy'], ['o1', 'o2'], limit=2)
+        self.assertEqual(list(df.index), [0, 1, 2, 3, 5])
+        self.checkValues(df, {('base', 'o1'): [0, 1],
+                              ('base', 'o2'): [0, 1],
+                              ('policy', 'o1'): [2, 3],
+                              ('policy', 'o2'): [2, 5]})
+
+    def test_unknownOutput(self):
+        with self.assertRaises(PygcamMcsSystemError):
+            self.db.getOutValuesBulk(SimId, ['base'], ['o1', 'unknown'])
+
+        df = self.db.getOutValuesBulk(SimId, ['base', 'unknownExp'], ['o1'])
+        self.assertTrue(df[('unknownExp', 'o1')].isnull().all())
+
+    def test_analysisResults(self):
+        # Each scenario's results include only its own trials
+        anaObj = Analysis(SimId, ['base', 'policy'], ['o1'])
+        resultDict = anaObj.getResults()
+        self.assertEqual(list(resultDict['base'].index), [0, 1, 2, 3, 4])
+        self.assertEqual(list(resultDict['policy'].index), [2, 3, 5, 6])
+
+        # Results added later are joined to those cached
+        resultDict = anaObj.getResults(resultList=['o2'])
+        self.assertEqual(list(resultDict['policy'].columns), ['o1', 'o2'])
+        self.assertEqual(list(resultDict['policy'].index), [2, 3, 5, 6])
+        self.assertTrue(np.isnan(resultDict['policy'].loc[3, 'o2']))
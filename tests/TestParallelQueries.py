@@ -0,0 +1,125 @@
+import argparse
+import os
+import shutil
+from unittest import TestCase
+
+from pygcam import query
+from pygcam.config import getConfig, getParam, setParam, getSection, setSection
+from pygcam.error import PygcamException, CommandlineError
+from pygcam.project import Project
+from pygcam.utils import mkdirs
+
+ProjectName = 'queryTest'
+
+ProjectText = '''<?xml version="1.0" encoding="UTF-8"?>
+<projects>
+  <project name="{project}">
+    <scenariosFile name="scenarios.xml"/>
+    <steps>
+      <step name="query" runFor="all">true</step>
+    </steps>
+  </project>
+</projects>
+'''
+
+ScenariosText = '''<?xml version="1.0" encoding="UTF-8"?>
+<scenarios name="queryTest" defaultGroup="flat">
+  <scenarioGroup name="flat" useGroupDir="0">
+    <scenario name="base" baseline="1"/>
+    <scenario name="policy"/>
+  </scenarioGroup>
+  <scenarioGroup name="nested" useGroupDir="1">
+    <scenario name="base" baseline="1"/>
+    <scenario name="policy"/>
+    <scenario name="unused" active="0"/>
+  </scenarioGroup>
+</scenarios>
+'''
+
+def queryScenario(scenario, outputDir, **kwargs):
+    """
+    Replaces _queryScenario in (forked) worker processes.
+    """
+    if scenario.startswith('bad'):
+        raise PygcamException('query failed for %s' % scenario)
+
+    mkdirs(outputDir)
+    with open(os.path.join(outputDir, scenario + '.csv'), 'w') as f:
+        f.write(','.join(sorted(kwargs['queries'])))
+
+class TestParallelQueries(TestCase):
+    def setUp(self):
+        self.tmpDir = '/tmp/testParallelQueries'
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+        mkdirs(self.tmpDir)
+
+        projectFile = os.path.join(self.tmpDir, 'project.xml')
+        with open(projectFile, 'w') as f:
+            f.write(ProjectText.format(project=ProjectName))
+
+        with open(os.path.join(self.tmpDir, 'scenarios.xml'), 'w') as f:
+            f.write(ScenariosText)
+
+        config = getConfig()
+        if not config.has_section(ProjectName):
+            config.add_section(ProjectName)
+
+        self.savedSection = getSection()
+        self.savedDefaultProject = getParam('GCAM.DefaultProject', section='DEFAULT')
+        setParam('GCAM.DefaultProject', ProjectName, section='DEFAULT')
+        setSection(ProjectName)
+        setParam('GCAM.ProjectName', ProjectName, section=ProjectName)
+        setParam('GCAM.ProjectXmlFile', projectFile, section=ProjectName)
+        setParam('GCAM.XmlSrc', os.path.join(self.tmpDir, 'xmlsrc'), section=ProjectName)
+
+        Project.instance = None
+        self.savedQueryScenario = query._queryScenario
+
+    def tearDown(self):
+        query._queryScenario = self.savedQueryScenario
+        Project.instance = None
+        setParam('GCAM.DefaultProject', self.savedDefaultProject, section='DEFAULT')
+        setSection(self.savedSection)
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def scenarios(self, scenario=None, group=None, groupDir=''):
+        args = argparse.Namespace(scenario=scenario, scenarioGroup=group, groupDir=groupDir)
+        return query._scenariosToQuery(args)
+
+    def test_scenariosToQuery(self):
+        # Without a group, scenarios are taken as given
+        self.assertEqual(self.scenarios(), [('Reference', '')])
+        self.assertEqual(self.scenarios('a,b,', groupDir='g'), [('a', 'g'), ('b', 'g')])
+
+        # With a group, all active scenarios, in the group's directory if it uses one
+        self.assertEqual(self.scenarios(group='flat'), [('base', ''), ('policy', '')])
+        self.assertEqual(self.scenarios(group='nested'), [('base', 'nested'), ('policy', 'nested')])
+        self.assertEqual(self.scenarios('policy', group='nested', groupDir='other'), [('policy', 'other')])
+
+        with self.assertRaises(CommandlineError):
+            self.scenarios('policy,unknown', group='nested')
+
+    def kwargs(self, scenarios):
+        return [dict(scenario=name, outputDir=os.path.join(self.tmpDir, name), queries=['q1', 'q2'])
+                for name in scenarios]
+
+    def test_runParallelQueries(self):
+        query._queryScenario = queryScenario
+
+        query._runParallelQueries(2, self.kwargs(['base', 'policy', 'other']), None, None, None)
+        for name in ('base', 'policy', 'other'):
+            with open(os.path.join(self.tmpDir, name, name + '.csv')) as f:
+                self.assertEqual(f.read(), 'q1,q2')
+
+    def test_failingWorker(self):
+        query._queryScenario = queryScenario
+
+        with self.assertRaises(PygcamException) as cm:
+            query._runParallelQueries(2, self.kwargs(['base', 'bad1', 'policy', 'bad2']), None, None, None)
+
+        self.assertIn('bad1, bad2', str(cm.exception))
+        self.assertNotIn('base', str(cm.exception))
+
+        # Other scenarios are still queried
+        for name in ('base', 'policy'):
+            self.assertTrue(os.path.exists(os.path.join(self.tmpDir, name, name + '.csv')))
@@ -0,0 +1,94 @@
+import os
+import shutil
+from unittest import TestCase
+
+from pygcam.config import getParam, setParam
+from pygcam.mcs import worker
+from pygcam.utils import mkdirs
+
+class Context(object):
+    def __init__(self, simId, trialNum):
+        self.projectName = 'test'
+        self.groupName = 'group'
+        self.simId = simId
+        self.trialNum = trialNum
+
+class ParamFile(object):
+    def __init__(self, paramPath):
+        self.filename = paramPath
+
+class TestParameterCache(TestCase):
+    def setUp(self):
+        self.tmpDir = '/tmp/testParameterCache'
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+        mkdirs(self.tmpDir)
+
+        self.saved = {name: getParam(name) for name in ('MCS.ParametersFile', 'GCAM.ScenarioSetupFile')}
+
+        self.paramPaths = []
+        for name in ('parameters.xml', 'parameters2.xml', 'scenarios.xml'):
+            path = os.path.join(self.tmpDir, name)
+            self.write(path, '<root/>')
+            self.paramPaths.append(path)
+
+        setParam('MCS.ParametersFile', self.paramPaths[0])
+        setParam('GCAM.ScenarioSetupFile', self.paramPaths[2])
+
+        # Count the times the parameter info is read
+        self.reads = []
+        self.savedRead = worker._readParameterInfo
+
+        def readParameterInfo(context, paramPath):
+            self.reads.append((context.simId, paramPath))
+            return ParamFile(paramPath)
+
+        worker._readParameterInfo = readParameterInfo
+        worker._ParameterCache.clear()
+
+    def tearDown(self):
+        worker._readParameterInfo = self.savedRead
+        worker._ParameterCache.clear()
+        for name, value in self.saved.items():
+            setParam(name, value)
+
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def load(self, simId, trialNum):
+        return worker._loadParameterInfo(Context(simId, trialNum))
+
+    def test_reuse(self):
+        paramFile = self.load(1, 0)
+        for trialNum in range(1, 5):
+            self.assertIs(self.load(1, trialNum), paramFile)
+
+        self.assertEqual(self.reads, [(1, self.paramPaths[0])])
+
+    def test_invalidation(self):
+        first = self.load(1, 0)
+
+        # The parameter file changed
+        self.write(self.paramPaths[0], '<root><changed/></root>')
+        second = self.load(1, 1)
+        self.assertIsNot(second, first)
+        self.assertIs(self.load(1, 2), second)
+
+        # The scenario setup file changed
+        self.write(self.paramPaths[2], '<root><changed/></root>')
+        third = self.load(1, 3)
+        self.assertIsNot(third, second)
+
+        # Another simulation
+        fourth = self.load(2, 0)
+        self.assertIsNot(fourth, third)
+
+        # Another parameter file
+        setParam('MCS.ParametersFile', self.paramPaths[1])
+        fifth = self.load(2, 1)
+        self.assertEqual(fifth.filename, self.paramPaths[1])
+
+        self.assertEqual(self.reads, [(1, self.paramPaths[0])] * 3 +
+                                     [(2, self.paramPaths[0]), (2, self.paramPaths[1])])
@@ -0,0 +1,79 @@
+import os
+import shutil
+import time
+from unittest import TestCase
+
+from pygcam.queryIndex import QueryIndex
+from pygcam.utils import mkdirs
+
+QueryFileText = '''<?xml version="1.0" encoding="UTF-8"?>
+<queries>
+  <queryGroup name="resources">
+    <supplyDemandQuery title="Land Allocation">
+      <axis1 name="LandLeaf">LandLeaf[@name]</axis1>
+    </supplyDemandQuery>
+    <supplyDemandQuery title="primary energy">
+      <axis1 name="fuel">input[@name]</axis1>
+    </supplyDemandQuery>
+  </queryGroup>
+  <aQuery>
+    <region name="USA"/>
+    <emissionsQueryBuilder title="CO2 emissions">
+      <axis1 name="region">region</axis1>
+    </emissionsQueryBuilder>
+  </aQuery>
+</queries>
+'''
+
+class TestQueryIndex(TestCase):
+    def setUp(self):
+        self.tmpDir = '/tmp/testQueryIndex'
+        self.removeTmpDir()
+        mkdirs(self.tmpDir)
+
+        self.queryFile = os.path.join(self.tmpDir, 'Main_Queries.xml')
+        with open(self.queryFile, 'w') as f:
+            f.write(QueryFileText)
+
+        QueryIndex.instances = {}
+
+    def tearDown(self):
+        self.removeTmpDir()
+
+    def removeTmpDir(self):
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def test_find(self):
+        index = QueryIndex.get(self.queryFile)
+        self.assertEqual(sorted(index.titles()), ['CO2 emissions', 'Land Allocation', 'primary energy'])
+
+        elt = index.find('Land_Allocation')     # "_" matches " "
+        self.assertEqual(elt.tag, 'supplyDemandQuery')
+        self.assertEqual(elt.getparent().tag, 'aQuery')
+        self.assertEqual(elt.find('axis1').get('name'), 'LandLeaf')
+
+        # Queries found in an <aQuery> keep their siblings
+        elt = index.find('CO2-emissions')
+        self.assertEqual([e.tag for e in elt.getparent()], ['region', 'emissionsQueryBuilder'])
+
+        self.assertIsNone(index.find('no such query'))
+
+    def test_savedIndex(self):
+        QueryIndex.get(self.queryFile)
+        path = QueryIndex.indexPath(os.path.abspath(self.queryFile))
+        self.assertTrue(os.path.exists(path), 'Query index file was not created')
+
+        QueryIndex.instances = {}
+        index = QueryIndex.get(self.queryFile)
+        self.assertIsNotNone(index.find('primary energy'))
+
+    def test_staleIndex(self):
+        QueryIndex.get(self.queryFile)
+
+        time.sleep(0.01)
+        with open(self.queryFile, 'w') as f:
+            f.write(QueryFileText.replace('primary energy', 'secondary energy'))
+
+        index = QueryIndex.get(self.queryFile)
+        self.assertIsNone(index.find('primary energy'), 'Stale query index was used')
+        self.assertIsNotNone(index.find('secondary energy'))
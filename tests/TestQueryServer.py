@@ -0,0 +1,93 @@
+import socket
+import threading
+from unittest import TestCase
+
+from pygcam.error import PygcamException
+from pygcam.queryServer import (QueryServer, runQueriesOnServer, stopServer, _connect,
+                                OP_QUERY)
+
+AuthKey = b'test-query-server'
+
+def freePort():
+    sock = socket.socket()
+    sock.bind(('localhost', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+class StubServer(QueryServer):
+    """
+    Replies to jobs without running ModelInterface, recording what was run.
+    """
+    def __init__(self, *args, **kwargs):
+        super(StubServer, self).__init__(*args, **kwargs)
+        self.ran = []
+
+    def runJobs(self, jobs):
+        self.batches += 1
+        self.jobs += len(jobs)
+
+        for job in jobs:
+            self.ran.append((job.scenario, job.xmldb, job.commands))
+            failed = [path for path in job.csvPaths() if 'bad' in path]
+            job.reply({'status': 'failed' if failed else 'ok', 'failed': failed})
+
+class TestQueryServer(TestCase):
+    def setUp(self):
+        self.address = ('localhost', freePort())
+        self.server = StubServer(address=self.address, authkey=AuthKey, maxJobs=10)
+        self.thread = threading.Thread(target=self.server.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+        # wait for the server to listen
+        for _ in range(100):
+            if self.server.listener:
+                break
+            threading.Event().wait(0.05)
+
+    def tearDown(self):
+        if self.thread.is_alive():
+            stopServer(self.address, AuthKey)
+            self.thread.join(10)
+
+    def request(self, msg):
+        conn = _connect(self.address, AuthKey)
+        try:
+            conn.send(msg)
+            return conn.recv()
+        finally:
+            conn.close()
+
+    def test_roundTrip(self):
+        commands = ['<command><outFile>/tmp/good.csv</outFile></command>',
+                    '<command><outFile>/tmp/bad.csv</outFile></command>']
+
+        failed = runQueriesOnServer('base', '/tmp/db', commands, address=self.address, authkey=AuthKey)
+        self.assertEqual(failed, ['/tmp/bad.csv'])
+        self.assertEqual(self.server.ran, [('base', '/tmp/db', commands)])
+
+        stopServer(self.address, AuthKey)
+        self.thread.join(10)
+        self.assertFalse(self.thread.is_alive())
+        self.assertEqual(self.server.jobs, 1)
+
+    def test_malformedRequests(self):
+        for msg in (['not', 'a', 'dict'],
+                    {'op': OP_QUERY, 'scenario': 'base'},
+                    {'op': 'unknown'}):
+            response = self.request(msg)
+            self.assertEqual(response['status'], 'error')
+
+        # The server is still running
+        self.assertEqual(runQueriesOnServer('base', '/tmp/db', [], address=self.address, authkey=AuthKey), [])
+        self.assertEqual(self.server.jobs, 1)
+
+    def test_serverError(self):
+        def runJobs(jobs):
+            for job in jobs:
+                job.reply({'status': 'error', 'error': 'ModelInterface failed'})
+
+        self.server.runJobs = runJobs
+        with self.assertRaises(PygcamException):
+            runQueriesOnServer('base', '/tmp/db', [], address=self.address, authkey=AuthKey)
@@ -0,0 +1,45 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from pygcam.mcs.analysis import RankCorrelation
+
+class TestRankCorrelation(TestCase):
+    def setUp(self):
+        rs = np.random.RandomState(123)
+        trials = 500
+        self.inputs = pd.DataFrame(rs.rand(trials, 20), columns=['p%d' % i for i in range(20)])
+        self.inputs['ties'] = rs.randint(0, 4, trials)
+
+        self.outputs = pd.DataFrame({'a': 3 * self.inputs.p0 + rs.rand(trials),
+                                     'b': -self.inputs.p1 + rs.rand(trials)})
+        self.outputs.loc[10:40, 'b'] = np.nan
+        self.outputs = self.outputs.iloc[rs.permutation(trials)[:400]]   # only some trials have results
+
+    def expected(self, output):
+        output = output.dropna()
+        return self.inputs.loc[output.index].corrwith(output, method='spearman')
+
+    def test_correlate(self):
+        rankCorr = RankCorrelation(self.inputs)
+        corr = rankCorr.correlate(self.outputs)
+
+        for name in self.outputs.columns:
+            self.assertTrue(np.allclose(corr[name], self.expected(self.outputs[name])))
+
+        series = rankCorr.correlate(self.outputs.a)
+        self.assertEqual(series.name, 'spearman')
+        self.assertTrue(np.allclose(series, corr.a))
+
+    def test_convergence(self):
+        rankCorr = RankCorrelation(self.inputs)
+        output = self.outputs.a
+        df = rankCorr.convergence(output, [100, 200, len(output)], columns=['p0', 'ties'])
+
+        self.assertEqual(list(df['count'].unique()), [100, 200, len(output)])
+        self.assertEqual(df.paramName.iloc[0], 'p0')
+
+        # At the full count, the values are the Spearman correlations
+        final = df[df['count'] == len(output)].set_index('paramName').spearman
+        self.assertTrue(np.allclose(final[['p0', 'ties']], self.expected(output)[['p0', 'ties']]))
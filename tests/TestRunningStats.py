@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from pygcam.mcs.analysis import RunningStats, convergenceStats
+
+class TestRunningStats(TestCase):
+    def setUp(self):
+        rs = np.random.RandomState(42)
+        self.values = pd.Series(rs.lognormal(size=1003))
+
+    def checkStats(self, stats, values):
+        self.assertEqual(stats.count, len(values))
+        self.assertAlmostEqual(stats.mean, values.mean())
+        self.assertAlmostEqual(stats.std(), values.std())
+        self.assertAlmostEqual(stats.skew(), values.skew())
+
+        for q in (0, 2.5, 50, 97.5, 100):
+            self.assertAlmostEqual(stats.percentile(q), np.percentile(values, q))
+
+    def test_batches(self):
+        stats = RunningStats()
+        for start in range(0, len(self.values), 170):
+            batch = self.values[start:start + 170]
+            stats.update(batch)
+            self.checkStats(stats, self.values[:start + len(batch)])
+
+    def test_nan(self):
+        values = self.values.copy()
+        values[[3, 500]] = np.nan
+        self.checkStats(RunningStats(values), values.dropna())
+
+    def test_convergenceStats(self):
+        df = convergenceStats(self.values, increment=100)
+        self.assertEqual(list(df.index), list(range(100, 1001, 100)) + [1003])
+
+        last = df.loc[1003]
+        self.assertAlmostEqual(last['Mean'], self.values.mean())
+        self.assertAlmostEqual(last['Skewness'], self.values.skew())
@@ -0,0 +1,98 @@
+import os
+import shutil
+from glob import glob
+from unittest import TestCase
+
+from pygcam.mcs.util import hardlink_directory_contents
+from pygcam.scenarioSetup import _sandboxTemplate
+from pygcam.utils import mkdirs, COPY_METHOD_HARDLINK
+
+class TestSandboxTemplate(TestCase):
+    def setUp(self):
+        self.tmpDir = '/tmp/testSandboxTemplate'
+        self.removeTmpDir()
+
+        self.workspace = os.path.join(self.tmpDir, 'workspace')
+        self.sandbox = os.path.join(self.tmpDir, 'sandbox')
+
+        self.writeFile('exe/configuration.xml', '<Configuration/>')
+        self.writeFile('exe/dist/model.xml', '<model/>')
+        self.writeFile('input/gcamdata.xml', '<data/>')
+        os.symlink('configuration.xml', os.path.join(self.workspace, 'exe', 'config-link.xml'))
+
+    def tearDown(self):
+        self.removeTmpDir()
+
+    def removeTmpDir(self):
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def writeFile(self, relPath, text, root=None):
+        path = os.path.join(root or self.workspace, relPath)
+        mkdirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def readFile(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def template(self):
+        return _sandboxTemplate(self.workspace, ['exe'], ['input'], COPY_METHOD_HARDLINK)
+
+    def templates(self):
+        return glob(os.path.join(self.workspace, '.sandbox-template-*'))
+
+    def test_template(self):
+        template = self.template()
+        self.assertEqual(self.templates(), [template])
+        self.assertEqual(self.template(), template)
+
+        # Linked files are absolute links to the workspace
+        link = os.path.join(template, 'input')
+        self.assertEqual(os.readlink(link), os.path.join(self.workspace, 'input'))
+        self.assertEqual(self.readFile(os.path.join(template, 'exe', 'dist', 'model.xml')), '<model/>')
+
+    def test_invalidation(self):
+        template = self.template()
+
+        # Changing a file below a copied directory creates a new template,
+        # replacing the old one.
+        self.writeFile('exe/dist/model.xml', '<model version="2"/>')
+        newTemplate = self.template()
+        self.assertNotEqual(newTemplate, template)
+        self.assertEqual(self.templates(), [newTemplate])
+        self.assertEqual(self.readFile(os.path.join(newTemplate, 'exe', 'dist', 'model.xml')),
+                         '<model version="2"/>')
+
+        # As does changing only the modification time
+        path = os.path.join(self.workspace, 'exe', 'dist', 'model.xml')
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        self.assertNotIn(self.template(), (template, newTemplate))
+        self.assertEqual(len(self.templates()), 1)
+
+    def test_hardlinkContents(self):
+        template = self.template()
+
+        # Existing files in the sandbox are left as is
+        self.writeFile('exe/configuration.xml', '<Configuration trial="1"/>', root=self.sandbox)
+        hardlink_directory_contents(template, self.sandbox, method=COPY_METHOD_HARDLINK)
+
+        exeDir = os.path.join(self.sandbox, 'exe')
+        self.assertEqual(self.readFile(os.path.join(exeDir, 'configuration.xml')), '<Configuration trial="1"/>')
+
+        # Files are linked to the template's files
+        self.assertTrue(os.path.samefile(os.path.join(exeDir, 'dist', 'model.xml'),
+                                         os.path.join(template, 'exe', 'dist', 'model.xml')))
+
+        # Symbolic links are recreated with the same targets
+        for relPath in ('input', 'exe/config-link.xml'):
+            path = os.path.join(self.sandbox, relPath)
+            self.assertTrue(os.path.islink(path))
+            self.assertEqual(os.readlink(path), os.readlink(os.path.join(template, relPath)))
+
+        self.assertEqual(os.readlink(os.path.join(exeDir, 'config-link.xml')), 'configuration.xml')
+
+        # Running again skips the existing entries
+        hardlink_directory_contents(template, self.sandbox, method=COPY_METHOD_HARDLINK)
+        self.assertEqual(self.readFile(os.path.join(exeDir, 'configuration.xml')), '<Configuration trial="1"/>')
@@ -0,0 +1,91 @@
+import shutil
+from unittest import TestCase
+
+from pygcam.config import getParam, setParam
+from pygcam.mcs.Database import GcamDatabase, RUN_SUCCEEDED
+from pygcam.mcs.schema import Run
+
+SimId = 1
+Trials = 3
+
+class TestSaveRunResults(TestCase):
+    def setUp(self):
+        self.dbDir = '/tmp/testSaveRunResults'
+        shutil.rmtree(self.dbDir, ignore_errors=True)
+
+        self.saved = {name: getParam(name) for name in ('MCS.RunDbDir', 'MCS.DbURL', 'MCS.TimeSeriesStorage')}
+        setParam('MCS.RunDbDir', self.dbDir)
+        setParam('MCS.DbURL', 'sqlite:///%s/results.sqlite' % self.dbDir)
+        setParam('MCS.TimeSeriesStorage', 'wide')
+
+        GcamDatabase.close()
+        self.db = db = GcamDatabase.getDatabase()
+        db.createSim(Trials, 'test', simId=SimId)
+        db.createExp('base')
+        db.createOutput('scalar1')
+        db.createOutput('scalar2')
+        db.createOutput('emissions', unit='Tg')
+
+        with db.sessionScope() as session:
+            for trialNum in range(Trials):
+                db.createRun(SimId, trialNum, expName='base', status=RUN_SUCCEEDED, session=session)
+
+        with db.sessionScope() as session:
+            self.runIds = dict(session.query(Run.trialNum, Run.runId).all())
+
+        self.yearCols = db.yearCols()
+
+    def tearDown(self):
+        GcamDatabase.close()
+        for name, value in self.saved.items():
+            setParam(name, value)
+
+        shutil.rmtree(self.dbDir, ignore_errors=True)
+
+    def resultsList(self, trialNum, offset):
+        results = [dict(paramName='scalar1', isScalar=True, value=trialNum + offset),
+                   dict(paramName='scalar2', isScalar=True, value=-trialNum - offset)]
+
+        for i, region in enumerate(('USA', 'China')):
+            values = {col: trialNum * 100.0 + i * 10 + j + offset for j, col in enumerate(self.yearCols)}
+            results.append(dict(paramName='emissions', isScalar=False, units='Tg',
+                                regionName=region, value=values))
+        return results
+
+    def save(self, offset):
+        self.db.saveRunResults([(self.runIds[trialNum], self.resultsList(trialNum, offset))
+                                for trialNum in range(Trials)])
+
+    def checkScalars(self, name, expected):
+        df = self.db.getOutValues(SimId, 'base', name)
+        self.assertEqual(list(df.index), list(expected.keys()))
+        self.assertEqual(list(df[name]), list(expected.values()))
+
+    def checkSeries(self, offset):
+        rows = self.db.getTimeSeries(SimId, 'emissions', ['base'])
+        trialByRunId = {runId: trialNum for trialNum, runId in self.runIds.items()}
+
+        self.assertEqual(len(rows), 2 * Trials)
+        self.assertEqual(sorted(trialByRunId[ts.runId] for ts, _ in rows), sorted(list(range(Trials)) * 2))
+
+        for ts, expName in rows:
+            self.assertEqual(expName, 'base')
+            self.assertEqual(ts.units, 'Tg')
+            trialNum = trialByRunId[ts.runId]
+            i = 0 if ts.regionId == self.db.getRegionId('USA') else 1
+            for j, col in enumerate(self.yearCols):
+                self.assertEqual(getattr(ts, col), trialNum * 100.0 + i * 10 + j + offset)
+
+    def test_roundTrip(self):
+        self.save(0)
+        self.checkScalars('scalar1', {0: 0, 1: 1, 2: 2})
+        self.checkSeries(0)
+
+        # Results saved again for the same runs replace the earlier ones
+        self.save(0.5)
+        self.checkScalars('scalar1', {0: 0.5, 1: 1.5, 2: 2.5})
+        self.checkScalars('scalar2', {0: -0.5, 1: -1.5, 2: -2.5})
+        self.checkSeries(0.5)
+
+        with self.assertRaises(Exception):
+            self.db.saveRunResults([(self.runIds[0], [dict(paramName='unknown', isScalar=True, value=1)])])
@@ -0,0 +1,105 @@
+import shutil
+from unittest import TestCase
+
+import numpy as np
+
+from pygcam.config import getParam, setParam
+from pygcam.mcs.Database import GcamDatabase, RUN_SUCCEEDED, RUN_FAILED
+from pygcam.mcs.schema import Run
+from pygcam.mcs.util import stripYearPrefix
+
+class TestTimeSeriesStorage(TestCase):
+    def setUp(self):
+        self.dbDir = '/tmp/testTimeSeriesStorage'
+        shutil.rmtree(self.dbDir, ignore_errors=True)
+
+        self.saved = {name: getParam(name) for name in ('MCS.RunDbDir', 'MCS.DbURL', 'MCS.TimeSeriesStorage')}
+        setParam('MCS.RunDbDir', self.dbDir)
+
+        GcamDatabase.close()
+
+    def tearDown(self):
+        GcamDatabase.close()
+        for name, value in self.saved.items():
+            setParam(name, value)
+
+        shutil.rmtree(self.dbDir, ignore_errors=True)
+
+    def createDb(self, storage):
+        setParam('MCS.TimeSeriesStorage', storage)
+        setParam('MCS.DbURL', 'sqlite:///%s/%s.sqlite' % (self.dbDir, storage))
+        GcamDatabase.close()
+
+        db = GcamDatabase.getDatabase()
+        db.createSim(3, 'test', simId=1)
+        db.createExp('base')
+        db.createExp('policy')
+        db.createOutput('emissions', unit='Tg')
+
+        with db.sessionScope() as session:
+            for expName in ('base', 'policy'):
+                for trialNum in range(3):
+                    db.createRun(1, trialNum, expName=expName, session=session)
+
+        with db.sessionScope() as session:
+            runIds = {(expId, trialNum): runId for runId, trialNum, expId in
+                      session.query(Run.runId, Run.trialNum, Run.expId).all()}
+
+        return db, runIds
+
+    def saveResults(self, db, runIds):
+        yearCols = db.yearCols()
+        runResults = []
+
+        for (expId, trialNum), runId in sorted(runIds.items()):
+            results = []
+            for i, region in enumerate(('USA', 'China')):
+                values = {col: runId * 100.0 + i * 10 + j for j, col in enumerate(yearCols)}
+                values[yearCols[1]] = None      # missing values are stored as NULL or omitted
+                results.append(dict(paramName='emissions', isScalar=False, units='Tg',
+                                    regionName=region, value=values))
+
+            runResults.append((runId, results))
+
+        db.saveRunResults(runResults)
+
+        # Results are replaced when saved again
+        db.saveRunResults(runResults)
+
+        # Only successful runs are read
+        with db.sessionScope() as session:
+            session.query(Run).filter(Run.runId != max(runIds.values())).update({Run.status: RUN_SUCCEEDED})
+            session.query(Run).filter(Run.runId == max(runIds.values())).update({Run.status: RUN_FAILED})
+
+        return yearCols
+
+    def readResults(self, storage):
+        db, runIds = self.createDb(storage)
+        yearCols = self.saveResults(db, runIds)
+
+        df = db.getTimeSeriesValues(1, 'emissions', ['base', 'policy'])
+        self.assertIsNone(db.getTimeSeriesValues(1, 'no-such-output', ['base']))
+
+        df = df.sort_values(['runId', 'regionId']).reset_index(drop=True)
+        years = [stripYearPrefix(col) for col in yearCols]
+        self.assertEqual(list(df.columns), ['runId', 'regionId', 'expName', 'units'] + years)
+        self.assertEqual(len(df), (len(runIds) - 1) * 2)
+        self.assertEqual(set(df.expName), {'base', 'policy'})
+        self.assertEqual(set(df.units), {'Tg'})
+        self.assertTrue(df[years[1]].isnull().all())
+
+        values = df[years[0]].values
+        expected = df.runId * 100.0 + np.where(df.regionId == db.getRegionId('USA'), 0, 10)
+        self.assertTrue(np.allclose(values, expected))
+
+        return df
+
+    def test_roundTrip(self):
+        wide = self.readResults('wide')
+        long = self.readResults('long')
+
+        self.assertEqual(list(wide.columns), list(long.columns))
+        for col in ('runId', 'regionId', 'expName', 'units'):
+            self.assertEqual(list(wide[col]), list(long[col]))
+
+        self.assertTrue(np.allclose(wide.iloc[:, 4:].values, long.iloc[:, 4:].values, equal_nan=True))
@@ -0,0 +1,69 @@
+import os
+import shutil
+import time
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from pygcam.mcs import util
+from pygcam.utils import mkdirs
+
+class TestTrialMatrix(TestCase):
+    def setUp(self):
+        self.simDir = '/tmp/testTrialMatrix'
+        shutil.rmtree(self.simDir, ignore_errors=True)
+        mkdirs(self.simDir)
+
+        self.savedGetSimDir = util.getSimDir
+        util.getSimDir = lambda simId: self.simDir
+
+        self.df = pd.DataFrame(np.random.rand(100, 5), columns=['a', 'b', 'c', 'd', 'e'])
+        util.writeTrialDataFile(1, self.df)
+        self.dataFile = os.path.join(self.simDir, 'trialData.csv')
+
+    def tearDown(self):
+        util.getSimDir = self.savedGetSimDir
+        shutil.rmtree(self.simDir, ignore_errors=True)
+
+    def test_readRow(self):
+        self.assertTrue(os.path.exists(os.path.join(self.simDir, 'trialData.npy')))
+
+        df = util.readTrialDataFile(1, trialNum=42)
+        self.assertEqual(list(df.index), [42])
+        self.assertEqual(list(df.columns), list(self.df.columns))
+        self.assertTrue(np.allclose(df.loc[42].values, self.df.loc[42].values))
+
+        full = util.readTrialDataFile(1)
+        self.assertEqual(full.shape, self.df.shape)
+
+    def test_staleMatrix(self):
+        time.sleep(0.01)
+        (self.df * 2).to_csv(self.dataFile, index_label='trialNum')
+        self.assertIsNone(util._readTrialRow(self.dataFile, 7))
+
+        # The matrix is rebuilt from the CSV file
+        df = util.readTrialDataFile(1, trialNum=7)
+        self.assertTrue(np.allclose(df.loc[7].values, self.df.loc[7].values * 2))
+        self.assertIsNotNone(util._readTrialRow(self.dataFile, 7))
+
+    def test_missingTrial(self):
+        from pygcam.mcs.error import PygcamMcsUserError
+
+        with self.assertRaises(PygcamMcsUserError):
+            util.readTrialDataFile(1, trialNum=100)
+
+    def test_appendTrials(self):
+        new = pd.DataFrame(np.random.rand(20, 5), columns=['e', 'd', 'c', 'b', 'a'],
+                           index=pd.RangeIndex(100, 120))
+        util.appendTrialDataFile(1, new)
+
+        # The extended matrix is current, so rows are read without parsing the CSV
+        row = util._readTrialRow(self.dataFile, 110)
+        self.assertIsNotNone(row)
+        self.assertTrue(np.allclose(row[list(new.columns)].values, new.loc[[110]].values))
+
+        full = util.readTrialDataFile(1)
+        self.assertEqual(list(full.index), list(range(120)))
+        self.assertEqual(list(full.columns), list(self.df.columns))
+        self.assertTrue(np.allclose(full.loc[5].values, self.df.loc[5].values))
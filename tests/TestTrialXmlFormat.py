@@ -0,0 +1,107 @@
+import os
+import shutil
+from unittest import TestCase
+
+from pygcam.mcs import util
+from pygcam.mcs.XMLParameterFile import (XMLRelFile, XMLParameter, TRIAL_XML_COMPACT,
+                                         TRIAL_XML_TEMPLATE)
+from pygcam.utils import mkdirs
+
+FileText = '''<?xml version="1.0" encoding="UTF-8"?>
+<scenario>
+  <world>
+    <region name="USA">
+      <!-- a comment -->
+      <supplysector name="{sector}">
+        <share-weight year="2020">1.0</share-weight>
+        <share-weight year="2030">1.0</share-weight>
+        <price year="2020">2.5</price>
+      </supplysector>
+    </region>
+  </world>
+</scenario>
+'''
+
+class Var(object):
+    def __init__(self, elt):
+        self.elt = elt
+
+    def getElement(self):
+        return self.elt
+
+class Param(object):
+    def __init__(self, elements):
+        self.vars = [Var(elt) for elt in elements]
+
+    def getVars(self):
+        return self.vars
+
+class InputFile(object):
+    def __init__(self):
+        self.parameters = {}
+        self.writeFuncs = {}
+
+class TestTrialXmlFormat(TestCase):
+    def setUp(self):
+        self.simDir = '/tmp/testTrialXmlFormat'
+        shutil.rmtree(self.simDir, ignore_errors=True)
+
+        self.savedGetSimDir = util.getSimDir
+        util.getSimDir = lambda simId: self.simDir
+
+        self.savedInstances = XMLParameter.instances
+        XMLParameter.instances = {}
+
+        xmlDir = os.path.join(self.simDir, util.SimLocalXmlDirName)
+        mkdirs(xmlDir)
+
+        self.inputFile = InputFile()
+        self.relFiles = []
+        for sector in ('electricity', 'refining'):
+            filename = sector + '.xml'
+            with open(os.path.join(xmlDir, filename), 'w') as f:
+                f.write(FileText.format(sector=sector))
+
+            self.relFiles.append(XMLRelFile(self.inputFile, filename, 1))
+
+        # One parameter modifies elements of both files; another modifies an
+        # element also modified by the first.
+        trees = [relFile.tree for relFile in self.relFiles]
+        weights = [elt for tree in trees for elt in tree.xpath('//share-weight')]
+        prices  = [elt for tree in trees for elt in tree.xpath('//price')]
+        self.inputFile.parameters['weights'] = Param(weights)
+        self.inputFile.parameters['prices']  = Param(prices + weights[:1])
+        self.elements = weights + prices
+
+    def tearDown(self):
+        util.getSimDir = self.savedGetSimDir
+        XMLParameter.instances = self.savedInstances
+        shutil.rmtree(self.simDir, ignore_errors=True)
+
+    def writeBoth(self, trialNum):
+        for i, relFile in enumerate(self.relFiles):
+            paths = [os.path.join(self.simDir, '%s-%d-%d.xml' % (xmlFormat, trialNum, i))
+                     for xmlFormat in (TRIAL_XML_COMPACT, TRIAL_XML_TEMPLATE)]
+
+            relFile.writeTrialFile(paths[0], xmlFormat=TRIAL_XML_COMPACT)
+            relFile.writeTrialFile(paths[1], xmlFormat=TRIAL_XML_TEMPLATE)
+
+            contents = []
+            for path in paths:
+                with open(path, 'rb') as f:
+                    contents.append(f.read())
+
+            self.assertEqual(contents[0], contents[1],
+                             'Template and compact output differ for trial %d, file %d' % (trialNum, i))
+
+    def test_sameBytes(self):
+        self.writeBoth(0)
+
+        for trialNum in range(1, 4):
+            for i, elt in enumerate(self.elements):
+                elt.text = str(trialNum * 0.123456789 + i)
+            self.writeBoth(trialNum)
+
+        # Text that must be escaped
+        self.elements[0].text = '1 < 2 & 3'
+        self.writeBoth(4)
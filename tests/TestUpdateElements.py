@@ -0,0 +1,104 @@
+from unittest import TestCase
+
+import pandas as pd
+from lxml import etree as ET
+
+from pygcam.mcs.XMLParameterFile import XMLParameter
+
+InputText = '''<scenario>
+  <region name="USA">
+    <share-weight year="2020">1.0</share-weight>
+    <share-weight year="2030">0.25</share-weight>
+    <price year="2020">2.5</price>
+    <price year="2030">3</price>
+    <count year="2020">7</count>
+    <count year="2030">9</count>
+  </region>
+</scenario>
+'''
+
+ParamText = '''<Parameter name="{name}">
+  <Query>//{tag}</Query>
+  <Distribution apply="{apply}"{bounds}><Uniform min="0" max="10"/></Distribution>
+</Parameter>
+'''
+
+def oldUpdateElements(param, trialNum, df):
+    """
+    The per-variable loop that XMLParameter.updateElements replaced.
+    """
+    dataSrc = param.dataSrc
+    isFactor = dataSrc.isFactor()
+    isDelta  = dataSrc.isDelta()
+
+    for var in param.vars:
+        if var.getElement() is None:
+            continue
+
+        originalValue = var.getFloatValue()
+        randomValue = df.loc[trialNum, var.getParameter().getName()]
+
+        newValue = randomValue * originalValue if isFactor else \
+            ((randomValue + originalValue) if isDelta else randomValue)
+
+        modDict = dataSrc.modDict
+        if modDict['lowbound'] is not None:
+            newValue = max(newValue, modDict['lowbound'])
+
+        if modDict['highbound'] is not None:
+            newValue = min(newValue, modDict['highbound'])
+
+        var.setValue(newValue)
+
+class TestUpdateElements(TestCase):
+    def setUp(self):
+        self.savedInstances = XMLParameter.instances
+        XMLParameter.instances = {}
+
+    def tearDown(self):
+        XMLParameter.instances = self.savedInstances
+
+    def createParams(self, tree):
+        specs = [('factor', 'share-weight', 'mult',   ''),
+                 ('delta',  'price',        'add',    ''),
+                 ('direct', 'count',        'direct', ''),
+                 ('bounds', 'share-weight', 'mult',   ' lowbound="0.5" highbound="1.5"'),
+                 ('directBounds', 'count',  'direct', ' lowbound="4"')]
+
+        XMLParameter.instances = {}     # each tree has its own set of parameters
+        params = []
+        for name, tag, apply, bounds in specs:
+            elt = ET.fromstring(ParamText.format(name=name, tag=tag, apply=apply, bounds=bounds))
+            param = XMLParameter(elt)
+            param.runQuery(tree)
+            params.append(param)
+
+        return params
+
+    def texts(self, tree):
+        return [elt.text for elt in tree.getroot().iter() if elt.text and elt.text.strip()]
+
+    def test_equivalence(self):
+        df = pd.DataFrame({'factor': [0.5, 1.7, 3.0],
+                           'delta':  [-1.25, 0.1, 2.0],
+                           'direct': [3, 12, 0],        # integer column
+                           'bounds': [0.1, 1.2, 9.0],
+                           'directBounds': [2.5, 6.0, 4.0]})
+
+        for paramIndex in range(len(df.columns)):
+            newTree = ET.ElementTree(ET.fromstring(InputText))
+            oldTree = ET.ElementTree(ET.fromstring(InputText))
+            newParam = self.createParams(newTree)[paramIndex]
+            oldParam = self.createParams(oldTree)[paramIndex]
+
+            for trialNum in df.index:
+                newParam.updateElements(1, trialNum, df)
+                oldUpdateElements(oldParam, trialNum, df)
+
+                self.assertEqual(self.texts(newTree), self.texts(oldTree),
+                                 'Parameter %s, trial %d' % (newParam.getName(), trialNum))
+
+        # Integer direct values are written without a decimal point
+        tree = ET.ElementTree(ET.fromstring(InputText))
+        self.createParams(tree)[2].updateElements(1, 1, df)
+        self.assertEqual([elt.text for elt in tree.xpath('//count')], ['12', '12'])